@@ -0,0 +1,5 @@
+"""
+Benchmarks for the bookstore project.
+
+Run from the ``bookstore/`` directory, e.g. ``python -m benchmarks.place_order``.
+"""
@@ -0,0 +1,65 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import math
+import os
+
+
+def setup_django(settings_module='benchmarks.settings'):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def prepare_database():
+    """
+    Bring the benchmark database to the latest schema and empty it
+    """
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, interactive=False)
+    call_command('flush', verbosity=0, interactive=False)
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies):
+    """
+    p50/p95/p99 and mean of latencies given in seconds, reported in ms
+    """
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+    }
+
+
+class StatementCounter:
+    """
+    Count SQL statements sent over a connection (one round trip each)
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._wrapper.__exit__(*exc)
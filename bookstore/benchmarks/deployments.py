@@ -0,0 +1,318 @@
+"""
+WSGI versus ASGI deployment benchmark.
+
+Seeds the synthetic store, then for each view served async under ASGI
+(catalog, book detail, search, order history, recommendations) starts one
+process per deployment. The WSGI process calls the real WSGI handler from
+``--concurrency`` threads, as a threaded WSGI server would. The ASGI process
+(BOOKSTORE_ASYNC_VIEWS=1) drives the ASGI handler from as many concurrent
+connections on one event loop. Every connection is signed in as its own
+customer. Reports throughput, p50/p95/p99 latency and resident memory
+added per concurrent connection for both, as JSON.
+
+SQLite answers in microseconds; ``--db-latency-ms`` delays every statement
+to stand in for the network round trip to a database server, which is
+where an event loop can overlap requests.
+
+    python -m benchmarks.deployments --concurrency 32 --requests 2000
+    python -m benchmarks.deployments --concurrency 64 --db-latency-ms 2 --view book:search
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import prepare_database, setup_django, summarize
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from benchmarks.views import scenarios, seed  # noqa: E402
+from store.models import Book, User  # noqa: E402
+
+VIEWS = ('book:index', 'book:detail', 'book:search', 'order:order_history', 'order:recommendations')
+DEPLOYMENTS = ('wsgi', 'asgi')
+
+
+def current_rss_kb():
+    """
+    Resident set size of this process now, or None where /proc is missing
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        return None
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def delay_statements(latency):
+    """
+    Sleep ``latency`` seconds before every statement on every connection
+    """
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, wrapper)
+
+    connection_created.connect(install, weak=False)
+
+
+def session_cookies(count):
+    """
+    ``Cookie`` header values of ``count`` signed-in sessions
+    """
+    users = list(User.objects.filter(customer__isnull=False).order_by('id')[:count])
+    cookies = []
+    for i in range(count):
+        client = Client()
+        client.force_login(users[i % len(users)])
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}')
+    connections.close_all()
+    return cookies
+
+
+def split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+def wsgi_load(paths, cookies, requests, warmup):
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+
+    def call(path, cookie):
+        path, query = split(path)
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie,
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b''),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return int(status[0].split()[0])
+
+    # Templates, the search index and caches are loaded before the baseline
+    rng = random.Random(-1)
+    for i in range(warmup):
+        call(paths(rng), cookies[0])
+    idle = current_rss_kb()
+
+    ready = threading.Barrier(len(cookies) + 1)
+    results = []
+
+    def worker(number, cookie):
+        rng = random.Random(-1 - number)
+        latencies, errors = [], 0
+        try:
+            for i in range(warmup):
+                call(paths(rng), cookie)
+            rng = random.Random(number)
+            ready.wait()
+            for i in range(requests // len(cookies) + (number < requests % len(cookies))):
+                path = paths(rng)
+                started = time.perf_counter()
+                status = call(path, cookie)
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+        finally:
+            connections.close_all()
+        results.append((latencies, errors))
+
+    threads = [threading.Thread(target=worker, args=(i, cookie)) for i, cookie in enumerate(cookies)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started, idle
+
+
+def asgi_load(paths, cookies, requests, warmup):
+    from django.core.asgi import get_asgi_application
+    application = get_asgi_application()
+
+    async def call(path, cookie):
+        path, query = split(path)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        status = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await application(scope, receive, send)
+        return status[0]
+
+    async def warm(number, cookie):
+        rng = random.Random(-1 - number)
+        for i in range(warmup):
+            await call(paths(rng), cookie)
+
+    async def worker(number, cookie):
+        rng = random.Random(number)
+        latencies, errors = [], 0
+        for i in range(requests // len(cookies) + (number < requests % len(cookies))):
+            path = paths(rng)
+            started = time.perf_counter()
+            status = await call(path, cookie)
+            latencies.append(time.perf_counter() - started)
+            errors += status != 200
+        return latencies, errors
+
+    async def run():
+        # Templates, the search index and caches are loaded before the baseline
+        await warm(0, cookies[0])
+        idle = current_rss_kb()
+        await asyncio.gather(*(warm(i, cookie) for i, cookie in enumerate(cookies)))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(i, cookie) for i, cookie in enumerate(cookies)))
+        return results, time.perf_counter() - started, idle
+
+    return asyncio.run(run())
+
+
+def measure(deployment, view, concurrency, requests, warmup):
+    """
+    Load one view through one deployment in this process
+    """
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    scenario = next(scenario for scenario in scenarios(book_ids) if scenario.name == view)
+    cookies = session_cookies(concurrency)
+
+    def paths(rng):
+        return scenario.request(None, rng)[1]
+
+    load = wsgi_load if deployment == 'wsgi' else asgi_load
+    results, elapsed, idle = load(paths, cookies, requests, warmup)
+    latencies = [value for result in results for value in result[0]]
+    peak = peak_rss_kb()
+    return {
+        'requests': len(latencies),
+        'errors': sum(result[1] for result in results),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        **summarize(latencies),
+        'rss_idle_mb': round(idle / 1024, 1) if idle else None,
+        'rss_peak_mb': round(peak / 1024, 1),
+        # Growth from the warmed-up, idle process to the peak under load
+        'kb_per_connection': round((peak - idle) / concurrency, 1) if idle else None,
+    }
+
+
+def run_deployment(deployment, view, args):
+    """
+    Measure one view in a fresh process, so memory figures and the URL
+    configuration belong to that deployment alone
+    """
+    env = dict(os.environ)
+    env.pop('BOOKSTORE_ASYNC_VIEWS', None)
+    if deployment == 'asgi':
+        env['BOOKSTORE_ASYNC_VIEWS'] = '1'
+    command = [
+        sys.executable, '-m', 'benchmarks.deployments', '--measure', deployment, '--view', view,
+        '--concurrency', str(args.concurrency), '--requests', str(args.requests),
+        '--warmup', str(args.warmup), '--db-latency-ms', str(args.db_latency_ms),
+    ]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode:
+        sys.stderr.write(completed.stderr)
+        raise SystemExit(f'{deployment} run of {view} failed')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=1000, help='Timed requests per view and deployment')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent connections')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per connection before timing')
+    parser.add_argument('--scale', type=float, default=2.0, help='Dataset size, as for manage.py seed_store')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                        help='Extra delay per SQL statement, standing in for a networked database')
+    parser.add_argument('--view', action='append', dest='views', choices=VIEWS,
+                        help='Only benchmark this view (repeatable)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--measure', choices=DEPLOYMENTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.concurrency < 1 or args.requests < args.concurrency:
+        parser.error('--concurrency must be at least 1 and no more than --requests')
+    if args.db_latency_ms:
+        delay_statements(args.db_latency_ms / 1000)
+
+    if args.measure:
+        # Child process: the parent has seeded the database
+        print(json.dumps(measure(args.measure, args.views[0], args.concurrency, args.requests, args.warmup)))
+        return
+
+    prepare_database()
+    seed(args.scale, args.seed)
+    connections.close_all()
+
+    report = {
+        'database': connection.vendor,
+        'concurrency': args.concurrency,
+        'db_latency_ms': args.db_latency_ms,
+        'dataset': {'scale': args.scale, 'seed': args.seed},
+        'views': {},
+    }
+    for view in args.views or VIEWS:
+        wsgi, asgi = (run_deployment(deployment, view, args) for deployment in DEPLOYMENTS)
+        report['views'][view] = {
+            'wsgi': wsgi,
+            'asgi': asgi,
+            'asgi_vs_wsgi': {
+                'throughput': round(asgi['throughput_rps'] / wsgi['throughput_rps'], 2),
+                'p95': round(asgi['p95_ms'] / wsgi['p95_ms'], 2),
+                'kb_per_connection': (
+                    round(asgi['kb_per_connection'] - wsgi['kb_per_connection'], 1)
+                    if asgi['kb_per_connection'] is not None and wsgi['kb_per_connection'] is not None else None
+                ),
+            },
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
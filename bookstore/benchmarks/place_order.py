@@ -0,0 +1,141 @@
+"""
+Order placement benchmark.
+
+Compares the original per-line, autocommit implementation of place_order
+with the single-transaction bulk implementation in
+``store.services.order.checkout``, for several cart sizes. Each run uses
+a new customer whose carts are random draws from the catalog, so the
+purchase history grows and varies from one order to the next. The work
+done after the order commits (sales rollups, co-purchase pairs) is
+counted too, and depends on that history; statements are therefore
+reported against the number of distinct books the customer had bought
+before each order, alongside p50/p99 latency, as JSON.
+
+    python -m benchmarks.place_order --iterations 50 --sizes 1 10 100
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from benchmarks.common import StatementCounter, prepare_database, setup_django, summarize
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+from store.models import Book, Cart, CartItem, Customer, User  # noqa: E402
+from store.models.order.models import Order, OrderItem, Payment, Shipping  # noqa: E402
+from store.services.order import checkout  # noqa: E402
+
+
+def legacy_place_order(customer):
+    """
+    The original view body: one autocommit statement per write and lazy
+    ``cart_item.book`` fetches for every line
+    """
+    cart, created = Cart.objects.get_or_create(customer=customer)
+    if created or not cart.items.exists():
+        return None
+    cart_items = CartItem.objects.filter(cart=cart)
+    total_price = sum(item.book.price * item.quantity for item in cart_items)
+    order = Order.objects.create(id=uuid.uuid4().hex, customer=customer, total_price=total_price)
+    for cart_item in cart_items:
+        OrderItem.objects.create(
+            id=uuid.uuid4().hex,
+            order=order,
+            book=cart_item.book,
+            quantity=cart_item.quantity,
+            price=cart_item.book.price,
+            total=cart_item.book.price * cart_item.quantity,
+        )
+    Payment.objects.create(id=uuid.uuid4().hex, order=order, amount=total_price, status='pending')
+    Shipping.objects.create(id=uuid.uuid4().hex, order=order, fee=5.00, status='pending')
+    cart.items.all().delete()
+    return order
+
+
+def seed(catalog_size):
+    Book.objects.bulk_create([
+        Book(id=f'bench-book-{i}', title=f'Benchmark Book {i}', price=Decimal('9.99') + i % 50, instock=100000)
+        for i in range(catalog_size)
+    ])
+
+
+def new_customer(name):
+    user = User.objects.create_user(name, 'bench', id=name, fullname='Bench Customer')
+    customer = Customer.objects.create(user=user)
+    cart = Cart.objects.create(id=f'{name}-cart', customer=customer)
+    return customer, cart
+
+
+def fill_cart(cart, book_ids):
+    CartItem.objects.bulk_create([
+        CartItem(id=uuid.uuid4().hex, cart=cart, book_id=book_id, quantity=1 + i % 3)
+        for i, book_id in enumerate(book_ids)
+    ])
+
+
+def checkpoints(samples, count=5):
+    """
+    ``count`` evenly spaced ``(history_books, statements)`` samples, first
+    and last included
+    """
+    if len(samples) <= count:
+        return samples
+    step = (len(samples) - 1) / (count - 1)
+    return [samples[round(i * step)] for i in range(count)]
+
+
+def run(implementation, name, lines, iterations, catalog_size, rng):
+    customer, cart = new_customer(name)
+    bought = set()
+    latencies = []
+    samples = []
+    for _ in range(iterations):
+        book_ids = [f'bench-book-{i}' for i in rng.sample(range(catalog_size), lines)]
+        fill_cart(cart, book_ids)
+        with StatementCounter(connection) as counter:
+            started = time.perf_counter()
+            order = implementation(customer)
+            latencies.append(time.perf_counter() - started)
+        samples.append({'history_books': len(bought), 'statements': counter.count})
+        bought.update(book_ids)
+        assert order is not None and order.items.count() == lines
+    statements = [sample['statements'] for sample in samples]
+    return {
+        'statements_min': min(statements),
+        'statements_max': max(statements),
+        'statements_by_history': checkpoints(samples),
+        **summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--catalog', type=int, default=2000, help='Books the carts are drawn from')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.catalog < max(args.sizes):
+        parser.error('--catalog must be at least the largest cart size')
+
+    prepare_database()
+    seed(args.catalog)
+
+    report = {'database': connection.vendor, 'iterations': args.iterations, 'catalog': args.catalog, 'results': {}}
+    for lines in args.sizes:
+        report['results'][lines] = {
+            # The same carts, in the same order, for both implementations
+            label: run(implementation, f'bench-{label}-{lines}', lines, args.iterations, args.catalog,
+                       random.Random(f'{args.seed}-{lines}'))
+            for label, implementation in (('before', legacy_place_order), ('after', checkout.place_order))
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
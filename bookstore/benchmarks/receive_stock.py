@@ -0,0 +1,94 @@
+"""
+Stock receiving benchmark.
+
+Records a supplier delivery of N lines two ways: a per-line loop that
+reads each book, bumps ``instock`` in Python and saves it, and the
+set-based single-transaction implementation in
+``store.services.order.receiving``. Reports SQL statements per slip and
+p50/p99 latency as JSON.
+
+    python -m benchmarks.receive_stock --lines 10000 --iterations 5
+"""
+import argparse
+import datetime
+import json
+import time
+import uuid
+from decimal import Decimal
+
+from benchmarks.common import StatementCounter, prepare_database, setup_django, summarize
+
+setup_django()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+
+from store.models import Book, ImportSlip, ImportSlipDetail  # noqa: E402
+from store.services.order import receiving  # noqa: E402
+
+
+def per_line_receive(lines):
+    """
+    The naive approach: one read-modify-write and one insert per line
+    """
+    with transaction.atomic():
+        slip = ImportSlip.objects.create(
+            id=uuid.uuid4().hex,
+            import_date=datetime.date.today(),
+            total=sum(quantity * price for _, quantity, price in lines),
+        )
+        for book_id, quantity, price in lines:
+            book = Book.objects.get(id=book_id)
+            book.instock += quantity
+            book.save(update_fields=['instock'])
+            ImportSlipDetail.objects.create(
+                id=uuid.uuid4().hex, import_slip=slip, book=book,
+                quantity=quantity, price=price, total=quantity * price,
+            )
+    return slip
+
+
+def seed(lines):
+    Book.objects.bulk_create([
+        Book(id=f'bench-book-{i}', title=f'Benchmark Book {i}', price=Decimal('9.99'), instock=0)
+        for i in range(lines)
+    ], batch_size=1000)
+    return [(f'bench-book-{i}', 1 + i % 5, Decimal('4.50')) for i in range(lines)]
+
+
+def run(implementation, lines, iterations):
+    latencies = []
+    statements = []
+    for _ in range(iterations):
+        before = Book.objects.aggregate(stock=Sum('instock'))['stock']
+        with StatementCounter(connection) as counter:
+            started = time.perf_counter()
+            implementation(lines)
+            latencies.append(time.perf_counter() - started)
+        statements.append(counter.count)
+        after = Book.objects.aggregate(stock=Sum('instock'))['stock']
+        assert after - before == sum(quantity for _, quantity, _ in lines)
+    return {'statements': max(statements), **summarize(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    prepare_database()
+    lines = seed(args.lines)
+
+    report = {
+        'database': connection.vendor,
+        'lines': args.lines,
+        'iterations': args.iterations,
+        'before': run(per_line_receive, lines, args.iterations),
+        'after': run(receiving.receive_slip, lines, args.iterations),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Settings for running benchmarks against a local database.
+
+By default a throwaway SQLite file is used. Set BENCH_DB_ENGINE=mysql (plus
+BENCH_DB_NAME / BENCH_DB_USER / BENCH_DB_PASSWORD / BENCH_DB_HOST /
+BENCH_DB_PORT) to run against a local MySQL or MariaDB instead. Both use
+the pooled backends; BENCH_DB_POOL_SIZE bounds the connections per process.
+"""
+import os
+
+from bookstore.settings import *  # noqa: F401,F403
+from bookstore.settings import BASE_DIR
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+POOL = {
+    'MAX_SIZE': int(os.environ.get('BENCH_DB_POOL_SIZE', 64)),
+    'TIMEOUT': 30,
+}
+
+if os.environ.get('BENCH_DB_ENGINE') == 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'store.backends.pooled_mysql',
+            'NAME': os.environ.get('BENCH_DB_NAME', 'bookstore_bench'),
+            'USER': os.environ.get('BENCH_DB_USER', 'root'),
+            'PASSWORD': os.environ.get('BENCH_DB_PASSWORD', ''),
+            'HOST': os.environ.get('BENCH_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('BENCH_DB_PORT', '3306'),
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+            },
+            'POOL': POOL,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'store.backends.pooled_sqlite3',
+            'NAME': os.environ.get('BENCH_DB_NAME', str(BASE_DIR / 'bench.sqlite3')),
+            # Concurrent benchmark clients wait for the write lock instead of failing
+            'OPTIONS': {
+                'timeout': 30,
+            },
+            'POOL': POOL,
+        }
+    }
+
+SEARCH_INDEX_PATH = None
@@ -0,0 +1,230 @@
+"""
+View latency benchmark.
+
+Seeds the synthetic store (the same ``--scale`` and ``--seed`` always
+produce the same rows), then requests each hot view through the Django
+test client from ``--concurrency`` threads, each signed in as its own
+customer. Reports
+p50/p95/p99 latency, throughput and queries per request for every view as
+JSON. ``--output`` saves the report; ``--baseline`` compares the run with a
+saved report and exits with status 1 when a view got slower (p95 or
+throughput worse than ``--tolerance``) or sends more queries.
+
+    python -m benchmarks.views --requests 200 --concurrency 4 --output base.json
+    python -m benchmarks.views --requests 200 --concurrency 4 --baseline base.json
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+
+from benchmarks.common import prepare_database, setup_django, summarize
+
+setup_django()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from store.instrumentation import QueryRecorder  # noqa: E402
+from store.models import User  # noqa: E402
+from store.services import synthetic  # noqa: E402
+
+
+def seed(scale=2.0, seed_value=42, workers=1):
+    """
+    Generate the synthetic store (see store.services.synthetic); returns
+    ``(book_ids, customer_users)``
+    """
+    plan = synthetic.Plan(scale, seed_value, datetime.date.today(), make_password('bench'))
+    synthetic.generate(plan, workers=workers)
+    book_ids = [f'book-{i}' for i in range(plan.books)]
+    # Enough accounts for one per client thread
+    users = list(User.objects.filter(customer__isnull=False).order_by('id')[:64])
+    return book_ids, users
+
+
+class Scenario:
+    """
+    One view to benchmark: ``request(client, rng)`` returns the method and
+    path to time; ``prepare(client, rng)``, if given, runs untimed first.
+    ``writes`` marks views that write on every request.
+    """
+
+    def __init__(self, name, request, prepare=None, expect=(200,), writes=False):
+        self.name = name
+        self.request = request
+        self.prepare = prepare
+        self.expect = expect
+        self.writes = writes
+
+
+def scenarios(book_ids):
+    def add_to_cart(client, rng):
+        client.get(reverse('order:add_to_cart', args=[rng.choice(book_ids)]))
+
+    return [
+        Scenario('book:index', lambda client, rng: ('get', reverse('book:index'))),
+        Scenario('book:search', lambda client, rng: ('get', f"{reverse('book:search')}?q={rng.choice(synthetic.WORDS)}")),
+        Scenario('book:detail', lambda client, rng: ('get', reverse('book:detail', args=[rng.choice(book_ids)]))),
+        Scenario('order:cart', lambda client, rng: ('get', reverse('order:cart'))),
+        Scenario('order:checkout', lambda client, rng: ('get', reverse('order:checkout'))),
+        Scenario(
+            'order:place_order', lambda client, rng: ('post', reverse('order:place_order')),
+            prepare=add_to_cart, expect=(302,), writes=True,
+        ),
+        Scenario('order:order_history', lambda client, rng: ('get', reverse('order:order_history'))),
+        Scenario('order:recommendations', lambda client, rng: ('get', reverse('order:recommendations'))),
+    ]
+
+
+def _worker(scenario, client, requests, warmup, seed_value, ready, results):
+    rng = random.Random(seed_value)
+    latencies, queries, errors = [], [], 0
+    try:
+        for number in range(warmup + requests):
+            if number == warmup:
+                ready.wait()
+            if scenario.prepare is not None:
+                scenario.prepare(client, rng)
+            method, path = scenario.request(client, rng)
+            recorder = QueryRecorder()
+            with recorder.record():
+                started = time.perf_counter()
+                response = getattr(client, method)(path)
+                elapsed = time.perf_counter() - started
+            if number < warmup:
+                continue
+            if response.status_code not in scenario.expect:
+                errors += 1
+            latencies.append(elapsed)
+            queries.append(recorder.count)
+    finally:
+        connections.close_all()
+    results.append((latencies, queries, errors))
+
+
+def run_scenario(scenario, users, requests, concurrency, warmup, seed_value):
+    """
+    ``requests`` timed requests split across ``concurrency`` threads; the
+    clock starts once every thread has finished its warm-up requests
+    """
+    clients = []
+    for i in range(concurrency):
+        # Failing requests come back as 500s instead of stopping the thread
+        client = Client(raise_request_exception=False)
+        client.force_login(users[i % len(users)])
+        # Put a line in the cart so the cart and checkout pages have content
+        client.get(reverse('order:add_to_cart', args=['book-0']))
+        clients.append(client)
+
+    results = []
+    ready = threading.Barrier(concurrency + 1)
+    threads = [
+        threading.Thread(target=_worker, args=(
+            scenario, client, requests // concurrency + (i < requests % concurrency),
+            warmup, seed_value + i, ready, results,
+        ))
+        for i, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [value for result in results for value in result[0]]
+    queries = [value for result in results for value in result[1]]
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(result[2] for result in results),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+        **summarize(latencies),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Per-view changes against ``baseline``; a view regresses when p95 or
+    throughput is worse by more than ``tolerance`` or it sends more queries
+    """
+    comparison = {}
+    for name, current in report['views'].items():
+        before = baseline.get('views', {}).get(name)
+        if before is None:
+            continue
+        changes = {}
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_per_request'):
+            change = (current[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            changes[metric] = {'baseline': before[metric], 'current': current[metric], 'change_pct': round(change, 1)}
+        changes['regressed'] = (
+            current['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+            or current['throughput_rps'] < before['throughput_rps'] * (1 - tolerance)
+            or current['queries_per_request'] > before['queries_per_request']
+        )
+        comparison[name] = changes
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per view')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads per view')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per thread before timing')
+    parser.add_argument('--scale', type=float, default=2.0, help='Dataset size, as for manage.py seed_store')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--view', action='append', dest='views', help='Only benchmark this view (repeatable)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', help='Compare with a report saved by --output')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed slowdown before a regression (0.10 = 10%%)')
+    args = parser.parse_args()
+    if args.concurrency < 1 or args.requests < args.concurrency:
+        parser.error('--concurrency must be at least 1 and no more than --requests')
+
+    prepare_database()
+    book_ids, users = seed(args.scale, args.seed)
+
+    report = {
+        'database': connection.vendor,
+        'concurrency': args.concurrency,
+        'dataset': {'scale': args.scale, 'seed': args.seed},
+        'views': {},
+    }
+    for scenario in scenarios(book_ids):
+        if args.views and scenario.name not in args.views:
+            continue
+        concurrency = args.concurrency
+        if scenario.writes and connection.vendor == 'sqlite':
+            # SQLite fails rather than waits when two transactions that have
+            # both read try to write, so writing views run one client at a time
+            concurrency = 1
+        report['views'][scenario.name] = run_scenario(
+            scenario, users, args.requests, concurrency, args.warmup, args.seed,
+        )
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['comparison'] = compare(report, json.load(f), args.tolerance)
+        regressed = any(changes['regressed'] for changes in report['comparison'].values())
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+ASGI config for bookstore project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Served this way, the catalog, book, search, order history and
+recommendation pages run as async views (see ASYNC_VIEWS in settings), e.g.
+
+    uvicorn bookstore.asgi:application --workers 4
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookstore.settings')
+os.environ.setdefault('BOOKSTORE_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
\ No newline at end of file
@@ -4,6 +4,7 @@ Django settings for bookstore project.
 Generated by 'django-admin startproject' using Django 4.0.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,11 +36,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,20 +60,30 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.cart',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'bookstore.wsgi.application'
+ASGI_APPLICATION = 'bookstore.asgi.application'
+
+# bookstore/asgi.py sets BOOKSTORE_ASYNC_VIEWS=1, so ASGI workers serve the
+# catalog, book, search, order history and recommendation pages from their
+# async versions (the async_views modules); WSGI workers keep the sync views.
+ASYNC_VIEWS = os.environ.get('BOOKSTORE_ASYNC_VIEWS') == '1'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Connections come from a bounded per-process pool (store.backends.pool);
+# CONN_MAX_AGE stays 0 so each request hands its connection back.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'store.backends.pooled_mysql',
         'NAME': 'bookstore',
         'USER': 'root',
         'PASSWORD': 'himawari',
@@ -79,6 +92,54 @@ DATABASES = {
         'OPTIONS': {
             'charset': 'utf8mb4',
         },
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': 10,
+            'TIMEOUT': 5,
+            'MAX_IDLE': 300,
+            'MAX_LIFETIME': 3600,
+            'CHECK_INTERVAL': 30,
+        },
+    }
+}
+
+# Read replicas
+# DATABASE_REPLICAS maps aliases in DATABASES that replicate 'default' to
+# their share of replica reads; empty, everything is read from 'default'.
+# GET requests to REPLICA_VIEWS read the store's models from a replica,
+# unless their session wrote within REPLICA_STICKY_SECONDS, which should
+# exceed the replication lag. An unreachable replica is skipped for
+# REPLICA_RETRY_SECONDS. See store.routers.
+
+DATABASE_ROUTERS = ['store.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = {}
+REPLICA_VIEWS = [
+    'book:index',
+    'book:detail',
+    'book:search',
+    'book:suggest',
+    'staff:inventory',
+    'order:order_history',
+    'order:recommendations',
+]
+REPLICA_STICKY_SECONDS = 10
+REPLICA_RETRY_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# LocMemCache is per process and evicts least recently used keys once
+# MAX_ENTRIES is reached; point this at Memcached or Redis to share entries
+# (and invalidations) between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bookstore',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -125,4 +186,91 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom User model
-AUTH_USER_MODEL = 'store.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'store.User'
+
+# Book search index
+# Snapshot written by `manage.py rebuild_search_index`; workers load it on
+# first search instead of building the index from the database, and reload
+# it when a newer snapshot appears (checked every RELOAD_INTERVAL seconds).
+SEARCH_INDEX_PATH = BASE_DIR / 'search_index.bin'
+SEARCH_INDEX_RELOAD_INTERVAL = 30
+# Catalog changes are published to every worker through this cache; each
+# worker checks for them at most every SYNC_INTERVAL seconds (None: never).
+SEARCH_INDEX_CACHE_ALIAS = 'default'
+SEARCH_INDEX_SYNC_INTERVAL = 1
+
+# Typeahead suggestions are rebuilt in the background when their popularity
+# weights are older than REBUILD_INTERVAL seconds, or when another worker
+# changed the catalog (checked every SYNC_INTERVAL seconds; None: never).
+SUGGEST_REBUILD_INTERVAL = 3600
+SUGGEST_SYNC_INTERVAL = 10
+
+# Recommendations
+# Per-customer results are cached for RECOMMENDATION_CACHE_TIMEOUT seconds
+# and dropped when the customer places an order or rates a book.
+RECOMMENDATION_CACHE_ALIAS = 'default'
+RECOMMENDATION_CACHE_TIMEOUT = 900
+
+# Top-rated leaderboards (per category and overall) are built from the
+# rating aggregates on Book and cached for LEADERBOARD_CACHE_TIMEOUT seconds
+LEADERBOARD_CACHE_ALIAS = 'default'
+LEADERBOARD_CACHE_TIMEOUT = 600
+LEADERBOARD_SIZE = 20
+
+# Rendered book cards and detail pages are cached per book version for
+# FRAGMENT_CACHE_TIMEOUT seconds; saving a book (or its author, publisher or
+# category), a rating or a stock delivery retires the book's fragments.
+FRAGMENT_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Dimension lookup cache
+# Every Author, Publisher and Category row is kept in each worker and
+# reloaded after DIMENSION_CACHE_TIMEOUT seconds, or after a change: writes
+# replace a token in DIMENSION_CACHE_ALIAS, which workers compare with
+# theirs at most every DIMENSION_CACHE_SYNC_INTERVAL seconds.
+DIMENSION_CACHE_ALIAS = 'default'
+DIMENSION_CACHE_TIMEOUT = 300
+DIMENSION_CACHE_SYNC_INTERVAL = 1
+
+# Staff dashboard
+# Figures are read from the sales rollup tables (see rebuild_sales_rollups)
+# and cached for SALES_DASHBOARD_CACHE_TIMEOUT seconds; table sizes use
+# cached approximate counts, refreshed every APPROXIMATE_COUNT_TIMEOUT.
+SALES_DASHBOARD_DAYS = 30
+SALES_DASHBOARD_CACHE_TIMEOUT = 60
+APPROXIMATE_COUNT_TIMEOUT = 300
+
+# Shopping cart storage
+# 'database' writes every cart change to Cart/CartItem. 'cache' keeps live
+# carts in the cache backend and writes them back in batches of
+# CART_FLUSH_BATCH_SIZE, every CART_FLUSH_INTERVAL seconds, and before the
+# cart page, checkout and place_order read the tables. The cache behind
+# CART_CACHE_ALIAS must have room for every active cart, or carts evicted
+# before their next flush lose their latest changes.
+CART_STORAGE = 'database'
+CART_CACHE_ALIAS = 'default'
+CART_FLUSH_BATCH_SIZE = 100
+CART_FLUSH_INTERVAL = 30
+
+# Query instrumentation
+# QueryStatsMiddleware keeps per-view query counts, database time and the
+# most repeated statement (staff JSON at /staff/query-stats/). Requests
+# sending more queries than QUERY_BUDGETS allows are logged as warnings, and
+# store.instrumentation.query_budget fails tests over budget.
+# QUERY_STATS_HEADER adds X-DB-Queries, X-Fragment-Cache and Server-Timing
+# response headers.
+QUERY_STATS_HEADER = False
+# Budgets are for a signed-in customer (or staff) with an empty cache and
+# the dimension tables already loaded by an earlier request of the worker
+# (the first request needing them adds a query per table).
+QUERY_BUDGETS = {
+    'book:index': 6,
+    'book:search': 4,
+    'book:suggest': 3,
+    'book:detail': 7,
+    'order:cart': 5,
+    'order:checkout': 5,
+    'order:order_history': 5,
+    'order:recommendations': 10,
+    'staff:index': 13,
+}
\ No newline at end of file
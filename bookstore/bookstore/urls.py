@@ -19,8 +19,9 @@ from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', include('store.urls.book_urls')),
     path('customer/', include('store.urls.customer_urls')),
     path('staff/', include('store.urls.staff_urls')),
     path('order/', include('store.urls.order_urls')),
+    # Last: the book detail route '<book_id>/' would shadow the prefixes above
+    path('', include('store.urls.book_urls')),
 ]
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""
+Database backends for the store.
+
+``store.backends.pooled_mysql`` and ``store.backends.pooled_sqlite3`` are
+Django's MySQL and SQLite backends with connections borrowed from a
+bounded per-process pool (``store.backends.pool``) instead of opened for
+each request. The SQLite variant exists so the pool can be exercised
+without a MySQL or MariaDB server.
+"""
@@ -0,0 +1,60 @@
+"""
+DatabaseWrapper mixin shared by the pooled backends
+"""
+from django.utils.asyncio import async_unsafe
+
+from store import instrumentation
+from store.backends.pool import pool_for
+
+
+def _close_connection(connection):
+    connection.close()
+
+
+class PooledDatabaseWrapper:
+    """
+    Mixin for a backend's DatabaseWrapper: connecting checks a connection
+    out of the process pool (see store.backends.pool) and closing returns
+    it. Configured by the ``POOL`` dict of the database's settings; leave
+    CONN_MAX_AGE at 0 so connections go back to the pool after every
+    request.
+    """
+
+    def pool_enabled(self):
+        return True
+
+    def ping(self, connection):
+        """
+        Whether a pooled DB-API connection still answers
+        """
+        raise NotImplementedError
+
+    @property
+    def pool(self):
+        return pool_for(self.alias, self.settings_dict)
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        if not self.pool_enabled():
+            return connect(conn_params)
+        connection, waited = self.pool.acquire(lambda: connect(conn_params), self.ping, _close_connection)
+        if waited:
+            instrumentation.count_pool_wait(waited)
+        return connection
+
+    def _close(self):
+        if not self.pool_enabled():
+            return super()._close()
+        connection = self.connection
+        # Closed inside atomic(), this wrapper keeps pointing at the
+        # connection until the block exits, so it cannot be shared yet
+        reusable = not self.in_atomic_block
+        if reusable and not self.autocommit:
+            try:
+                connection.rollback()
+            except self.Database.Error:
+                reusable = False
+        if reusable and self.errors_occurred:
+            reusable = self.ping(connection)
+        self.pool.release(connection, reusable, _close_connection)
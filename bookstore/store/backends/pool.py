@@ -0,0 +1,281 @@
+"""
+Bounded per-process pool of DB-API connections.
+
+Django opens a connection per request (CONN_MAX_AGE = 0) or keeps one per
+thread (CONN_MAX_AGE > 0); neither bounds how many connections a process
+holds, and the first costs a TCP and authentication round trip on every
+request. The pooled backends instead check a connection out of the pool
+when Django connects and return it when Django closes, so every thread of
+a process shares at most ``MAX_SIZE`` connections:
+
+* a checkout waits up to ``TIMEOUT`` seconds for a free connection when
+  all of them are in use, then raises ``PoolTimeout``;
+* connections idle for more than ``MAX_IDLE`` seconds, or open for more
+  than ``MAX_LIFETIME`` seconds, are closed instead of reused, before the
+  server's own ``wait_timeout`` drops them;
+* a connection idle for more than ``CHECK_INTERVAL`` seconds is pinged
+  before it is handed out, and replaced when it does not answer;
+* connections that saw errors are checked when they are returned, and
+  open transactions are rolled back.
+
+Pools are created lazily per database alias and process; a forked worker
+starts with empty pools rather than sharing its parent's sockets.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5.0,
+    'MAX_IDLE': 300.0,
+    'MAX_LIFETIME': 3600.0,
+    'CHECK_INTERVAL': 30.0,
+}
+
+
+class PoolTimeout(OperationalError):
+    """
+    No connection became free within the checkout timeout
+    """
+
+
+class _Idle:
+    __slots__ = ('connection', 'opened_at', 'returned_at')
+
+    def __init__(self, connection, opened_at, returned_at):
+        self.connection = connection
+        self.opened_at = opened_at
+        self.returned_at = returned_at
+
+
+def _close_quietly(close, connection):
+    try:
+        close(connection)
+    except Exception:
+        # Already broken; there is nothing left to release
+        pass
+
+
+class ConnectionPool:
+    """
+    Connections to one database, shared by the threads of one process
+    """
+
+    def __init__(self, alias, max_size=10, timeout=5.0, max_idle=300.0, max_lifetime=3600.0, check_interval=30.0):
+        if max_size < 1:
+            raise ValueError('A connection pool needs MAX_SIZE of at least 1')
+        self.alias = alias
+        self.pid = os.getpid()
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # Most recently returned last; checkouts take from the end, so the
+        # least used connections at the start age out
+        self._idle = deque()
+        # id() of every open connection -> when it was opened
+        self._opened_at = {}
+        self._size = 0
+        self._in_use = 0
+        self.checkouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.failed_checks = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def _expired(self, entry, now):
+        return (
+            now - entry.returned_at > self.max_idle
+            or now - entry.opened_at > self.max_lifetime
+        )
+
+    def _discard(self, connection):
+        # Caller holds the lock
+        self._opened_at.pop(id(connection), None)
+        self._size -= 1
+
+    def _claim(self, started, stale):
+        """
+        ``(idle entry to reuse, waited)``, the entry being None after a
+        slot was reserved for a new connection. Expired entries met on the
+        way are added to ``stale`` for the caller to close.
+        """
+        waited = False
+        with self._available:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    entry = self._idle.pop()
+                    if not self._expired(entry, now):
+                        self._in_use += 1
+                        return entry, waited
+                    self._discard(entry.connection)
+                    self.recycled += 1
+                    stale.append(entry)
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                    return None, waited
+                remaining = self.timeout - (now - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self._count_wait(now - started)
+                    raise PoolTimeout(
+                        f'No {self.alias!r} database connection became free within {self.timeout}s '
+                        f'({self._in_use} of {self.max_size} in use)'
+                    )
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                self._available.wait(remaining)
+
+    def _count_wait(self, seconds):
+        # Caller holds the lock
+        self.wait_time += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def acquire(self, connect, is_alive, close):
+        """
+        Check out a connection, opened with ``connect()`` when no idle one
+        can be reused. ``is_alive(connection)`` pings a connection that has
+        been idle a while; ``close(connection)`` closes one that is dropped.
+        Returns ``(connection, seconds spent waiting for it)``.
+        """
+        started = time.monotonic()
+        waited_for = 0.0
+        while True:
+            stale = []
+            try:
+                entry, waited = self._claim(started, stale)
+            finally:
+                # Outside the lock: closing may wait on the network
+                for old in stale:
+                    _close_quietly(close, old.connection)
+            if waited:
+                waited_for = time.monotonic() - started
+
+            if entry is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    with self._available:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._available.notify()
+                    raise
+                with self._lock:
+                    self._opened_at[id(connection)] = time.monotonic()
+                    self.created += 1
+                    self._checked_out(waited_for)
+                return connection, waited_for
+
+            if time.monotonic() - entry.returned_at <= self.check_interval or is_alive(entry.connection):
+                with self._lock:
+                    self._checked_out(waited_for)
+                return entry.connection, waited_for
+
+            # Dropped by the server while idle: replace it
+            with self._available:
+                self._discard(entry.connection)
+                self._in_use -= 1
+                self.failed_checks += 1
+                self._available.notify()
+            _close_quietly(close, entry.connection)
+
+    def _checked_out(self, waited_for):
+        # Caller holds the lock
+        self.checkouts += 1
+        if waited_for:
+            self._count_wait(waited_for)
+
+    def release(self, connection, reusable, close):
+        """
+        Return a checked-out connection; it is closed instead of kept when
+        not ``reusable`` or past its lifetime
+        """
+        now = time.monotonic()
+        stale = []
+        with self._available:
+            self._in_use -= 1
+            opened_at = self._opened_at.get(id(connection), now)
+            if reusable and now - opened_at <= self.max_lifetime:
+                self._idle.append(_Idle(connection, opened_at, now))
+            else:
+                self._discard(connection)
+                self.recycled += 1
+                stale.append(connection)
+            # Idle recycling for connections no checkout has reached
+            while self._idle and now - self._idle[0].returned_at > self.max_idle:
+                entry = self._idle.popleft()
+                self._discard(entry.connection)
+                self.recycled += 1
+                stale.append(entry.connection)
+            self._available.notify()
+        for old in stale:
+            _close_quietly(close, old)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'recycled': self.recycled,
+                'failed_checks': self.failed_checks,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _options(settings_dict):
+    options = {**DEFAULTS, **(settings_dict.get('POOL') or {})}
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f'Unknown POOL settings: {", ".join(sorted(unknown))}')
+    return {name.lower(): value for name, value in options.items()}
+
+
+def pool_for(alias, settings_dict):
+    """
+    The pool of this process for a database alias, created on first use
+    from the alias's ``POOL`` settings
+    """
+    # Test runs point the alias at another database; give it its own pool
+    key = (alias, settings_dict['NAME'], settings_dict.get('HOST'), settings_dict.get('PORT'))
+    pid = os.getpid()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != pid:
+            # Connections inherited across fork belong to the parent
+            pool = _pools[key] = ConnectionPool(alias, **_options(settings_dict))
+    return pool
+
+
+def stats():
+    """
+    Pool statistics of this process, keyed by database alias
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == pid]
+    return {pool.alias: pool.stats() for pool in pools}
@@ -0,0 +1,20 @@
+"""
+MySQL / MariaDB backend with pooled connections:
+
+    DATABASES = {'default': {'ENGINE': 'store.backends.pooled_mysql', 'POOL': {'MAX_SIZE': 10}, ...}}
+"""
+from django.db.backends.mysql import base
+
+from store.backends.base import PooledDatabaseWrapper
+
+
+class DatabaseWrapper(PooledDatabaseWrapper, base.DatabaseWrapper):
+
+    def ping(self, connection):
+        try:
+            # PyMySQL reconnects by default; a dropped connection is
+            # replaced through the pool instead
+            connection.ping(False)
+        except self.Database.Error:
+            return False
+        return True
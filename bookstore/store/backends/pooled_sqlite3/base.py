@@ -0,0 +1,24 @@
+"""
+SQLite backend with pooled connections, for exercising the pool without a
+MySQL server:
+
+    DATABASES = {'default': {'ENGINE': 'store.backends.pooled_sqlite3', 'POOL': {'MAX_SIZE': 4}, ...}}
+"""
+from django.db.backends.sqlite3 import base
+
+from store.backends.base import PooledDatabaseWrapper
+
+
+class DatabaseWrapper(PooledDatabaseWrapper, base.DatabaseWrapper):
+
+    def pool_enabled(self):
+        # An in-memory database lives and dies with its one connection,
+        # which Django never closes
+        return not self.is_in_memory_db()
+
+    def ping(self, connection):
+        try:
+            connection.execute('SELECT 1').close()
+        except self.Database.Error:
+            return False
+        return True
@@ -0,0 +1,18 @@
+"""
+Template context processors for the store app
+"""
+from django.utils.functional import SimpleLazyObject
+
+from store.services.order.cart_store import cart_count
+
+
+def cart(request):
+    """
+    Expose ``cart_count`` for the navbar badge. The value is only looked up
+    if a template uses it, and comes from the cache rather than the database.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'cart_count': 0}
+    # Customer shares its primary key with User, so no lookup is needed
+    return {'cart_count': SimpleLazyObject(lambda: cart_count(user.pk))}
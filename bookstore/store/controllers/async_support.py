@@ -0,0 +1,67 @@
+"""
+Helpers for the async views.
+
+Django's async ORM methods (``aexists``, ``ain_bulk``, ``async for`` ...)
+hand every query of a request to the same worker thread, so queries
+awaited together still run one after another. ``concurrently`` runs
+independent blocking calls in separate worker threads, each on its own
+database connection, so their round trips overlap. A pooled connection
+(store.backends) held by the request is handed back first: a request
+keeping one while its calls wait for more could, with every other request
+doing the same, leave the pool with nothing to give.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+from django.shortcuts import render
+
+from store.backends.base import PooledDatabaseWrapper
+
+
+def _in_worker(call):
+    def run():
+        try:
+            return call()
+        finally:
+            # Pool threads outlive the request; apply CONN_MAX_AGE to their
+            # connections as request_finished does for request threads
+            close_old_connections()
+    return run
+
+
+def _release_pooled_connections():
+    for connection in connections.all(initialized_only=True):
+        if (
+            isinstance(connection, PooledDatabaseWrapper) and connection.pool_enabled()
+            and not connection.in_atomic_block
+        ):
+            connection.close()
+
+
+async def concurrently(*calls):
+    """
+    Results of the blocking callables ``calls``, run at the same time
+    """
+    await sync_to_async(_release_pooled_connections)()
+    return await asyncio.gather(*(
+        sync_to_async(_in_worker(call), thread_sensitive=False)() for call in calls
+    ))
+
+
+async def request_user(request):
+    """
+    The signed-in user, or None. Loading the user reads the session and
+    the database, which the event loop must not do itself.
+    """
+    def load():
+        return request.user if request.user.is_authenticated else None
+    return await sync_to_async(load)()
+
+
+async def arender(request, template_name, context):
+    """
+    ``render()`` for async views: context processors read the session,
+    messages and cart count
+    """
+    return await sync_to_async(render)(request, template_name, context)
@@ -0,0 +1,53 @@
+"""
+Async versions of the catalog views, served by the ASGI deployment
+(see ASYNC_VIEWS in settings)
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+
+from store.controllers.async_support import arender
+from store.controllers.bookController.views import catalog_paginator, search_context
+from store.services.book import fragments
+from store.services.book.freshness import (
+    book_validators, catalog_validators, conditional_page, search_validators,
+)
+
+
+@conditional_page(catalog_validators)
+async def index(request):
+    """
+    Display one keyset-paginated page of books
+    """
+    paginator = catalog_paginator(request)
+    page = await paginator.apage(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        # Cache lookups, plus one query for the cards that are not cached
+        'books': await sync_to_async(fragments.cards)([book.id for book in page.object_list]),
+        'page': page,
+        'page_size': paginator.per_page,
+    }
+    return await arender(request, 'book/index.html', context)
+
+
+@conditional_page(book_validators)
+async def detail(request, book_id):
+    """
+    Display details of a specific book
+    """
+    book = await sync_to_async(fragments.detail)(book_id)
+    if book is None:
+        raise Http404('No Book matches the given query.')
+    return await arender(request, 'book/detail.html', {'book': book})
+
+
+@conditional_page(search_validators)
+async def search(request):
+    """
+    Search for books using the in-process ranked index
+    """
+    # Searching is CPU work on the in-process index; keep it off the event loop
+    context = await sync_to_async(search_context)(request)
+    return await arender(request, 'book/search_results.html', context)
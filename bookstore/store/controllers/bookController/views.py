@@ -1,47 +1,112 @@
 """
 Views for book module
 """
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse
+from urllib.parse import quote
+
+from django.shortcuts import render
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
 from store.models.book.models import Book
+from store.services.book import fragments
+from store.services.book.freshness import (
+    book_validators, catalog_validators, conditional_page, search_validators,
+)
+from store.services.book.catalog import CATALOG_ORDERING
+from store.services.book.search_index import search_books
+from store.services.book.suggest import AUTHOR, get_suggester
+from store.services.pagination import KeysetPaginator, clamp_page_size
+
 
+def catalog_paginator(request):
+    # Only the sort key is read here; the cards come from the fragment cache
+    return KeysetPaginator(
+        Book.objects.only(*(name.lstrip('-') for name in CATALOG_ORDERING)),
+        CATALOG_ORDERING,
+        per_page=clamp_page_size(request.GET.get('size')),
+    )
 
+
+@conditional_page(catalog_validators)
 def index(request):
     """
-    Display list of all books
+    Display one keyset-paginated page of books
     """
-    books = Book.objects.all()
+    paginator = catalog_paginator(request)
+    page = paginator.page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     context = {
-        'books': books
+        'books': fragments.cards([book.id for book in page.object_list]),
+        'page': page,
+        'page_size': paginator.per_page,
     }
     return render(request, 'book/index.html', context=context)
 
 
+@conditional_page(book_validators)
 def detail(request, book_id):
     """
     Display details of a specific book
     """
-    book = get_object_or_404(Book, id=book_id)
+    book = fragments.detail(book_id)
+    if book is None:
+        raise Http404('No Book matches the given query.')
     context = {
         'book': book
     }
     return render(request, 'book/detail.html', context=context)
 
 
-def search(request):
+def search_context(request):
     """
-    Search for books
+    Run the search described by the query string and return the context
+    of the results page
     """
     query = request.GET.get('q')
+    page_size = clamp_page_size(request.GET.get('size'))
+    try:
+        page_number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page_number = 1
     books = []
-    
+    total = 0
+
     if query:
-        books = Book.objects.filter(title__icontains=query) | \
-                Book.objects.filter(author__name__icontains=query) | \
-                Book.objects.filter(category__type__icontains=query)
-    
-    context = {
+        results = search_books(query, offset=(page_number - 1) * page_size, limit=page_size)
+        total = results.total
+        books = fragments.cards(results.book_ids)
+
+    return {
         'books': books,
-        'query': query
+        'query': query,
+        'total': total,
+        'page_number': page_number,
+        'page_size': page_size,
+        'has_previous': page_number > 1,
+        'has_next': page_number * page_size < total,
     }
-    return render(request, 'book/search_results.html', context=context)
\ No newline at end of file
+
+
+@conditional_page(search_validators)
+def search(request):
+    """
+    Search for books using the in-process ranked index
+    """
+    return render(request, 'book/search_results.html', context=search_context(request))
+
+
+def suggest(request):
+    """
+    Typeahead completions for the search box, as JSON
+    """
+    query = request.GET.get('q', '')
+    limit = clamp_page_size(request.GET.get('limit'), default=8, maximum=10)
+    suggestions = []
+    for kind, object_id, text in get_suggester().suggest(query, limit=limit):
+        if kind == AUTHOR:
+            url = f"{reverse('book:search')}?q={quote(text)}"
+        else:
+            url = reverse('book:detail', args=[object_id])
+        suggestions.append({'type': kind, 'id': object_id, 'text': text, 'url': url})
+    return JsonResponse({'query': query, 'suggestions': suggestions})
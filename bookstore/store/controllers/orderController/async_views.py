@@ -0,0 +1,110 @@
+"""
+Async versions of the order history and recommendation views, served by
+the ASGI deployment (see ASYNC_VIEWS in settings)
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.shortcuts import redirect
+
+from store.controllers.async_support import arender, concurrently, request_user
+from store.controllers.orderController.views import top_rated_book_ids
+from store.models.book.models import Book
+from store.models.customer.models import Customer
+from store.models.order.models import OrderItem
+from store.services.book import dimensions, ratings
+from store.services.order import recommendation_cache
+from store.services.order.copurchase import neighbor_book_ids
+from store.services.order.history import ORDER_HISTORY_ORDERING, order_history_queryset
+from store.services.pagination import KeysetPaginator, clamp_page_size
+
+
+async def order_history(request):
+    """
+    View order history
+    """
+    user = await request_user(request)
+    if user is None:
+        messages.error(request, 'Please login to view order history')
+        return redirect('customer:login')
+
+    # Customer shares its primary key with User, so the profile check and
+    # the page of summaries can be read at the same time
+    paginator = KeysetPaginator(
+        order_history_queryset(user.pk),
+        ORDER_HISTORY_ORDERING,
+        per_page=clamp_page_size(request.GET.get('size'), default=10, maximum=50),
+    )
+    is_customer, page = await concurrently(
+        Customer.objects.filter(pk=user.pk).exists,
+        lambda: paginator.page(after=request.GET.get('after'), before=request.GET.get('before')),
+    )
+    if is_customer:
+        context = {
+            'orders': page.object_list,
+            'page': page,
+            'page_size': paginator.per_page,
+        }
+    else:
+        messages.error(request, 'Customer profile not found')
+        context = {'orders': []}
+    return await arender(request, 'order/history.html', context)
+
+
+async def recommendations(request):
+    """
+    Recommend books based on purchase history and ratings
+    """
+    user = await request_user(request)
+    if user is None:
+        messages.error(request, 'Please login to see recommendations')
+        return redirect('customer:login')
+
+    is_customer, recommended_books = await asyncio.gather(
+        Customer.objects.filter(pk=user.pk).aexists(),
+        recommend_books_for_customer(user.pk),
+    )
+    if is_customer:
+        context = {'recommended_books': recommended_books}
+    else:
+        context = {'recommended_books': []}
+        messages.error(request, 'Customer profile not found')
+    return await arender(request, 'order/recommendations.html', context)
+
+
+async def recommend_books_for_customer(customer_id):
+    book_ids = await recommendation_cache.acustomer_book_ids(
+        customer_id, lambda: recommend_book_ids_for_customer(customer_id)
+    )
+    books = await Book.objects.ain_bulk(book_ids)
+    await sync_to_async(dimensions.attach)(list(books.values()))
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+async def recommend_book_ids_for_customer(customer_id):
+    """
+    Compute recommended book ids for a customer, bypassing the cache
+    """
+    purchased_book_ids = [
+        book_id async for book_id in
+        OrderItem.objects.filter(order__customer_id=customer_id, book__isnull=False)
+        .values_list('book_id', flat=True).distinct()
+    ]
+    if not purchased_book_ids:
+        return await sync_to_async(recommendation_cache.top_rated_book_ids)(top_rated_book_ids)
+
+    # Co-purchase neighbours and, for the category fallback, the categories
+    # of the purchases are both read at once; the categories are only used
+    # when no neighbours are found
+    recommended_book_ids, purchased_categories = await concurrently(
+        lambda: neighbor_book_ids(purchased_book_ids, limit=4),
+        lambda: list(
+            Book.objects.filter(id__in=purchased_book_ids).values_list('category', flat=True).distinct()
+        ),
+    )
+    if recommended_book_ids:
+        return recommended_book_ids
+    return await sync_to_async(ratings.top_rated_book_ids)(
+        purchased_categories, limit=4, exclude=purchased_book_ids
+    )
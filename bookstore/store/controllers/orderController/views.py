@@ -1,11 +1,19 @@
 """
 Views for order module
 """
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import Http404
 from store.models.book.models import Book
-from store.models.order.models import Cart, CartItem, Order, OrderItem, Payment, Shipping, Rating
+from store.models.order.models import OrderItem
 from store.models.customer.models import Customer
+from store.services.book import dimensions, ratings
+from store.services.order import checkout as checkout_service
+from store.services.order import recommendation_cache
+from store.services.order.cart_store import CartBusy, cart_lines, get_cart_store
+from store.services.order.copurchase import neighbor_book_ids
+from store.services.order.history import ORDER_HISTORY_ORDERING, order_history_queryset
+from store.services.pagination import KeysetPaginator, clamp_page_size
 
 
 def cart(request):
@@ -15,17 +23,14 @@ def cart(request):
     if request.user.is_authenticated:
         try:
             customer = Customer.objects.get(user=request.user)
-            cart, created = Cart.objects.get_or_create(customer=customer)
+            try:
+                get_cart_store().sync(customer.pk)
+            except CartBusy:
+                # The cart is being ordered; show what is already saved
+                pass
             
-            # Get all items in the cart
-            cart_items = CartItem.objects.filter(cart=cart)
-            
-            # Add item_total to each cart_item
-            for item in cart_items:
-                item.item_total = item.book.price * item.quantity
-            
-            # Calculate total
-            total = sum(item.book.price * item.quantity for item in cart_items)
+            # Line totals and the subtotal come back with the items
+            cart_items, total = cart_lines(customer.pk)
             
             context = {
                 'cart_items': cart_items,
@@ -47,22 +52,12 @@ def add_to_cart(request, book_id):
     """
     if request.user.is_authenticated:
         try:
-            book = get_object_or_404(Book, id=book_id)
-            customer = Customer.objects.get(user=request.user)
-            cart, created = Cart.objects.get_or_create(customer=customer)
-            
-            # Check if item already in cart
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                book=book,
-                defaults={'quantity': 1}
-            )
-            
-            if not created:
-                cart_item.quantity += 1
-                cart_item.save()
-            
-            messages.success(request, f'{book.title} added to cart!')
+            title = get_cart_store().add(request.user, book_id)
+            messages.success(request, f'{title} added to cart!')
+        except Book.DoesNotExist:
+            raise Http404('No Book matches the given query.')
+        except CartBusy:
+            messages.error(request, 'Your cart is being updated, please try again')
         except Customer.DoesNotExist:
             messages.error(request, 'Customer profile not found')
             return redirect('customer:login')
@@ -79,17 +74,17 @@ def remove_from_cart(request, item_id):
     """
     if request.user.is_authenticated:
         try:
-            cart_item = get_object_or_404(CartItem, id=item_id)
             customer = Customer.objects.get(user=request.user)
             
-            # Verify that the item belongs to the user's cart
-            if cart_item.cart.customer == customer:
-                cart_item.delete()
+            # Only lines in the user's own cart can be removed
+            if get_cart_store().remove(customer.pk, item_id):
                 messages.success(request, 'Item removed from cart!')
             else:
                 messages.error(request, 'Unauthorized access')
         except Customer.DoesNotExist:
             messages.error(request, 'Customer profile not found')
+        except CartBusy:
+            messages.error(request, 'Your cart is being updated, please try again')
     else:
         messages.error(request, 'Please login to manage your cart')
     
@@ -103,22 +98,16 @@ def checkout(request):
     if request.user.is_authenticated:
         try:
             customer = Customer.objects.get(user=request.user)
-            cart, created = Cart.objects.get_or_create(customer=customer)
+            get_cart_store().sync(customer.pk)
+            
+            # Line totals and the subtotal come back with the items
+            cart_items, subtotal = cart_lines(customer.pk)
             
-            if created or not cart.items.exists():
+            if not cart_items:
                 messages.error(request, 'Your cart is empty')
                 return redirect('order:cart')
             
-            # Get all items in the cart
-            cart_items = CartItem.objects.filter(cart=cart)
-            
-            # Add item_total to each cart_item
-            for item in cart_items:
-                item.item_total = item.book.price * item.quantity
-            
-            # Calculate total
-            subtotal = sum(item.book.price * item.quantity for item in cart_items)
-            shipping_fee = 5.00  # Fixed shipping fee for simplicity
+            shipping_fee = checkout_service.SHIPPING_FEE
             total = subtotal + shipping_fee
             
             context = {
@@ -130,6 +119,9 @@ def checkout(request):
         except Customer.DoesNotExist:
             messages.error(request, 'Customer profile not found')
             return redirect('customer:login')
+        except CartBusy:
+            messages.error(request, 'Your cart is being updated, please try again')
+            return redirect('order:cart')
         
         return render(request, 'order/checkout.html', context=context)
     else:
@@ -144,53 +136,25 @@ def place_order(request):
     if request.method == 'POST' and request.user.is_authenticated:
         try:
             customer = Customer.objects.get(user=request.user)
-            cart, created = Cart.objects.get_or_create(customer=customer)
-            
-            if created or not cart.items.exists():
+            cart_store = get_cart_store()
+            # A book added meanwhile goes into the next cart, not lost
+            with cart_store.locked(customer.pk):
+                cart_store.sync(customer.pk)
+                order = checkout_service.place_order(customer)
+                cart_store.clear(customer.pk)
+
+            if order is None:
                 messages.error(request, 'Your cart is empty')
                 return redirect('order:cart')
-            
-            # Calculate total
-            cart_items = CartItem.objects.filter(cart=cart)
-            total_price = sum(item.book.price * item.quantity for item in cart_items)
-            
-            # Create order
-            order = Order.objects.create(
-                customer=customer,
-                total_price=total_price
-            )
-            
-            # Create order items
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    book=cart_item.book,
-                    quantity=cart_item.quantity,
-                    price=cart_item.book.price,
-                    total=cart_item.book.price * cart_item.quantity
-                )
-            
-            # Create payment and shipping records
-            payment = Payment.objects.create(
-                order=order,
-                amount=total_price,
-                status='pending'
-            )
-            
-            shipping = Shipping.objects.create(
-                order=order,
-                fee=5.00,
-                status='pending'
-            )
-            
-            # Clear the cart
-            cart.items.all().delete()
-            
+
             messages.success(request, f'Order #{order.id} placed successfully!')
             return redirect('order:order_history')
         except Customer.DoesNotExist:
             messages.error(request, 'Customer profile not found')
             return redirect('customer:login')
+        except CartBusy:
+            messages.error(request, 'Your cart is being updated, please try again')
+            return redirect('order:cart')
     else:
         messages.error(request, 'Invalid request')
         return redirect('order:cart')
@@ -203,10 +167,20 @@ def order_history(request):
     if request.user.is_authenticated:
         try:
             customer = Customer.objects.get(user=request.user)
-            orders = Order.objects.filter(customer=customer).order_by('-order_date')
+            paginator = KeysetPaginator(
+                order_history_queryset(customer.pk),
+                ORDER_HISTORY_ORDERING,
+                per_page=clamp_page_size(request.GET.get('size'), default=10, maximum=50),
+            )
+            page = paginator.page(
+                after=request.GET.get('after'),
+                before=request.GET.get('before'),
+            )
             
             context = {
-                'orders': orders
+                'orders': page.object_list,
+                'page': page,
+                'page_size': paginator.per_page,
             }
         except Customer.DoesNotExist:
             messages.error(request, 'Customer profile not found')
@@ -246,69 +220,48 @@ def recommend_books_for_customer(customer):
     """
     Function to recommend books based on customer's purchase history and ratings
     """
-    # Get books from customer's past orders
-    order_items = OrderItem.objects.filter(order__customer=customer).select_related('book')
-    purchased_book_ids = [item.book.id for item in order_items]
+    book_ids = recommendation_cache.customer_book_ids(
+        customer.pk, lambda: recommend_book_ids_for_customer(customer)
+    )
+    books = Book.objects.in_bulk(book_ids)
+    dimensions.attach(list(books.values()))
+    return [books[book_id] for book_id in book_ids if book_id in books]
 
-    if not purchased_book_ids:
-        # If no purchase history, recommend top-rated books
-        from store.models.order.models import Rating
-        from django.db.models import Avg
 
-        top_rated_books = Book.objects.annotate(avg_rating=Avg('rating__score')).filter(
-            avg_rating__isnull=False
-        ).order_by('-avg_rating')[:4]
+def top_rated_book_ids():
+    """
+    Ids of the four best-rated books, shared by every customer without history
+    """
+    return ratings.top_rated_book_ids(limit=4)
 
-        return list(top_rated_books)
 
-    # Find other customers who bought similar books
-    # Get all orders that contain books the customer has purchased
-    similar_customers_orders = OrderItem.objects.filter(
-        book_id__in=purchased_book_ids
-    ).select_related('order__customer').exclude(
-        order__customer=customer
+def recommend_book_ids_for_customer(customer):
+    """
+    Compute recommended book ids for a customer, bypassing the cache
+    """
+    # Get books from customer's past orders
+    purchased_book_ids = list(
+        OrderItem.objects.filter(order__customer=customer, book__isnull=False)
+        .values_list('book_id', flat=True).distinct()
     )
 
-    # Get the customers who made these orders
-    similar_customer_ids = [item.order.customer.id for item in similar_customers_orders]
-
-    # Find books that these similar customers have purchased
-    recommended_books = set()
-    if similar_customer_ids:
-        books_bought_by_similar = OrderItem.objects.filter(
-            order__customer_id__in=similar_customer_ids
-        ).exclude(
-            book_id__in=purchased_book_ids
-        ).select_related('book')
-
-        # Sort by frequency of appearance among similar customers
-        book_frequency = {}
-        for item in books_bought_by_similar:
-            if item.book.id not in book_frequency:
-                book_frequency[item.book.id] = 0
-            book_frequency[item.book.id] += 1
+    if not purchased_book_ids:
+        # If no purchase history, recommend top-rated books
+        return recommendation_cache.top_rated_book_ids(top_rated_book_ids)
 
-        # Sort books by frequency and get top 4
-        sorted_books = sorted(book_frequency.items(), key=lambda x: x[1], reverse=True)
-        recommended_book_ids = [book_id for book_id, freq in sorted_books[:4]]
+    # Merge the precomputed co-purchase neighbours of everything the
+    # customer has bought ("customers who bought X also bought Y")
+    recommended_book_ids = neighbor_book_ids(purchased_book_ids, limit=4)
 
-        recommended_books = Book.objects.filter(id__in=recommended_book_ids)
-    else:
+    if not recommended_book_ids:
         # If no similar customers found, recommend based on ratings of similar categories
-        from django.db.models import Avg
-
-        # Get categories of books the customer has purchased
         purchased_categories = Book.objects.filter(
             id__in=purchased_book_ids
         ).values_list('category', flat=True).distinct()
 
         # Recommend top-rated books in these categories
-        recommended_books = Book.objects.filter(
-            category__in=purchased_categories
-        ).annotate(avg_rating=Avg('rating__score')).filter(
-            avg_rating__isnull=False
-        ).exclude(
-            id__in=purchased_book_ids
-        ).order_by('-avg_rating')[:4]
+        recommended_book_ids = ratings.top_rated_book_ids(
+            purchased_categories, limit=4, exclude=purchased_book_ids
+        )
 
-    return list(recommended_books)
\ No newline at end of file
+    return recommended_book_ids
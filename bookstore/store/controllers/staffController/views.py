@@ -1,10 +1,21 @@
 """
 Views for staff module
 """
+import codecs
+import datetime
+import uuid
+
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from store.models.book.models import Book, Author, Publisher, Category
+from store.models.order.supply_models import Supplier
 from store.models.staff.models import Staff
+from store import instrumentation
+from store.services import exports
+from store.services.book import dimensions
+from store.services.order import receiving, recommendation_cache
+from store.services.staff.dashboard import dashboard_data
 
 
 def index(request):
@@ -12,11 +23,8 @@ def index(request):
     Staff dashboard
     """
     if request.user.is_authenticated and hasattr(request.user, 'staff'):
-        # Count books and other stats
-        book_count = Book.objects.count()
-        context = {
-            'book_count': book_count
-        }
+        # Figures come from the sales rollups and cached counts
+        context = dashboard_data()
         return render(request, 'staff/dashboard.html', context=context)
     else:
         messages.error(request, 'Access denied. Staff only.')
@@ -36,13 +44,14 @@ def add_book(request):
         publisher_id = request.POST['publisher']
         category_id = request.POST['category']
         
-        # Get related objects
-        author = Author.objects.get(id=author_id)
-        publisher = Publisher.objects.get(id=publisher_id)
-        category = Category.objects.get(type=category_id)
+        # Get related objects from the dimension cache
+        author = dimensions.get(Author, author_id)
+        publisher = dimensions.get(Publisher, publisher_id)
+        category = dimensions.get(Category, category_id)
         
         # Create new book
         book = Book.objects.create(
+            id=uuid.uuid4().hex,
             title=title,
             author=author,
             price=price,
@@ -55,9 +64,9 @@ def add_book(request):
         return redirect('staff:inventory')
     
     # Get all authors, publishers, and categories for the form
-    authors = Author.objects.all()
-    publishers = Publisher.objects.all()
-    categories = Category.objects.all()
+    authors = dimensions.rows(Author)
+    publishers = dimensions.rows(Publisher)
+    categories = dimensions.rows(Category)
     
     context = {
         'authors': authors,
@@ -68,12 +77,115 @@ def add_book(request):
     return render(request, 'staff/add_book.html', context=context)
 
 
+def receive_stock(request):
+    """
+    Staff view to record a supplier delivery uploaded as CSV
+    (book_id, quantity, price) and add it to stock
+    """
+    if not (request.user.is_authenticated and hasattr(request.user, 'staff')):
+        messages.error(request, 'Access denied. Staff only.')
+        return redirect('book:index')
+
+    if request.method == 'POST':
+        upload = request.FILES.get('lines')
+        supplier_id = request.POST.get('supplier')
+        supplier = Supplier.objects.filter(id=supplier_id).first() if supplier_id else None
+        if upload is None:
+            messages.error(request, 'Please choose a CSV file to upload')
+        else:
+            try:
+                slip = receiving.receive_slip(
+                    receiving.parse_lines(codecs.iterdecode(upload, 'utf-8-sig')),
+                    supplier=supplier,
+                    staff=request.user.staff,
+                )
+            except receiving.ReceivingError as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, f'Import slip {slip.id} recorded, {slip.details.count()} lines received')
+                return redirect('staff:inventory')
+
+    context = {
+        'suppliers': Supplier.objects.all()
+    }
+    return render(request, 'staff/receive_stock.html', context=context)
+
+
 def inventory(request):
     """
     View to manage book inventory
     """
-    books = Book.objects.all()
+    # Authors, publishers and categories come from the dimension cache
+    books = dimensions.attach(list(Book.objects.all()))
     context = {
         'books': books
     }
-    return render(request, 'staff/inventory.html', context=context)
\ No newline at end of file
+    return render(request, 'staff/inventory.html', context=context)
+
+
+def _export_response(request, name, columns, rows):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.EXPORT_FORMATS:
+        return HttpResponseBadRequest('format must be csv or jsonl')
+    response = StreamingHttpResponse(
+        (line.encode() for line in exports.render(fmt, columns, rows)),
+        content_type=exports.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+def export_inventory(request):
+    """
+    Stream every book with its author, publisher and category as CSV or JSONL
+    """
+    if not (request.user.is_authenticated and hasattr(request.user, 'staff')):
+        messages.error(request, 'Access denied. Staff only.')
+        return redirect('book:index')
+    return _export_response(request, 'inventory', exports.INVENTORY_COLUMNS, exports.inventory_rows())
+
+
+def export_orders(request):
+    """
+    Stream order lines with their payment and invoice as CSV or JSONL,
+    optionally limited to ?since=YYYY-MM-DD&until=YYYY-MM-DD
+    """
+    if not (request.user.is_authenticated and hasattr(request.user, 'staff')):
+        messages.error(request, 'Access denied. Staff only.')
+        return redirect('book:index')
+    try:
+        since, until = (
+            datetime.date.fromisoformat(request.GET[name]) if request.GET.get(name) else None
+            for name in ('since', 'until')
+        )
+    except ValueError:
+        return HttpResponseBadRequest('since and until must be dates (YYYY-MM-DD)')
+    name = '_'.join(['orders'] + [day.isoformat() for day in (since, until) if day])
+    return _export_response(request, name, exports.ORDER_COLUMNS, exports.order_rows(since, until))
+
+
+def cache_stats(request):
+    """
+    Staff-only JSON view of cache hit/miss counters for this worker process
+    """
+    if not (request.user.is_authenticated and hasattr(request.user, 'staff')):
+        return JsonResponse({'error': 'Access denied. Staff only.'}, status=403)
+    return JsonResponse({
+        'recommendations': recommendation_cache.stats_snapshot(),
+        'dimensions': dimensions.stats_snapshot(),
+    })
+
+
+def query_stats(request):
+    """
+    Staff-only JSON view of per-view query counts, database time and
+    fragment cache hit rates, and connection pool figures, for this
+    worker process
+    """
+    if not (request.user.is_authenticated and hasattr(request.user, 'staff')):
+        return JsonResponse({'error': 'Access denied. Staff only.'}, status=403)
+    return JsonResponse({
+        'views': instrumentation.stats.snapshot(),
+        'fragments': instrumentation.stats.fragment_totals(),
+        'pools': instrumentation.pool_stats(),
+    })
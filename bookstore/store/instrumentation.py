@@ -0,0 +1,319 @@
+"""
+Per-view SQL instrumentation.
+
+QueryStatsMiddleware (store.middleware) records, for every request, how
+many statements were sent, how long the database took and which SQL
+fingerprint repeated most, and folds that into process-local per-view
+totals keyed by the resolved view name (``book:index``). A fingerprint
+repeated many times in one request is the signature of an N+1 pattern.
+Cached fragment lookups made during the request are counted alongside,
+as is time spent waiting for a free connection of the pooled backends
+(store.backends), whose process-wide figures ``pool_stats`` returns.
+
+Every connection gets one execute wrapper when it is opened, and the
+recorders of the request are found through a context variable, so
+statements are counted whichever thread sends them: the request's own,
+or the worker threads asgiref and the async views run the ORM in.
+
+QUERY_BUDGETS maps view names to the most queries one request may send.
+Requests over budget are logged; ``query_budget`` turns them into test
+failures.
+"""
+import contextlib
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import Signal, receiver
+
+from store.backends import pool
+
+logger = logging.getLogger('store.queries')
+
+# Sent after each instrumented request with ``view_name`` and ``recorder``
+request_recorded = Signal()
+
+# Recorders active in this context, innermost last; asgiref copies the
+# context into the threads it runs sync code in
+_active = contextvars.ContextVar('store_query_recorders', default=())
+
+_IN_LIST = re.compile(r'\bIN\s*\(\s*%s(?:\s*,\s*%s)*\s*\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    SQL with literals and IN-list lengths normalised, so the same query
+    issued for different rows compares equal
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _observe(execute, sql, params, many, context):
+    recorders = _active.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        statement = fingerprint(sql)
+        for recorder in recorders:
+            recorder.add(elapsed, statement)
+
+
+def _install(connection):
+    if _observe not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe)
+
+
+@receiver(connection_created, dispatch_uid='store_instrumentation')
+def _instrument_connection(sender, connection, **kwargs):
+    _install(connection)
+
+
+class QueryRecorder:
+    """
+    Statement count, database time and fingerprints of one request
+    """
+
+    def __init__(self):
+        # Async views may send statements from several threads at once
+        self._lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        self.pool_wait = 0.0
+
+    def add(self, duration, statement):
+        with self._lock:
+            self.duration += duration
+            self.count += 1
+            self.fingerprints[statement] += 1
+
+    def add_fragments(self, hits, misses):
+        with self._lock:
+            self.fragment_hits += hits
+            self.fragment_misses += misses
+
+    def add_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_wait += seconds
+
+    @contextlib.contextmanager
+    def record(self):
+        """
+        Record statements sent in this context, by this thread or by
+        threads running code on its behalf
+        """
+        # Connections opened before this module was imported
+        for connection in connections.all():
+            _install(connection)
+        token = _active.set(_active.get() + (self,))
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def most_repeated(self):
+        """
+        ``(fingerprint, times)`` of the most repeated statement, or None
+        """
+        top = self.fingerprints.most_common(1)
+        return top[0] if top else None
+
+
+def count_fragments(hits, misses):
+    """
+    Add cached fragment lookups to the request being recorded, if any
+    """
+    recorders = _active.get()
+    if recorders:
+        recorders[-1].add_fragments(hits, misses)
+
+
+def count_pool_wait(seconds):
+    """
+    Add time spent waiting for a pooled connection to the request being
+    recorded, if any
+    """
+    recorders = _active.get()
+    if recorders:
+        recorders[-1].add_pool_wait(seconds)
+
+
+def pool_stats():
+    """
+    Connection pool figures of this process per database alias: open, in
+    use and idle connections, waits, wait time and recycled connections
+    """
+    return pool.stats()
+
+
+def _hit_rate(hits, misses):
+    return round(hits / (hits + misses), 4) if hits + misses else None
+
+
+def budget_for(view_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+class ViewStats:
+    """
+    Running totals for one view
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.over_budget = 0
+        self.worst_repeat = None
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        self.pool_wait = 0.0
+
+    def add(self, recorder, budget):
+        self.requests += 1
+        self.queries += recorder.count
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.db_time += recorder.duration
+        self.fragment_hits += recorder.fragment_hits
+        self.fragment_misses += recorder.fragment_misses
+        self.pool_wait += recorder.pool_wait
+        if budget is not None and recorder.count > budget:
+            self.over_budget += 1
+        repeat = recorder.most_repeated()
+        if repeat is not None and (self.worst_repeat is None or repeat[1] > self.worst_repeat[1]):
+            self.worst_repeat = repeat
+
+    def as_dict(self, budget):
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'avg_queries': round(self.queries / self.requests, 2) if self.requests else None,
+            'max_queries': self.max_queries,
+            'db_time_ms': round(self.db_time * 1000, 3),
+            'avg_db_time_ms': round(self.db_time * 1000 / self.requests, 3) if self.requests else None,
+            'pool_wait_ms': round(self.pool_wait * 1000, 3),
+            'budget': budget,
+            'over_budget': self.over_budget,
+            'most_repeated': (
+                {'sql': self.worst_repeat[0], 'times': self.worst_repeat[1]}
+                if self.worst_repeat else None
+            ),
+            'fragments': {
+                'hits': self.fragment_hits,
+                'misses': self.fragment_misses,
+                'hit_rate': _hit_rate(self.fragment_hits, self.fragment_misses),
+            },
+        }
+
+
+class QueryStats:
+    """
+    Process-local per-view statistics
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, recorder):
+        budget = budget_for(view_name)
+        with self._lock:
+            self._views.setdefault(view_name, ViewStats()).add(recorder, budget)
+        if budget is not None and recorder.count > budget:
+            repeat = recorder.most_repeated()
+            logger.warning(
+                '%s sent %d queries (budget %d); most repeated %dx: %s',
+                view_name, recorder.count, budget, repeat[1], repeat[0],
+            )
+        request_recorded.send(sender=None, view_name=view_name, recorder=recorder)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: view.as_dict(budget_for(name)) for name, view in sorted(self._views.items())}
+
+    def fragment_totals(self):
+        """
+        Cached fragment hits and misses over every view
+        """
+        with self._lock:
+            hits = sum(view.fragment_hits for view in self._views.values())
+            misses = sum(view.fragment_misses for view in self._views.values())
+        return {'hits': hits, 'misses': misses, 'hit_rate': _hit_rate(hits, misses)}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+stats = QueryStats()
+
+
+class query_budget(contextlib.ContextDecorator):
+    """
+    Fail when a request to a view sends more queries than allowed:
+
+        @query_budget('book:index', 3)
+        def test_catalog(self): ...
+
+        with query_budget({'order:cart': 6, 'order:checkout': 6}):
+            client.get(...)
+
+    Views named explicitly must be requested at least once inside the
+    block; with no arguments every view in QUERY_BUDGETS that is requested
+    is checked. Needs QueryStatsMiddleware.
+    """
+
+    def __init__(self, view_name=None, max_queries=None):
+        self.explicit = view_name is not None
+        if isinstance(view_name, dict):
+            self.budgets = dict(view_name)
+        elif view_name is not None:
+            self.budgets = {view_name: max_queries if max_queries is not None else budget_for(view_name)}
+        else:
+            self.budgets = dict(getattr(settings, 'QUERY_BUDGETS', {}))
+
+    def _on_request(self, sender, view_name, recorder, **kwargs):
+        if view_name in self.budgets:
+            self.seen.add(view_name)
+            if recorder.count > self.budgets[view_name]:
+                self.violations.append((view_name, recorder.count, recorder.most_repeated()))
+
+    def __enter__(self):
+        self.seen = set()
+        self.violations = []
+        request_recorded.connect(self._on_request, dispatch_uid=id(self))
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        request_recorded.disconnect(dispatch_uid=id(self))
+        if exc_type is not None:
+            return False
+        problems = [
+            f'{view_name}: {count} queries, budget {self.budgets[view_name]}'
+            + (f'; {repeat[1]}x {repeat[0]}' if repeat else '')
+            for view_name, count, repeat in self.violations
+        ]
+        if self.explicit:
+            problems += [f'{name}: never requested' for name in self.budgets if name not in self.seen]
+        if problems:
+            raise AssertionError('Query budget exceeded:\n' + '\n'.join(problems))
+        return False
@@ -0,0 +1,51 @@
+"""
+EXPLAIN the queries behind the hot views and fail on full scans or filesorts
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.query_plans import PlanChecker, hot_views
+
+
+class Command(BaseCommand):
+    help = ('Request each hot view against the current (seeded) database, EXPLAIN every SELECT it '
+            'runs, and exit with an error if a plan scans a whole table or sorts outside an index')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Ignore full scans of tables with fewer rows than this')
+        parser.add_argument('--allow-table', action='append', default=[],
+                            help='Table whose full scans and sorts are accepted (repeatable)')
+        parser.add_argument('--view', action='append', default=[],
+                            help='Only check the named view(s)')
+
+    def handle(self, *args, **options):
+        try:
+            checker = PlanChecker(options['database'], options['min_rows'], options['allow_table'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        failures = 0
+        for name, path, user in hot_views():
+            if options['view'] and name not in options['view']:
+                continue
+            view = checker.check(name, path, user)
+            problems = view.problems
+            summary = f'{name} ({path}): HTTP {view.status}, {len(view.statements)} SELECTs'
+            if not view.ok:
+                # A redirect (e.g. checkout with an empty cart) or an error
+                # page says nothing about the plans of the view itself
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'FAIL {summary}, expected HTTP 200'))
+                continue
+            if not problems:
+                self.stdout.write(self.style.SUCCESS(f'OK   {summary}'))
+                continue
+            failures += 1
+            self.stdout.write(self.style.ERROR(f'FAIL {summary}'))
+            for statement, problem in problems:
+                self.stdout.write(f'  {problem.kind} {problem.table}: {problem.detail}'.rstrip())
+                self.stdout.write(f'    {statement.sql}')
+
+        if failures:
+            raise CommandError(f'{failures} view(s) did not render or have query plans with full scans or filesorts')
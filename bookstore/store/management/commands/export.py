@@ -0,0 +1,52 @@
+"""
+Stream the inventory or order lines to a CSV or JSONL file
+"""
+import datetime
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.services import exports
+
+
+class Command(BaseCommand):
+    help = 'Export the inventory or order lines as CSV or JSON Lines, streaming rows from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=['inventory', 'orders'])
+        parser.add_argument('--format', choices=exports.EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='Output file (default: standard output)')
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='Orders placed on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', type=datetime.date.fromisoformat,
+                            help='Orders placed on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        if options['dataset'] == 'inventory':
+            columns = exports.INVENTORY_COLUMNS
+            rows = exports.inventory_rows(options['chunk_size'])
+        else:
+            columns = exports.ORDER_COLUMNS
+            rows = exports.order_rows(options['since'], options['until'], options['chunk_size'])
+
+        started = time.perf_counter()
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        lines = exports.render(options['format'], columns, counted(rows))
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as stream:
+                stream.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Exported {count} rows in {elapsed:.2f}s')
@@ -0,0 +1,56 @@
+"""
+Bulk import books (with their authors, publishers and categories) from
+CSV or JSON Lines
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.book.catalog_import import CatalogImporter, Checkpoint, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL catalog file and upsert its books in batches, resuming from a checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or .jsonl/.ndjson file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows upserted per transaction')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and import from the first row')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            checkpoint = Checkpoint(options['checkpoint'] or f'{path}.checkpoint', path)
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+        skip = 0 if options['restart'] else checkpoint.load()
+        if skip:
+            self.stdout.write(f'Resuming after row {skip} from {checkpoint.path}')
+
+        importer = CatalogImporter(batch_size=options['batch_size']).load_lookups()
+
+        def progress(consumed, rate):
+            self.stdout.write(f'{consumed} rows, {rate:.0f} rows/s')
+
+        started = time.perf_counter()
+        try:
+            consumed = importer.run(read_rows(path, options['format']), checkpoint, skip, progress)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        checkpoint.clear()
+
+        for line_number, reason in importer.skipped:
+            self.stderr.write(f'Skipped line {line_number}: {reason}')
+        rate = (consumed - skip) / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} books from {consumed - skip} rows '
+            f'({len(importer.skipped)} skipped) in {elapsed:.2f}s, {rate:.0f} rows/s'
+        ))
+        self.stdout.write('Run rebuild_search_index to make the imported books searchable')
@@ -0,0 +1,38 @@
+"""
+Rebuild the item-to-item co-purchase table used for recommendations
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.order import copurchase
+
+
+class Command(BaseCommand):
+    help = 'Recompute the top-N co-purchase neighbours of every book from OrderItem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes; each counts one partition of the books')
+        parser.add_argument('--top-n', type=int, default=copurchase.TOP_N,
+                            help='Neighbours kept per book')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Rows fetched per database round trip')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        started = time.perf_counter()
+        written = copurchase.rebuild(
+            workers=options['workers'],
+            top_n=options['top_n'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} neighbour rows in {elapsed:.2f}s using {options["workers"]} worker(s)'
+        ))
@@ -0,0 +1,38 @@
+"""
+Backfill or repair the OrderSummary read model
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models.order.models import Order
+from store.services.order.history import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild OrderSummary rows from Order/OrderItem in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Orders rebuilt per transaction')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Only build summaries for orders that have none')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.order_by('id')
+        if options['missing_only']:
+            orders = orders.filter(summary__isnull=True)
+
+        started = time.perf_counter()
+        chunk = []
+        total = 0
+        for order_id in orders.values_list('id', flat=True).iterator(chunk_size=options['chunk_size']):
+            chunk.append(order_id)
+            if len(chunk) >= options['chunk_size']:
+                total += rebuild_summaries(chunk)
+                chunk = []
+        if chunk:
+            total += rebuild_summaries(chunk)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} order summaries in {elapsed:.2f}s'))
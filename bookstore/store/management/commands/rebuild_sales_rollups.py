@@ -0,0 +1,34 @@
+"""
+Backfill or repair the sales rollup tables behind the staff dashboard
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.order.sales import rebuild
+
+
+def parse_day(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}; use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailySales, DailyCategorySales and DailyBookSales from Order/OrderItem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_day,
+                            help='First day to rebuild (default: first order)')
+        parser.add_argument('--until', type=parse_day,
+                            help='Last day to rebuild (default: last order)')
+        parser.add_argument('--days-per-chunk', type=int, default=7,
+                            help='Days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        days = rebuild(options['since'], options['until'], days_per_chunk=options['days_per_chunk'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} days in {elapsed:.2f}s'))
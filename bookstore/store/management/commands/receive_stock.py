@@ -0,0 +1,45 @@
+"""
+Record a supplier delivery from a CSV file and add it to stock
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models.order.supply_models import Supplier
+from store.models.staff.models import Staff
+from store.services.order.receiving import ReceivingError, parse_lines, receive_slip
+
+
+class Command(BaseCommand):
+    help = 'Create an ImportSlip from a book_id,quantity,price CSV file and raise instock for every line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with book_id, quantity and price columns')
+        parser.add_argument('--supplier', help='Supplier id')
+        parser.add_argument('--staff', help='Username of the staff member receiving the delivery')
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help='Import date, YYYY-MM-DD (default: today)')
+
+    def handle(self, *args, **options):
+        supplier = staff = None
+        try:
+            if options['supplier']:
+                supplier = Supplier.objects.get(id=options['supplier'])
+            if options['staff']:
+                staff = Staff.objects.get(user__username=options['staff'])
+        except (Supplier.DoesNotExist, Staff.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                lines = parse_lines(stream)
+            slip = receive_slip(lines, supplier=supplier, staff=staff, import_date=options['date'])
+        except (OSError, ReceivingError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Import slip {slip.id}: {len(lines)} lines, total {slip.total}, received in {elapsed:.2f}s'
+        ))
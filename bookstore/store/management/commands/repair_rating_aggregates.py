@@ -0,0 +1,24 @@
+"""
+Recompute the rating aggregates on Book from the Rating table
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.services.book.ratings import repair_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_count, rating_sum, the score histogram and rate for every book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Books written per bulk update')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Rows fetched per round trip while reading ratings')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rated = repair_aggregates(batch_size=options['batch_size'], chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Repaired rating aggregates of {rated} books in {elapsed:.2f}s'))
@@ -0,0 +1,114 @@
+"""
+Middleware for store
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from store import routers
+from store.instrumentation import QueryRecorder, stats
+
+# Session key holding the time until which the session reads from the primary
+PRIMARY_PIN_KEY = '_db_primary_until'
+
+
+class QueryStatsMiddleware:
+    """
+    Record query count, database time and the most repeated statement of
+    every request under its resolved view name (see store.instrumentation).
+
+    With QUERY_STATS_HEADER on, responses also carry ``X-DB-Queries``, a
+    ``Server-Timing`` entry for the database time and, when cached
+    fragments were looked up, ``X-Fragment-Cache`` hit and miss counts.
+    Time spent waiting for a pooled connection gets its own
+    ``Server-Timing`` entry.
+    Queries sent while a streaming response is being iterated are not
+    counted. Works under WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # 404s and requests answered before URL resolution
+            return response
+        stats.record(match.view_name, recorder)
+
+        if getattr(settings, 'QUERY_STATS_HEADER', False):
+            response['X-DB-Queries'] = str(recorder.count)
+            timing = f'db;dur={recorder.duration * 1000:.3f};desc="{recorder.count} queries"'
+            if recorder.pool_wait:
+                timing += f', pool;dur={recorder.pool_wait * 1000:.3f};desc="connection wait"'
+            response['Server-Timing'] = timing
+            if recorder.fragment_hits or recorder.fragment_misses:
+                response['X-Fragment-Cache'] = f'hits={recorder.fragment_hits}; misses={recorder.fragment_misses}'
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Send the reads of GET and HEAD requests to the views in REPLICA_VIEWS
+    to a read replica (see store.routers), except for sessions that wrote
+    in the last REPLICA_STICKY_SECONDS. Must come after SessionMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.routing(routers.RequestRouting()) as state:
+            request.db_routing = state
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with routers.routing(routers.RequestRouting()) as state:
+            request.db_routing = state
+            response = await self.get_response(request)
+        if state.wrote:
+            # Saving the pin may load the session from the database
+            return await sync_to_async(self.finish)(request, response, state)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = request.db_routing
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in getattr(settings, 'REPLICA_VIEWS', ())
+            and routers.replica_weights()
+        ):
+            state.read_only = True
+            state.pinned = state.pinned or request.session.get(PRIMARY_PIN_KEY, 0) > time.time()
+        return None
+
+    def finish(self, request, response, state):
+        if state.wrote and routers.replica_weights() and hasattr(request, 'session'):
+            request.session[PRIMARY_PIN_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        return response
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_bookneighbor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='store.order')),
+                ('order_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=50)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('item_count', models.IntegerField(default=0)),
+                ('first_titles', models.JSONField(default=list)),
+                ('lines', models.JSONField(default=list)),
+                ('customer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='store.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', '-order_date', '-order'], name='ordersummary_history_idx')],
+            },
+        ),
+    ]
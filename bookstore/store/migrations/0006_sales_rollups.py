@@ -0,0 +1,58 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('book_id', models.CharField(blank=True, default='', max_length=50)),
+                ('publisher_id', models.CharField(blank=True, default='', max_length=50)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category_type', models.CharField(blank=True, default='', max_length=100)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category_type'), name='dailycategorysales_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='dailybooksales',
+            index=models.Index(fields=['day', 'publisher_id'], name='dailybooksales_pub_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybooksales',
+            constraint=models.UniqueConstraint(fields=('day', 'book_id'), name='dailybooksales_uniq'),
+        ),
+    ]
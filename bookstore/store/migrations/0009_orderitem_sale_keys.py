@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_catalog_modification_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='category_type',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='publisher_id',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
@@ -43,4 +43,6 @@ from .book.models import *
 from .customer.models import *
 from .staff.models import *
 from .order.models import *
-from .order.supply_models import *
\ No newline at end of file
+from .order.supply_models import *
+from .order.recommendation_models import *
+from .order.sales_models import *
\ No newline at end of file
@@ -7,6 +7,7 @@ class Category(models.Model):
     """
     type = models.CharField(max_length=100, primary_key=True)
     description = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.type
@@ -20,6 +21,7 @@ class Publisher(models.Model):
     name = models.CharField(max_length=200)
     address = models.CharField(max_length=500, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -36,6 +38,7 @@ class Author(models.Model):
     address = models.CharField(max_length=500, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -54,6 +57,40 @@ class Book(models.Model):
     publisher = models.ForeignKey(Publisher, on_delete=models.SET_NULL, null=True, related_name='books')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='books')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set on save; bulk UPDATEs of shown fields set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Running rating aggregates, maintained from Rating signals;
+    # rate is rating_sum / rating_count
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination key for the catalog listing
+            models.Index(fields=['-created_at', '-id'], name='book_created_id_idx'),
+            # Top-rated leaderboards per category
+            models.Index(fields=['category', '-rate', '-rating_count', 'id'], name='book_category_rate_idx'),
+            models.Index(fields=['-rate', '-rating_count', 'id'], name='book_rate_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class CatalogVersion(models.Model):
+    """
+    Single row counting committed catalog changes; conditional GETs of the
+    catalog listings are validated against it (see
+    store.services.book.freshness)
+    """
+    number = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"Catalog version {self.number}"
\ No newline at end of file
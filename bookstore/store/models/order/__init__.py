@@ -1,2 +1,4 @@
 from .models import *
-from .supply_models import *
\ No newline at end of file
+from .supply_models import *
+from .recommendation_models import *
+from .sales_models import *
\ No newline at end of file
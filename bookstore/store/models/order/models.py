@@ -24,6 +24,12 @@ class CartItem(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            # get_or_create(cart=..., book=...) when adding to the cart
+            models.Index(fields=['cart', 'book'], name='cartitem_cart_book_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity}x {self.book.title} in cart"
 
@@ -46,6 +52,22 @@ class Order(models.Model):
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            # A customer's orders, newest first
+            models.Index(fields=['customer', '-order_date'], name='order_customer_date_idx'),
+            # Date-range scans: exports and sales rollup rebuilds
+            models.Index(fields=['order_date', 'id'], name='order_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so signal handlers can tell whether a
+        # save cancelled the order (or brought it back)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return f"Order {self.id} - {self.customer.user.fullname}"
 
@@ -60,6 +82,17 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=12, decimal_places=2)
     total = models.DecimalField(max_digits=12, decimal_places=2)
+    # The book's category and publisher when it was sold ('' for none),
+    # which the sales rollups count the line under; null on lines written
+    # before they were recorded
+    category_type = models.CharField(max_length=100, blank=True, null=True)
+    publisher_id = models.CharField(max_length=50, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Who bought a book (co-purchase counts, per-book sales)
+            models.Index(fields=['book', 'order'], name='orderitem_book_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.quantity}x {self.book.title} in order {self.order.id}"
@@ -114,6 +147,20 @@ class Rating(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # A book's ratings by score (aggregate repair, per-book listings)
+            models.Index(fields=['book', 'score'], name='rating_book_score_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so signal handlers can apply the
+        # difference to the book's rating aggregates
+        instance._loaded = (instance.__dict__.get('book_id'), instance.__dict__.get('score'))
+        return instance
+
     def __str__(self):
         return f"{self.customer.user.fullname} rated {self.book.title}: {self.score}/5"
 
@@ -129,6 +176,12 @@ class Voucher(models.Model):
     end_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Vouchers valid on a given day
+            models.Index(fields=['start_date', 'end_date'], name='voucher_dates_idx'),
+        ]
+
     def __str__(self):
         return f"Voucher {self.code}"
 
@@ -157,4 +210,28 @@ class OrderHistory(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='history')
 
     def __str__(self):
-        return f"Status {self.status} for order {self.order.id}"
\ No newline at end of file
+        return f"Status {self.status} for order {self.order.id}"
+
+
+class OrderSummary(models.Model):
+    """
+    Read model for customer-facing order listings: one row per order with
+    a snapshot of its lines, so listings need no joins and keep titles of
+    books that were later deleted
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True)
+    order_date = models.DateTimeField()
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES, default='pending')
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    item_count = models.IntegerField(default=0)
+    first_titles = models.JSONField(default=list)
+    lines = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', '-order_date', '-order'], name='ordersummary_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary of order {self.order_id}"
@@ -0,0 +1,24 @@
+from django.db import models
+from store.models.book.models import Book
+
+
+class BookNeighbor(models.Model):
+    """
+    Item-to-item co-purchase model: how many customers bought both books.
+    Rebuilt in bulk by `manage.py rebuild_copurchase` and updated
+    incrementally when an order is placed.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'neighbor'], name='bookneighbor_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-score'], name='bookneighbor_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbor_id} ({self.score})"
@@ -0,0 +1,61 @@
+from django.db import models
+
+
+class DailySales(models.Model):
+    """
+    Sales rollup: one row per day. Cancelled orders are not counted.
+    Maintained by store.services.order.sales and rebuilt by
+    `manage.py rebuild_sales_rollups`.
+    """
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, {self.revenue}"
+
+
+class DailyCategorySales(models.Model):
+    """
+    Sales rollup: one row per day and category. ``category_type`` is the
+    Category key at the time of sale ('' for uncategorised books).
+    """
+    day = models.DateField()
+    category_type = models.CharField(max_length=100, blank=True, default='')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category_type'], name='dailycategorysales_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_type or '-'}: {self.revenue}"
+
+
+class DailyBookSales(models.Model):
+    """
+    Sales rollup: one row per day and book, with the book's publisher at
+    the time of sale so publisher totals need no join. Plain keys rather
+    than foreign keys keep history when a book is deleted.
+    """
+    day = models.DateField()
+    book_id = models.CharField(max_length=50, blank=True, default='')
+    publisher_id = models.CharField(max_length=50, blank=True, default='')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'book_id'], name='dailybooksales_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'publisher_id'], name='dailybooksales_pub_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.book_id or '-'}: {self.revenue}"
@@ -0,0 +1,205 @@
+"""
+Primary/replica database routing.
+
+Writes, and by default reads, go to the ``default`` database (the
+primary). Aliases listed in DATABASE_REPLICAS are read replicas of it,
+used only for reads of the store's own models by the views named in
+REPLICA_VIEWS (catalog, search, order history, ...) and by code inside
+``replica_reads()``. Sessions, permissions and content types always come
+from the primary.
+
+A request that writes is routed to the primary for the rest of its reads,
+and ReplicaRoutingMiddleware pins its session to the primary for the next
+REPLICA_STICKY_SECONDS, so a customer sees their own order or cart change
+on the page that follows even when the replicas lag behind. Non-GET
+requests never read from a replica. Caches shared by every session are
+filled inside ``primary_reads()``, so a lagging replica cannot store old
+data under a fresh key.
+
+Each request picks one replica by smooth weighted round robin, opening
+its connection up front; a replica that cannot be reached is skipped for
+REPLICA_RETRY_SECONDS, and with none left reads fall back to the primary.
+Failures after a replica has been connected to are not retried.
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger('store.routers')
+
+PRIMARY = DEFAULT_DB_ALIAS
+REPLICA_APPS = {'store'}
+
+_PRIMARY = 'primary'
+_REPLICA = 'replica'
+
+# Routing state of the request being served; mutable, so the threads
+# asgiref runs sync code in share it with the request
+_routing = contextvars.ContextVar('store_db_routing', default=None)
+# Set by primary_reads() / replica_reads() for the code inside them
+_override = contextvars.ContextVar('store_db_reads', default=None)
+
+
+class RequestRouting:
+    """
+    Where one request reads from
+    """
+
+    def __init__(self, read_only=False, pinned=False):
+        self.read_only = read_only
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+class ReplicaSet:
+    """
+    Smooth weighted round robin over the replicas that are not marked down
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = {}
+        self._down_until = {}
+
+    def choose(self, weights, exclude=()):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                alias for alias, weight in weights.items()
+                if weight > 0 and alias not in exclude and self._down_until.get(alias, 0) <= now
+            ]
+            if not candidates:
+                return None
+            for alias in candidates:
+                self._current[alias] = self._current.get(alias, 0) + weights[alias]
+            chosen = max(candidates, key=lambda alias: self._current[alias])
+            self._current[chosen] -= sum(weights[alias] for alias in candidates)
+            return chosen
+
+    def mark_down(self, alias, seconds):
+        with self._lock:
+            self._down_until[alias] = time.monotonic() + seconds
+
+    def down(self):
+        now = time.monotonic()
+        with self._lock:
+            return sorted(alias for alias, until in self._down_until.items() if until > now)
+
+
+replicas = ReplicaSet()
+
+
+def replica_weights():
+    return getattr(settings, 'DATABASE_REPLICAS', {})
+
+
+def _connected(alias):
+    connection = connections[alias]
+    if connection.connection is not None:
+        return True
+    try:
+        connection.ensure_connection()
+    except DatabaseError as exc:
+        logger.warning('Replica %s unavailable, reading from the primary: %s', alias, exc)
+        replicas.mark_down(alias, getattr(settings, 'REPLICA_RETRY_SECONDS', 30))
+        return False
+    return True
+
+
+def replica_for(routing):
+    """
+    The replica for this request's reads, or the primary when none can
+    be reached
+    """
+    weights = replica_weights()
+    tried = set()
+    alias = routing.replica if routing is not None else None
+    while True:
+        if alias is None:
+            alias = replicas.choose(weights, exclude=tried)
+            if alias is None:
+                return PRIMARY
+        if _connected(alias):
+            if routing is not None:
+                routing.replica = alias
+            return alias
+        tried.add(alias)
+        alias = None
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """
+    Read from the primary inside this block
+    """
+    token = _override.set(_PRIMARY)
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """
+    Read the store's models from a replica inside this block, unless the
+    current request has written or is pinned to the primary
+    """
+    token = _override.set(_REPLICA)
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+@contextlib.contextmanager
+def routing(state):
+    """
+    Route the reads and writes of a request in this context with ``state``
+    """
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    DATABASE_ROUTERS entry sending writes to the primary and the reads
+    described above to replicas
+    """
+
+    def db_for_read(self, model, **hints):
+        if not replica_weights() or model._meta.app_label not in REPLICA_APPS:
+            return PRIMARY
+        override = _override.get()
+        state = _routing.get()
+        if override == _PRIMARY:
+            return PRIMARY
+        if override != _REPLICA and not (state is not None and state.read_only):
+            return PRIMARY
+        if state is not None and state.pinned:
+            return PRIMARY
+        return replica_for(state)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # Later reads of this request must see the write
+            state.wrote = True
+            state.pinned = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replica_weights()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,7 @@
+"""
+Service layer for the store app.
+
+Views stay thin; query and write logic that is shared between views,
+management commands and signal handlers lives here, grouped by domain
+the same way as ``store.models``.
+"""
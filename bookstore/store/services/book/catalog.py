@@ -0,0 +1,34 @@
+"""
+Catalog listing queries
+"""
+from store.models.book.models import Book
+from store.services.book import dimensions
+
+
+# Stable sort key for the catalog: newest first, id breaks ties
+CATALOG_ORDERING = ('-created_at', '-id')
+
+# Columns rendered by a book card; author, category and publisher come
+# from the dimension cache
+CARD_FIELDS = (
+    'id', 'title', 'price', 'instock', 'rate', 'created_at',
+    'author', 'category', 'publisher',
+)
+
+
+def book_cards():
+    """
+    Books restricted to the columns a book card shows
+    """
+    return Book.objects.only(*CARD_FIELDS)
+
+
+def card_books(book_ids):
+    """
+    ``{book_id: Book}`` for a card or detail rendering, with author,
+    category and publisher set from the dimension cache, checked against
+    the shared tokens as the result is cached for everyone
+    """
+    books = book_cards().in_bulk(book_ids)
+    dimensions.attach(list(books.values()), fresh=True)
+    return books
@@ -0,0 +1,273 @@
+"""
+Bulk catalog import.
+
+Reads books from CSV or JSON Lines one row at a time and upserts them in
+batches. Authors, publishers and categories are resolved through maps
+loaded once up front (name -> id); ones that do not exist yet are created
+in bulk with the batch that first mentions them, with ids derived from
+their names so a rerun resolves to the same rows.
+
+Recognised columns: ``id`` and ``title`` (required), ``price``,
+``instock``, ``author`` / ``author_id``, ``publisher`` / ``publisher_id``
+and ``category``. Rows are upserted on ``id``.
+
+After each committed batch the number of rows consumed is written to a
+checkpoint file, so an interrupted import resumes where it stopped.
+Upserts bypass model signals: rebuild the search index afterwards.
+"""
+import csv
+import itertools
+import json
+import os
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from store.models.book.models import Author, Book, Category, Publisher
+from store.services.book import dimensions, fragments
+
+
+BOOK_UPDATE_FIELDS = ['title', 'price', 'instock', 'author', 'publisher', 'category', 'updated_at']
+
+# Range of Book.instock (a 32-bit integer column)
+MIN_INSTOCK = -2 ** 31
+MAX_INSTOCK = 2 ** 31 - 1
+
+# Namespace for ids of authors/publishers created by the importer
+IMPORT_NAMESPACE = uuid.UUID('7b0c1b0e-4f59-4d1f-9a0e-5b8c0c7f3e21')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_rows(path, fmt=None):
+    """
+    Yield ``(line_number, row_dict)`` from a CSV or JSON Lines file without
+    loading it into memory
+    """
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as stream:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for line_number, line in enumerate(stream, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError:
+                        # Reported as a skipped row by the importer
+                        yield line_number, None
+        else:
+            raise ValueError(f"Unknown format {fmt!r}; use 'csv' or 'jsonl'")
+
+
+def text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def imported_id(kind, name):
+    return uuid.uuid5(IMPORT_NAMESPACE, f'{kind}:{name.casefold()}').hex
+
+
+def check_length(value, model, field_name, what):
+    max_length = model._meta.get_field(field_name).max_length
+    if len(value) > max_length:
+        raise ImportRowError(f'{what} is longer than {max_length} characters')
+
+
+def check_price(price):
+    """
+    Reject prices Book.price cannot store: NaN, infinities, too many digits
+    """
+    field = Book._meta.get_field('price')
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if (not price.is_finite() or abs(price) >= limit
+            or price != price.quantize(Decimal(1).scaleb(-field.decimal_places))):
+        raise ImportRowError(
+            f'price must be a number below {limit} with at most {field.decimal_places} decimal places'
+        )
+
+
+class Checkpoint:
+    """
+    Rows of an input file already imported, stored as JSON next to it
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        """
+        Rows to skip; 0 when there is no checkpoint for this exact file
+        """
+        try:
+            with open(self.path, encoding='utf-8') as stream:
+                state = json.load(stream)
+        except (OSError, ValueError):
+            return 0
+        return state['rows'] if state.get('source') == self.source else 0
+
+    def save(self, rows):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as stream:
+            json.dump({'source': self.source, 'rows': rows}, stream)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class CatalogImporter:
+    """
+    Upsert books from an iterable of rows in batches of ``batch_size``
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        # kind -> ({casefolded name: id}, {known ids})
+        self.lookups = {'author': ({}, set()), 'publisher': ({}, set())}
+        self.categories = set()
+        self.imported = 0
+        self.skipped = []
+
+    def load_lookups(self):
+        for kind, model in (('author', Author), ('publisher', Publisher)):
+            by_name, ids = self.lookups[kind]
+            for pk, name in model.objects.values_list('id', 'name').iterator():
+                by_name.setdefault(name.casefold(), pk)
+                ids.add(pk)
+        self.categories = set(Category.objects.values_list('type', flat=True))
+        return self
+
+    def _resolve(self, kind, row, new):
+        """
+        Id of the row's author/publisher, queueing unknown ones in ``new``
+        """
+        by_name, ids = self.lookups[kind]
+        pk = text(row, f'{kind}_id')
+        name = text(row, kind)
+        if not pk:
+            if not name:
+                return None
+            pk = by_name.get(name.casefold()) or imported_id(kind, name)
+        if pk not in ids:
+            if not name:
+                raise ImportRowError(f'unknown {kind}_id {pk!r} and no {kind} name to create it')
+            ids.add(pk)
+            new[pk] = name
+        if name:
+            by_name.setdefault(name.casefold(), pk)
+        return pk
+
+    def to_book(self, row, new_authors, new_publishers, new_categories):
+        if not isinstance(row, dict):
+            raise ImportRowError('not an object')
+        book_id = text(row, 'id')
+        title = text(row, 'title')
+        if not book_id or not title:
+            raise ImportRowError('id and title are required')
+        check_length(book_id, Book, 'id', 'id')
+        check_length(title, Book, 'title', 'title')
+        try:
+            price = Decimal(text(row, 'price') or 0)
+            instock = int(text(row, 'instock') or 0)
+        except (InvalidOperation, ValueError):
+            raise ImportRowError('price and instock must be numbers')
+        check_price(price)
+        if not MIN_INSTOCK <= instock <= MAX_INSTOCK:
+            raise ImportRowError(f'instock must be between {MIN_INSTOCK} and {MAX_INSTOCK}')
+        for kind, model in (('author', Author), ('publisher', Publisher)):
+            check_length(text(row, f'{kind}_id'), model, 'id', f'{kind}_id')
+            check_length(text(row, kind), model, 'name', kind)
+        category = text(row, 'category') or None
+        if category:
+            check_length(category, Category, 'type', 'category')
+
+        author_id = self._resolve('author', row, new_authors)
+        publisher_id = self._resolve('publisher', row, new_publishers)
+        if category and category not in self.categories:
+            self.categories.add(category)
+            new_categories.add(category)
+        return Book(
+            id=book_id,
+            title=title,
+            price=price,
+            instock=instock,
+            author_id=author_id,
+            publisher_id=publisher_id,
+            category_id=category,
+        )
+
+    def write_batch(self, rows):
+        """
+        Upsert one batch of ``(line_number, row)`` in a transaction
+        """
+        new_authors, new_publishers, new_categories = {}, {}, set()
+        books = {}
+        for line_number, row in rows:
+            try:
+                book = self.to_book(row, new_authors, new_publishers, new_categories)
+            except ImportRowError as exc:
+                self.skipped.append((line_number, str(exc)))
+                continue
+            # Last row wins when an id repeats inside a batch
+            books[book.id] = book
+
+        conflict_target = {}
+        if connection.features.supports_update_conflicts_with_target:
+            conflict_target['unique_fields'] = ['id']
+        with transaction.atomic():
+            if new_categories:
+                Category.objects.bulk_create(
+                    [Category(type=name) for name in new_categories], ignore_conflicts=True,
+                )
+            if new_authors:
+                Author.objects.bulk_create(
+                    [Author(id=pk, name=name) for pk, name in new_authors.items()], ignore_conflicts=True,
+                )
+            if new_publishers:
+                Publisher.objects.bulk_create(
+                    [Publisher(id=pk, name=name) for pk, name in new_publishers.items()], ignore_conflicts=True,
+                )
+            Book.objects.bulk_create(
+                list(books.values()),
+                update_conflicts=True,
+                update_fields=BOOK_UPDATE_FIELDS,
+                **conflict_target,
+            )
+            if new_categories or new_authors or new_publishers:
+                dimensions.invalidate_all()
+            fragments.bump(books)
+        self.imported += len(books)
+
+    def run(self, rows, checkpoint=None, skip=0, progress=None):
+        """
+        Import every row after the first ``skip``; returns rows consumed.
+        ``progress(consumed, rows_per_second)`` is called after each batch.
+        """
+        rows = itertools.islice(rows, skip, None)
+        consumed = skip
+        started = time.perf_counter()
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.write_batch(batch)
+            consumed += len(batch)
+            if checkpoint is not None:
+                checkpoint.save(consumed)
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(consumed, (consumed - skip) / elapsed if elapsed else 0.0)
+        return consumed
@@ -0,0 +1,204 @@
+"""
+Process-local cache of the Author, Publisher and Category tables.
+
+These tables are small and rarely change, yet every book card, the staff
+inventory and the add-book form read them. Each process keeps every row
+of each table in memory (``{pk: instance}``), loaded in one query per
+table by the first request that needs it, and reloaded after
+DIMENSION_CACHE_TIMEOUT seconds. Nothing is loaded at import time: the
+WSGI and ASGI modules run before a request has a connection to return to
+the pool, and under ASGI inside the event loop. ``attach`` puts the cached author, publisher and category on
+books loaded without joins, so templates reading ``book.author.name`` do
+not query.
+
+Saving or deleting a row, and the bulk writers, replace the table's token
+in the cache behind DIMENSION_CACHE_ALIAS once the transaction commits.
+Processes compare their token with it at most every
+DIMENSION_CACHE_SYNC_INTERVAL seconds, so with a cache shared between
+workers (Memcached, Redis) every worker reloads the table shortly after
+the change. As for fragments, the token is read before the rows, and rows
+are read from the primary database. Fragment renderings check the token
+on every miss (``fresh``): the token is replaced before the books'
+fragment versions, so no fragment is stored under a new version with an
+outdated name.
+
+Cached instances are shared between requests and threads: read them,
+assign them to foreign keys, but do not modify them.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from store.models.book.models import Author, Book, Category, Publisher
+from store.routers import primary_reads
+
+
+TOKEN_KEY = 'dimensions:{}'
+
+# Book foreign key -> dimension model
+BOOK_DIMENSIONS = {'author': Author, 'publisher': Publisher, 'category': Category}
+
+
+def _cache():
+    return caches[getattr(settings, 'DIMENSION_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'DIMENSION_CACHE_TIMEOUT', 300)
+
+
+def _sync_interval():
+    return getattr(settings, 'DIMENSION_CACHE_SYNC_INTERVAL', 1)
+
+
+def _token_key(model):
+    return TOKEN_KEY.format(model._meta.label_lower)
+
+
+def _current_token(model):
+    cache = _cache()
+    key = _token_key(model)
+    token = cache.get(key)
+    if token is None:
+        # add() rather than set(): a token written meanwhile wins
+        cache.add(key, uuid.uuid4().hex[:12], None)
+        token = cache.get(key)
+    return token
+
+
+class DimensionTable:
+    """
+    Every row of one model, with the token and time it was loaded at
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._rows = None
+        self._token = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self.loads = 0
+        self.misses = 0
+
+    def rows(self, fresh=False):
+        """
+        ``{pk: instance}`` of the whole table, reloaded when expired or
+        invalidated; ``fresh`` checks the token now
+        """
+        now = time.monotonic()
+        rows, token, loaded_at, checked_at = self._rows, self._token, self._loaded_at, self._checked_at
+        if rows is not None and now - loaded_at < _timeout():
+            if not fresh and now - checked_at < _sync_interval():
+                return rows
+            if _current_token(self.model) == token:
+                self._checked_at = now
+                return rows
+        return self.load()
+
+    def load(self):
+        token = _current_token(self.model)
+        with primary_reads():
+            rows = self.model.objects.in_bulk()
+        now = time.monotonic()
+        with self._lock:
+            self._rows, self._token, self._loaded_at, self._checked_at = rows, token, now, now
+            self.loads += 1
+        return rows
+
+    def add(self, found):
+        """
+        Add rows created since the table was loaded
+        """
+        with self._lock:
+            self.misses += len(found)
+            if self._rows is not None:
+                self._rows = {**self._rows, **found}
+
+    def forget(self):
+        with self._lock:
+            self._rows = None
+
+    def as_dict(self):
+        rows = self._rows
+        return {
+            'rows': len(rows) if rows is not None else None,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if rows is not None else None,
+            'loads': self.loads,
+            'misses': self.misses,
+        }
+
+
+_tables = {model: DimensionTable(model) for model in BOOK_DIMENSIONS.values()}
+
+
+def in_bulk(model, pks, fresh=False):
+    """
+    ``{pk: instance}`` for ``pks``, leaving out rows that do not exist
+    """
+    table = _tables[model].rows(fresh)
+    found = {pk: table[pk] for pk in pks if pk in table}
+    missing = [pk for pk in set(pks) if pk not in table]
+    if missing:
+        # Created in another process since this one loaded the table
+        with primary_reads():
+            loaded = model.objects.in_bulk(missing)
+        _tables[model].add(loaded)
+        found.update(loaded)
+    return found
+
+
+def get(model, pk):
+    """
+    The row with primary key ``pk``; raises ``model.DoesNotExist`` like
+    ``model.objects.get(pk=pk)``
+    """
+    found = in_bulk(model, [pk])
+    if pk not in found:
+        raise model.DoesNotExist(f'{model.__name__} matching query does not exist.')
+    return found[pk]
+
+
+def rows(model):
+    """
+    Every row of ``model``, in primary key order
+    """
+    table = _tables[model].rows()
+    return [table[pk] for pk in sorted(table)]
+
+
+def attach(books, fresh=False):
+    """
+    Set the author, publisher and category of ``books`` from the cache,
+    as ``select_related`` would have. Returns ``books``.
+    """
+    for name, model in BOOK_DIMENSIONS.items():
+        field = Book._meta.get_field(name)
+        found = in_bulk(model, {getattr(book, field.attname) for book in books} - {None}, fresh)
+        for book in books:
+            field.set_cached_value(book, found.get(getattr(book, field.attname)))
+    return books
+
+
+def invalidate(*models):
+    """
+    Make every process reload ``models`` once the current transaction
+    commits
+    """
+    def replace_tokens():
+        _cache().set_many({_token_key(model): uuid.uuid4().hex[:12] for model in models}, None)
+        for model in models:
+            _tables[model].forget()
+    transaction.on_commit(replace_tokens)
+
+
+def invalidate_all():
+    invalidate(*BOOK_DIMENSIONS.values())
+
+
+def stats_snapshot():
+    return {model._meta.model_name: table.as_dict() for model, table in _tables.items()}
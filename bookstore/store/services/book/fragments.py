@@ -0,0 +1,160 @@
+"""
+Versioned HTML fragments for book cards and book detail pages.
+
+Each book has a version token in the cache, and there is one catalog-wide
+generation token; a rendered fragment is stored under a key made of both
+(``fragment:card:<book>:<generation>:<version>``). Changing a book, or its
+author, publisher or category, replaces the book's token once the
+transaction commits, and changes that touch every book (rebuilding rating
+aggregates, seeding) replace the generation. Fragments rendered from older
+data are then never looked up again and simply age out of the cache. Both
+kinds of change also advance the catalog version that conditional GETs are
+validated against (see ``freshness``).
+
+Tokens are read before the books are loaded from the database, so a
+fragment can only be stored under tokens at least as old as the data it was
+rendered from; for the same reason misses are loaded from the primary even
+when the page reads from a replica (see ``store.routers``). A listing reads its tokens in one ``get_many`` and its
+fragments in a second, and queries the database only for the misses.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from store import instrumentation
+from store.routers import primary_reads
+from store.models.book.models import Book
+from store.services.book import freshness
+from store.services.book.catalog import card_books
+
+
+CARD = 'card'
+DETAIL = 'detail'
+TEMPLATES = {
+    CARD: 'book/_card.html',
+    DETAIL: 'book/_detail.html',
+}
+
+VERSION_KEY = 'book-version:{}'
+GENERATION_KEY = 'book-version:*'
+FRAGMENT_KEY = 'fragment:{}:{}:{}:{}'
+
+# Version tokens per set_many when many books change at once
+BUMP_CHUNK_SIZE = 1000
+
+
+class Fragment:
+    """
+    A cached rendering of one book
+    """
+
+    def __init__(self, id, title, html):
+        self.id = id
+        self.title = title
+        self.html = mark_safe(html)
+
+
+def _cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def _new_token():
+    return uuid.uuid4().hex[:12]
+
+
+def tokens(book_ids):
+    """
+    ``(generation, {book_id: version})``, creating tokens that are missing
+    """
+    cache = _cache()
+    keys = {VERSION_KEY.format(book_id): book_id for book_id in book_ids}
+    found = cache.get_many([GENERATION_KEY, *keys])
+    for key in [GENERATION_KEY, *keys]:
+        if key not in found:
+            # add() rather than set(): a token written meanwhile wins
+            cache.add(key, _new_token(), None)
+            found[key] = cache.get(key)
+    return found[GENERATION_KEY], {book_id: found[key] for key, book_id in keys.items()}
+
+
+def fragments(kind, book_ids, load):
+    """
+    ``{book_id: Fragment}`` for ``book_ids``. ``load(ids)`` returns
+    ``{book_id: Book}`` for the books whose fragment is not cached; books it
+    does not return (deleted ones) are left out.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        return {}
+    cache = _cache()
+    generation, versions = tokens(book_ids)
+    keys = {FRAGMENT_KEY.format(kind, book_id, generation, versions[book_id]): book_id for book_id in book_ids}
+    found = cache.get_many(list(keys))
+    result = {keys[key]: Fragment(keys[key], *value) for key, value in found.items()}
+
+    missing = [book_id for key, book_id in keys.items() if key not in found]
+    if missing:
+        rendered = {}
+        with primary_reads():
+            loaded = load(missing)
+        for book_id, book in loaded.items():
+            rendered[book_id] = (book.title, render_to_string(TEMPLATES[kind], {'book': book}))
+            result[book_id] = Fragment(book_id, *rendered[book_id])
+        cache.set_many({
+            FRAGMENT_KEY.format(kind, book_id, generation, versions[book_id]): value
+            for book_id, value in rendered.items()
+        }, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600))
+    instrumentation.count_fragments(hits=len(found), misses=len(missing))
+    return result
+
+
+def cards(book_ids):
+    """
+    Card fragments of ``book_ids`` in the same order, skipping missing books
+    """
+    found = fragments(CARD, book_ids, card_books)
+    return [found[book_id] for book_id in book_ids if book_id in found]
+
+
+def detail(book_id):
+    """
+    Detail fragment of a book, or None if there is no such book
+    """
+    return fragments(DETAIL, [book_id], card_books).get(book_id)
+
+
+def _replace_versions(book_ids):
+    cache = _cache()
+    for start in range(0, len(book_ids), BUMP_CHUNK_SIZE):
+        cache.set_many({VERSION_KEY.format(book_id): _new_token() for book_id in book_ids[start:start + BUMP_CHUNK_SIZE]}, None)
+
+
+def bump(book_ids):
+    """
+    Retire the cached fragments of these books once the current
+    transaction commits
+    """
+    book_ids = list(book_ids)
+    if book_ids:
+        transaction.on_commit(lambda: _replace_versions(book_ids))
+        freshness.touch()
+
+
+def bump_related(**lookup):
+    """
+    Retire the fragments of every book matching ``lookup`` (e.g.
+    ``author_id=...``)
+    """
+    bump(Book.objects.filter(**lookup).values_list('id', flat=True))
+
+
+def bump_all():
+    """
+    Retire every cached book fragment once the current transaction commits
+    """
+    transaction.on_commit(lambda: _cache().set(GENERATION_KEY, _new_token(), None))
+    freshness.touch()
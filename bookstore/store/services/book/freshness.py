@@ -0,0 +1,147 @@
+"""
+Conditional GETs for the catalog pages.
+
+Book, Author, Publisher and Category carry ``updated_at``, and the single
+CatalogVersion row counts committed catalog changes; it is advanced
+together with the fragment versions (see ``fragments.bump``). A listing is
+validated against that row, a book page against the ``updated_at`` of the
+book and its author, publisher and category, each with one indexed lookup.
+Matching ``If-None-Match`` / ``If-Modified-Since`` headers are answered
+with 304 before the view runs its listing query or renders a template.
+
+Pages also show the signed-in user and their cart count, so those go into
+the ETag, and Last-Modified, which cannot express them, is only sent to
+anonymous visitors. Search results come from the index held by each
+process, so search ETags also name the process and its index revision.
+Responses carrying flash messages are sent without validators.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from store.models.book.models import Book, CatalogVersion
+from store.services.book.search_index import get_search_index
+from store.services.order.cart_store import cart_count
+
+
+def _advance():
+    updated = CatalogVersion.objects.filter(pk=1).update(number=F('number') + 1, updated_at=timezone.now())
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1)
+
+
+def touch():
+    """
+    Advance the catalog version once the current transaction commits
+    """
+    transaction.on_commit(_advance)
+
+
+def catalog_validators(request, *args, **kwargs):
+    """
+    ``(etag parts, last modified)`` of the catalog listings
+    """
+    row = CatalogVersion.objects.filter(pk=1).values_list('number', 'updated_at').first()
+    if row is None:
+        return None
+    number, updated_at = row
+    return [number], updated_at
+
+
+def search_validators(request, *args, **kwargs):
+    validators = catalog_validators(request)
+    if validators is None:
+        return None
+    parts, updated_at = validators
+    index = get_search_index()
+    return [*parts, os.getpid(), index.revision], updated_at
+
+
+def book_validators(request, book_id):
+    """
+    Validators of one book's page, or None when there is no such book
+    """
+    row = Book.objects.filter(pk=book_id).values_list(
+        'updated_at', 'author__updated_at', 'publisher__updated_at', 'category__updated_at',
+    ).first()
+    if row is None:
+        return None
+    # A dimension that is gone still changes the ETag through its None
+    return list(row), max(value for value in row if value is not None)
+
+
+def _validate(request, validators, args, kwargs):
+    """
+    ``(etag, last modified timestamp, private)`` for a request, or None
+    when the page must be rendered without validators
+    """
+    found = validators(request, *args, **kwargs)
+    if found is None or len(get_messages(request)):
+        return None
+    parts, last_modified = found
+    user = request.user
+    if user.is_authenticated:
+        parts = [*parts, user.pk, user.fullname, user.is_staff, cart_count(user.pk)]
+        last_modified = None
+    etag = quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp, user.is_authenticated
+
+
+def _add_validators(response, etag, timestamp, private):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if timestamp is not None:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+        # Browsers must ask again rather than guess a freshness period
+        if private:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_page(validators):
+    """
+    Answer GET and HEAD requests for a view, sync or async, with 304 when
+    the client's copy is still current. ``validators(request, *args,
+    **kwargs)`` returns ``(etag parts, last modified)``, or None to always
+    run the view.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                # Reads the database, the session and the user, all sync
+                found = await sync_to_async(_validate)(request, validators, args, kwargs)
+                if found is None:
+                    return await view(request, *args, **kwargs)
+                response = get_conditional_response(request, etag=found[0], last_modified=found[1])
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _add_validators(response, *found)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            found = _validate(request, validators, args, kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=found[0], last_modified=found[1])
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _add_validators(response, *found)
+        return wrapper
+    return decorator
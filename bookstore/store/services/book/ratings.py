@@ -0,0 +1,169 @@
+"""
+Rating aggregates and top-rated leaderboards.
+
+Every Book carries ``rating_count``, ``rating_sum``, a per-score histogram
+(``rating_1`` .. ``rating_5``) and ``rate``, the running average. Rating
+signal handlers apply each change as a single UPDATE with F-expressions,
+so concurrent ratings never overwrite each other. Leaderboards are read
+from those columns instead of grouping the Rating table.
+"""
+import heapq
+import itertools
+from decimal import Decimal
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Value, When
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from store.models.book.models import Book, Category
+from store.models.order.models import Rating
+from store.services.book import fragments
+
+
+SCORES = range(1, 6)
+
+LEADERBOARD_KEY = 'leaderboard:{}'
+ALL_CATEGORIES = '*'
+
+
+def leaderboard_key(category_id):
+    # Category names may contain spaces, which memcached keys cannot
+    return LEADERBOARD_KEY.format(quote(str(category_id)))
+
+
+def apply_rating(book_id, score, delta):
+    """
+    Add (delta=1) or remove (delta=-1) one rating of ``score`` on a book
+    """
+    if book_id is None or score not in SCORES:
+        return
+    new_count = F('rating_count') + delta
+    new_sum = F('rating_sum') + delta * score
+    Book.objects.filter(id=book_id).update(
+        # rate comes first: MySQL evaluates SET assignments left to right
+        # with already-updated values, so it must read the old columns here
+        # as every other backend does
+        rate=Case(
+            When(rating_count=-delta, then=Value(0)),
+            default=Round(Cast(new_sum, FloatField()) / new_count, 2),
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+        rating_count=new_count,
+        rating_sum=new_sum,
+        **{f'rating_{score}': F(f'rating_{score}') + delta},
+        updated_at=timezone.now(),
+    )
+    fragments.bump([book_id])
+
+
+def rating_changed(rating, created):
+    """
+    Apply a saved Rating to the aggregates of its old and new book
+    """
+    loaded = getattr(rating, '_loaded', None)
+    current = (rating.book_id, rating.score)
+    if created or loaded is None:
+        apply_rating(*current, 1)
+    elif loaded != current:
+        apply_rating(*loaded, -1)
+        apply_rating(*current, 1)
+    rating._loaded = current
+
+
+def rating_deleted(rating):
+    apply_rating(*getattr(rating, '_loaded', (rating.book_id, rating.score)), -1)
+
+
+def repair_aggregates(batch_size=2000, chunk_size=10000):
+    """
+    Recompute every book's aggregates from the Rating table.
+    Returns the number of rated books.
+    """
+    fields = ['rating_count', 'rating_sum', 'rate'] + [f'rating_{score}' for score in SCORES]
+    rows = (
+        Rating.objects.values_list('book_id', 'score')
+        .annotate(n=Count('id'))
+        .order_by('book_id', 'score')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    def flush(batch):
+        if batch:
+            Book.objects.bulk_update(batch, fields)
+
+    rated = 0
+    with transaction.atomic():
+        Book.objects.update(**{field: 0 for field in fields}, updated_at=timezone.now())
+        batch = []
+        current = None
+        for book_id, score, n in rows:
+            if current is None or current.id != book_id:
+                current = Book(id=book_id, **{field: 0 for field in fields})
+                batch.append(current)
+                rated += 1
+                if len(batch) > batch_size:
+                    flush(batch[:-1])
+                    batch = batch[-1:]
+            if score in SCORES:
+                setattr(current, f'rating_{score}', n)
+                current.rating_count += n
+                current.rating_sum += n * score
+                current.rate = (Decimal(current.rating_sum) / current.rating_count).quantize(Decimal('0.01'))
+        flush(batch)
+    transaction.on_commit(forget_leaderboards)
+    fragments.bump_all()
+    return rated
+
+
+def _leaderboard_cache():
+    return caches[getattr(settings, 'LEADERBOARD_CACHE_ALIAS', 'default')]
+
+
+def leaderboard(category_id=ALL_CATEGORIES):
+    """
+    Best-rated books of a category (or of every category) as
+    ``(book_id, rate, rating_count)`` entries, cached for
+    LEADERBOARD_CACHE_TIMEOUT seconds
+    """
+    cache = _leaderboard_cache()
+    key = leaderboard_key(category_id)
+    entries = cache.get(key)
+    if entries is None:
+        books = Book.objects.filter(rating_count__gt=0)
+        if category_id != ALL_CATEGORIES:
+            books = books.filter(category_id=category_id)
+        entries = [
+            (book_id, float(rate), count)
+            for book_id, rate, count in books.order_by('-rate', '-rating_count', 'id')
+            .values_list('id', 'rate', 'rating_count')[:getattr(settings, 'LEADERBOARD_SIZE', 20)]
+        ]
+        cache.set(key, entries, getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 600))
+    return entries
+
+
+def forget_leaderboards():
+    keys = [leaderboard_key(category_id) for category_id in Category.objects.values_list('pk', flat=True)]
+    keys += [leaderboard_key(ALL_CATEGORIES), leaderboard_key(None)]
+    _leaderboard_cache().delete_many(keys)
+
+
+def top_rated_book_ids(category_ids=None, limit=4, exclude=()):
+    """
+    Ids of the best-rated books across the given categories (all when
+    None), skipping ``exclude``
+    """
+    if category_ids is None:
+        entries = leaderboard()
+    else:
+        entries = heapq.merge(
+            *(leaderboard(category_id) for category_id in set(category_ids)),
+            key=lambda entry: (-entry[1], -entry[2], entry[0]),
+        )
+    exclude = set(exclude)
+    return list(itertools.islice(
+        (book_id for book_id, _, _ in entries if book_id not in exclude), limit
+    ))
@@ -0,0 +1,58 @@
+"""
+Rebuilding the in-process search structures off the request path.
+
+The search index and the typeahead suggester are rebuilt from the database
+when other processes changed the catalog under them; a rebuild reads the
+whole catalog, so it runs in a daemon thread while requests keep being
+served from the previous copy, which the rebuild swaps out once done.
+"""
+import logging
+import threading
+
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRebuild:
+    """
+    Runs ``rebuild()`` in a daemon thread, one run at a time
+    """
+
+    def __init__(self, name, rebuild):
+        self.name = name
+        self.rebuild = rebuild
+        self._lock = threading.Lock()
+        self._running = False
+        self.runs = 0
+        self.failures = 0
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """
+        Start a rebuild unless one is already running; returns whether
+        this call started one
+        """
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        return True
+
+    def _run(self):
+        try:
+            self.rebuild()
+            self.runs += 1
+        except Exception:
+            self.failures += 1
+            logger.exception('%s failed; the previous copy is still served', self.name)
+        finally:
+            # The thread's connections go back to the pool
+            connections.close_all()
+            with self._lock:
+                self._running = False
@@ -0,0 +1,469 @@
+"""
+In-process inverted index over the catalog.
+
+Each book is indexed under its title, author name, category type and
+publisher name. Queries are ranked with BM25 over field-weighted term
+frequencies, so a title hit counts for more than a publisher hit.
+
+The index lives in process memory. It is built from the database on first
+use (or loaded from the snapshot written by ``manage.py
+rebuild_search_index``), and reloaded when a newer snapshot appears on
+disk.
+
+Catalog writes reach every process through the cache behind
+SEARCH_INDEX_CACHE_ALIAS: once the write commits, the signal handlers in
+``store.signals`` re-index the books in the writing process and publish
+their ids as a numbered change. Before serving, at most every
+SEARCH_INDEX_SYNC_INTERVAL seconds, each process compares the last change
+number with the one its index reflects and re-indexes the books of the
+changes it missed. When it cannot tell what changed (entries expired or
+evicted, a very large change, the counter lost), it rebuilds the index in
+the background and keeps serving the one it has meanwhile. With a
+process-local cache (LocMemCache) other processes only pick up changes
+through snapshots, and a loaded snapshot is taken as current.
+"""
+import heapq
+import math
+import os
+import pickle
+import re
+import secrets
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from store.models.book.models import Book
+from store.services.book.rebuilds import BackgroundRebuild
+
+
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'author': 2.0,
+    'category': 1.0,
+    'publisher': 1.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Prefix matches on the last query term score less than exact matches
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX_EXPANSIONS = 50
+
+SNAPSHOT_VERSION = 1
+
+# Last published change number, and the book ids of each change
+CHANGES_KEY = 'search_index:changes'
+CHANGE_KEY = 'search_index:change:{}'
+CHANGE_TIMEOUT = 24 * 3600
+# A process further behind than this rebuilds rather than catching up
+MAX_CHANGES = 1000
+# Changes touching more books are not published; every process rebuilds
+MAX_CHANGE_BOOKS = 5000
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Lower-case, strip accents and split text into word tokens
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text).lower()).replace('đ', 'd')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text)
+
+
+class SearchResults:
+    """
+    One page of ranked book ids plus the total number of matches
+    """
+
+    def __init__(self, book_ids, total):
+        self.book_ids = book_ids
+        self.total = total
+
+
+class SearchIndex:
+    """
+    Inverted index mapping terms to ``{book_id: weighted term frequency}``
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0.0
+        # dimension key -> book ids, so a renamed author only touches its books
+        self.books_by_author = defaultdict(set)
+        self.books_by_publisher = defaultdict(set)
+        self.books_by_category = defaultdict(set)
+        self.doc_dimensions = {}
+        self._vocabulary = None
+        self.built_at = None
+        # Bumped on every change, so pages can tell this process's results apart
+        self.revision = 0
+        # Number of the last published change the index reflects
+        self.change = None
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    # Building
+
+    @staticmethod
+    def rows(queryset=None):
+        """
+        Return the values-queryset the index is built from
+        """
+        if queryset is None:
+            queryset = Book.objects.all()
+        return queryset.values_list(
+            'id', 'title',
+            'author_id', 'author__name',
+            'category_id',
+            'publisher_id', 'publisher__name',
+        )
+
+    def build(self, chunk_size=2000):
+        """
+        Rebuild the whole index from the database, streaming rows
+        """
+        fresh = SearchIndex()
+        # Read before the rows: changes committed meanwhile are applied again
+        fresh.change = current_change()
+        for row in self.rows().iterator(chunk_size=chunk_size):
+            fresh._add_row(row)
+        fresh.built_at = time.time()
+        with self._lock:
+            fresh.revision = self.revision + 1
+            self.__dict__.update(
+                {k: v for k, v in fresh.__dict__.items() if k != '_lock'}
+            )
+        return self
+
+    def _add_row(self, row):
+        book_id, title, author_id, author_name, category_id, publisher_id, publisher_name = row
+        fields = {
+            'title': title,
+            'author': author_name,
+            'category': category_id,
+            'publisher': publisher_name,
+        }
+        weighted = defaultdict(float)
+        length = 0.0
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                weighted[token] += weight
+                length += weight
+
+        for token, tf in weighted.items():
+            if token not in self.postings and self._vocabulary is not None:
+                insort(self._vocabulary, token)
+            self.postings[token][book_id] = tf
+        self.doc_terms[book_id] = tuple(weighted)
+        self.doc_lengths[book_id] = length
+        self.total_length += length
+
+        self.doc_dimensions[book_id] = (author_id, publisher_id, category_id)
+        if author_id is not None:
+            self.books_by_author[author_id].add(book_id)
+        if publisher_id is not None:
+            self.books_by_publisher[publisher_id].add(book_id)
+        if category_id is not None:
+            self.books_by_category[category_id].add(book_id)
+
+    def _remove(self, book_id):
+        terms = self.doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            docs = self.postings.get(token)
+            if docs is None:
+                continue
+            docs.pop(book_id, None)
+            if not docs:
+                del self.postings[token]
+                if self._vocabulary is not None:
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+        self.total_length -= self.doc_lengths.pop(book_id, 0.0)
+
+        author_id, publisher_id, category_id = self.doc_dimensions.pop(book_id)
+        self.books_by_author.get(author_id, set()).discard(book_id)
+        self.books_by_publisher.get(publisher_id, set()).discard(book_id)
+        self.books_by_category.get(category_id, set()).discard(book_id)
+
+    # Incremental maintenance
+
+    def refresh_books(self, book_ids, change=None):
+        """
+        Re-read the given books from the database and re-index them.
+        Ids that no longer exist are dropped from the index. ``change``
+        is the published change number the index reflects afterwards.
+        """
+        book_ids = set(book_ids)
+        rows = list(self.rows(Book.objects.filter(id__in=book_ids))) if book_ids else []
+        with self._lock:
+            for book_id in book_ids:
+                self._remove(book_id)
+            for row in rows:
+                self._add_row(row)
+            self.revision += 1
+            if change is not None:
+                self.change = change
+
+    def remove_books(self, book_ids):
+        with self._lock:
+            for book_id in book_ids:
+                self._remove(book_id)
+            self.revision += 1
+
+    def books_for_dimension(self, dimension, key):
+        """
+        Return the indexed book ids that reference an author, publisher
+        or category
+        """
+        mapping = {
+            'author': self.books_by_author,
+            'publisher': self.books_by_publisher,
+            'category': self.books_by_category,
+        }[dimension]
+        with self._lock:
+            return set(mapping.get(key, ()))
+
+    # Querying
+
+    def _expand_prefix(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        start = bisect_left(vocabulary, prefix)
+        matches = []
+        for term in vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query, offset=0, limit=24):
+        """
+        Rank books for a free-text query and return one page of ids
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return SearchResults([], 0)
+
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs:
+                return SearchResults([], 0)
+            avg_length = self.total_length / n_docs or 1.0
+
+            # Terms to score, with a boost factor; the last token also
+            # matches as a prefix so partially typed words still hit
+            terms = {token: 1.0 for token in tokens}
+            for term in self._expand_prefix(tokens[-1]):
+                terms.setdefault(term, PREFIX_WEIGHT)
+
+            scores = defaultdict(float)
+            for term, boost in terms.items():
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for book_id, tf in docs.items():
+                    norm = K1 * (1 - B + B * self.doc_lengths[book_id] / avg_length)
+                    scores[book_id] += boost * idf * tf * (K1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return SearchResults([book_id for book_id, _ in top[offset:]], len(scores))
+
+    # Snapshots
+
+    def dump(self, path):
+        """
+        Atomically write the index to ``path``
+        """
+        with self._lock:
+            state = {k: v for k, v in self.__dict__.items() if k not in ('_lock', '_vocabulary')}
+            state['postings'] = dict(self.postings)
+            payload = pickle.dumps((SNAPSHOT_VERSION, state), protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(payload)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as fh:
+            version, state = pickle.load(fh)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported search index snapshot version {version}')
+        state['postings'] = defaultdict(dict, state['postings'])
+        # Snapshots from before change numbers were recorded
+        state.setdefault('change', None)
+        with self._lock:
+            revision = self.revision + 1
+            self.__dict__.update(state)
+            self._vocabulary = None
+            self.revision = revision
+        return self
+
+
+_index = SearchIndex()
+_loaded_mtime = None
+_last_check = 0.0
+_last_sync = 0.0
+_init_lock = threading.Lock()
+_sync_lock = threading.Lock()
+_rebuild = BackgroundRebuild('search-index-rebuild', _index.build)
+# Change numbers this process published itself, after applying them here
+_own_changes = deque(maxlen=MAX_CHANGES)
+_own_lock = threading.Lock()
+
+
+def _snapshot_path():
+    return getattr(settings, 'SEARCH_INDEX_PATH', None)
+
+
+def _snapshot_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _cache():
+    return caches[getattr(settings, 'SEARCH_INDEX_CACHE_ALIAS', 'default')]
+
+
+def _changes_shared():
+    """
+    Whether other processes see the change counter of this one
+    """
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def current_change():
+    """
+    Number of the last catalog change published to every process
+    """
+    cache = _cache()
+    number = cache.get(CHANGES_KEY)
+    if number is None:
+        # Start from a random number, so a counter lost with the cache
+        # cannot restart at a number some process has already seen
+        cache.add(CHANGES_KEY, secrets.randbits(40) << 20, None)
+        number = cache.get(CHANGES_KEY)
+    return number
+
+
+def _publish(book_ids):
+    cache = _cache()
+    try:
+        number = cache.incr(CHANGES_KEY)
+    except ValueError:
+        current_change()
+        number = cache.incr(CHANGES_KEY)
+    if len(book_ids) <= MAX_CHANGE_BOOKS:
+        cache.set(CHANGE_KEY.format(number), book_ids, CHANGE_TIMEOUT)
+    with _own_lock:
+        _own_changes.append(number)
+
+
+def changed_elsewhere(seen, number):
+    """
+    Whether any change after ``seen`` up to ``number`` was published by
+    another process, or cannot be told apart from one
+    """
+    if seen == number:
+        return False
+    if seen is None or not 0 < number - seen <= MAX_CHANGES:
+        return True
+    with _own_lock:
+        own = set(_own_changes)
+    return any(n not in own for n in range(seen + 1, number + 1))
+
+
+def books_changed(book_ids):
+    """
+    Re-index these books in this process, and have every other process
+    re-index them, once the current transaction commits
+    """
+    book_ids = sorted(set(book_ids))
+    if not book_ids:
+        return
+
+    def apply():
+        if _index.built_at is not None:
+            _index.refresh_books(book_ids)
+        _publish(book_ids)
+    transaction.on_commit(apply)
+
+
+def sync(index):
+    """
+    Catch up with the changes other processes published, or start a
+    background rebuild when they cannot be told apart
+    """
+    seen, number = index.change, current_change()
+    if seen == number or _rebuild.running:
+        return
+    if seen is None or not 0 < number - seen <= MAX_CHANGES:
+        _rebuild.start()
+        return
+    keys = [CHANGE_KEY.format(n) for n in range(seen + 1, number + 1)]
+    found = _cache().get_many(keys)
+    if len(found) < len(keys):
+        _rebuild.start()
+        return
+    index.refresh_books({book_id for book_ids in found.values() for book_id in book_ids}, change=number)
+
+
+def get_search_index():
+    """
+    Return the process-wide index, building or loading it on first use,
+    picking up newer snapshots written by ``rebuild_search_index`` and
+    catalog changes made by other processes
+    """
+    global _loaded_mtime, _last_check, _last_sync
+    path = _snapshot_path()
+    now = time.monotonic()
+    interval = getattr(settings, 'SEARCH_INDEX_RELOAD_INTERVAL', 30)
+    if _index.built_at is None or (path and now - _last_check >= interval):
+        with _init_lock:
+            _last_check = now
+            mtime = _snapshot_mtime(path) if path else None
+            if mtime is not None and mtime != _loaded_mtime:
+                _index.load(path)
+                _loaded_mtime = mtime
+                if not _changes_shared():
+                    # The snapshot's change number came from the writer's
+                    # own counter, which means nothing in this process
+                    _index.change = current_change()
+            elif _index.built_at is None:
+                _index.build()
+
+    sync_interval = getattr(settings, 'SEARCH_INDEX_SYNC_INTERVAL', 1)
+    if sync_interval is not None and now - _last_sync >= sync_interval and _sync_lock.acquire(blocking=False):
+        try:
+            _last_sync = now
+            sync(_index)
+        finally:
+            _sync_lock.release()
+    return _index
+
+
+def search_books(query, offset=0, limit=24):
+    return get_search_index().search(query, offset=offset, limit=limit)
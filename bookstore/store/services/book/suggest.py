@@ -0,0 +1,298 @@
+"""
+Typeahead completions for the search box.
+
+Book titles and author names are kept in one sorted array of normalized
+keys, so every completion of a prefix is a contiguous slice found with
+``bisect``. Small slices are ranked on the fly; prefixes that match more
+than ``SCAN_LIMIT`` entries get their top-k precomputed at build time, so a
+lookup never scans more than ``SCAN_LIMIT`` entries.
+
+Each process builds its suggester on first use; writes made in the
+process update it through the signal handlers. Popularity weights are
+refreshed every SUGGEST_REBUILD_INTERVAL seconds, and writes made by other
+processes are noticed through the catalog change numbers the search index
+publishes (checked every SUGGEST_SYNC_INTERVAL seconds; the process's own
+changes are skipped). Either way the suggester is rebuilt in the
+background, and the previous array keeps answering until the new one
+replaces it.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db.models import Sum
+
+from store.models.book.models import Author, Book
+from store.models.order.models import OrderItem
+from store.services.book.rebuilds import BackgroundRebuild
+from store.services.book.search_index import changed_elsewhere, current_change, tokenize
+
+
+TOP_K = 10
+SCAN_LIMIT = 256
+MAX_KEY_LENGTH = 64
+# Least popular entries set aside at a time for eviction past max_entries
+EVICTION_BATCH = 1024
+
+BOOK = 'book'
+AUTHOR = 'author'
+
+
+def normalize(text):
+    """
+    Suggestion key: accent-free lower-case words joined by single spaces
+    """
+    return ' '.join(tokenize(text))[:MAX_KEY_LENGTH]
+
+
+class Suggester:
+    """
+    Sorted-array prefix index of ``(key, kind, object id)`` entries
+    """
+
+    def __init__(self, top_k=TOP_K, max_entries=None):
+        self.top_k = top_k
+        self.max_entries = max_entries or getattr(settings, 'SUGGEST_MAX_ENTRIES', 200000)
+        self._lock = threading.RLock()
+        self.keys = []
+        self.entries = []
+        # (kind, id) -> [display text, weight, key]
+        self.items = {}
+        # hot prefix -> precomputed top-k entries
+        self.hot = {}
+        # Heap of (weight, entry) eviction candidates: the least popular
+        # entries, up to ``_evict_ceiling``
+        self._evictable = []
+        self._evict_ceiling = None
+        self.built_at = None
+        # Catalog change number the suggester was built at
+        self.change = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Building
+
+    @staticmethod
+    def book_sales():
+        """
+        Units sold per book, in a single grouped query
+        """
+        return dict(
+            OrderItem.objects.filter(book__isnull=False)
+            .values('book_id').annotate(units=Sum('quantity'))
+            .values_list('book_id', 'units')
+        )
+
+    def build(self, chunk_size=5000):
+        """
+        Load the most popular titles and authors, keeping at most
+        ``max_entries`` of them in memory
+        """
+        # Read before the rows: changes committed meanwhile trigger another build
+        change = current_change()
+        sales = self.book_sales()
+        author_sales = {}
+        candidates = []
+
+        rows = Book.objects.values_list('id', 'title', 'rate', 'author_id')
+        for book_id, title, rate, author_id in rows.iterator(chunk_size=chunk_size):
+            units = sales.get(book_id, 0)
+            if author_id is not None:
+                author_sales[author_id] = author_sales.get(author_id, 0) + units
+            self._push_candidate(candidates, (units, float(rate or 0)), BOOK, book_id, title)
+
+        rows = Author.objects.values_list('id', 'name')
+        for author_id, name in rows.iterator(chunk_size=chunk_size):
+            self._push_candidate(candidates, (author_sales.get(author_id, 0), 0.0), AUTHOR, author_id, name)
+
+        items = {}
+        pairs = []
+        for weight, kind, object_id, text in candidates:
+            key = normalize(text)
+            if not key:
+                continue
+            items[(kind, object_id)] = [text, weight, key]
+            pairs.append((key, (kind, object_id)))
+        pairs.sort()
+
+        with self._lock:
+            self.items = items
+            self.keys = [key for key, _ in pairs]
+            self.entries = [entry for _, entry in pairs]
+            self.hot = self._hot_prefixes()
+            self._evictable = []
+            self.built_at = time.time()
+            self.change = change
+        return self
+
+    def _push_candidate(self, heap, weight, kind, object_id, text):
+        # Min-heap on weight: once full, only more popular entries get in
+        item = (weight, kind, object_id, text)
+        if len(heap) < self.max_entries:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def _rank(self, entries):
+        return heapq.nlargest(self.top_k, entries, key=lambda entry: self.items[entry][1])
+
+    def _hot_prefixes(self):
+        """
+        Precompute top-k for every prefix that matches more than
+        ``SCAN_LIMIT`` entries
+        """
+        hot = {}
+        keys = self.keys
+        groups = [(0, len(keys))] if len(keys) > SCAN_LIMIT else []
+        length = 1
+        while groups:
+            next_groups = []
+            for lo, hi in groups:
+                start = lo
+                while start < hi:
+                    prefix = keys[start][:length]
+                    end = bisect_right(keys, prefix + '\uffff', start, hi)
+                    if end - start > SCAN_LIMIT:
+                        hot[prefix] = self._rank(self.entries[start:end])
+                        if any(len(keys[i]) > length for i in (start, end - 1)):
+                            next_groups.append((start, end))
+                    start = end
+            groups = next_groups
+            length += 1
+        return hot
+
+    # Incremental maintenance
+
+    def upsert(self, kind, object_id, text, weight=(0, 0.0)):
+        """
+        Insert or replace one entry, keeping any hot top-k lists current;
+        past ``max_entries`` the least popular entries are dropped
+        """
+        key = normalize(text)
+        with self._lock:
+            self._remove((kind, object_id))
+            if not key:
+                return
+            entry = (kind, object_id)
+            if self._evictable and (weight, entry) < self._evict_ceiling:
+                heapq.heappush(self._evictable, (weight, entry))
+            self.items[entry] = [text, weight, key]
+            pos = bisect_left(self.keys, key)
+            self.keys.insert(pos, key)
+            self.entries.insert(pos, entry)
+            for length in range(1, len(key) + 1):
+                top = self.hot.get(key[:length])
+                if top is None:
+                    continue
+                if len(top) < self.top_k or weight > self.items[top[-1]][1]:
+                    self.hot[key[:length]] = self._rank(top + [entry])
+            self._trim()
+
+    def _trim(self):
+        # Caller holds the lock. Candidates whose weight changed since they
+        # were set aside are skipped; a changed entry is pushed again by upsert
+        while len(self.items) > self.max_entries:
+            if not self._evictable:
+                self._evictable = heapq.nsmallest(
+                    EVICTION_BATCH, ((item[1], entry) for entry, item in self.items.items())
+                )
+                self._evict_ceiling = self._evictable[-1]
+            weight, entry = heapq.heappop(self._evictable)
+            item = self.items.get(entry)
+            if item is not None and item[1] == weight:
+                self._remove(entry)
+
+    def weight_of(self, kind, object_id, default=(0, 0.0)):
+        item = self.items.get((kind, object_id))
+        return item[1] if item is not None else default
+
+    def remove(self, kind, object_id):
+        with self._lock:
+            self._remove((kind, object_id))
+
+    def _remove(self, entry):
+        item = self.items.pop(entry, None)
+        if item is None:
+            return
+        key = item[2]
+        pos = bisect_left(self.keys, key)
+        while self.entries[pos] != entry:
+            pos += 1
+        del self.keys[pos]
+        del self.entries[pos]
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            top = self.hot.get(prefix)
+            if top is not None and entry in top:
+                lo = bisect_left(self.keys, prefix)
+                hi = bisect_right(self.keys, prefix + '\uffff', lo)
+                self.hot[prefix] = self._rank(self.entries[lo:hi])
+
+    # Querying
+
+    def suggest(self, query, limit=None):
+        """
+        Return up to ``limit`` ``(kind, id, text)`` completions of ``query``
+        """
+        limit = min(limit or self.top_k, self.top_k)
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            top = self.hot.get(prefix)
+            if top is None:
+                lo = bisect_left(self.keys, prefix)
+                hi = bisect_right(self.keys, prefix + '\uffff', lo, min(lo + SCAN_LIMIT + 1, len(self.keys)))
+                top = self._rank(self.entries[lo:hi])
+            return [(kind, object_id, self.items[(kind, object_id)][0])
+                    for kind, object_id in top[:limit]]
+
+
+_suggester = Suggester()
+_init_lock = threading.Lock()
+_rebuild = BackgroundRebuild('suggest-rebuild', _suggester.build)
+_last_check = 0.0
+
+
+def _is_stale(suggester, check_catalog):
+    max_age = getattr(settings, 'SUGGEST_REBUILD_INTERVAL', 3600)
+    if time.time() - suggester.built_at > max_age:
+        return True
+    if not check_catalog:
+        return False
+    number = current_change()
+    if changed_elsewhere(suggester.change, number):
+        return True
+    # Only writes of this process, already applied by the signal handlers
+    suggester.change = number
+    return False
+
+
+def get_suggester():
+    """
+    Return the process-wide suggester, building it on first use; when it
+    is stale a rebuild starts in the background and the current one is
+    returned meanwhile
+    """
+    global _last_check
+    if _suggester.built_at is None:
+        with _init_lock:
+            if _suggester.built_at is None:
+                _suggester.build()
+        return _suggester
+
+    now = time.monotonic()
+    interval = getattr(settings, 'SUGGEST_SYNC_INTERVAL', 10)
+    check_catalog = interval is not None and now - _last_check >= interval
+    if check_catalog:
+        _last_check = now
+    if not _rebuild.running and _is_stale(_suggester, check_catalog):
+        _rebuild.start()
+    return _suggester
+
+
+def loaded_suggester():
+    return _suggester if _suggester.built_at is not None else None
@@ -0,0 +1,43 @@
+"""
+Cached approximate row counts.
+
+``COUNT(*)`` on an InnoDB table scans an index, so its cost grows with the
+table. On MySQL the optimizer's row estimate from information_schema is
+used instead (usually within a few percent); other backends fall back to
+an exact count. Either way the result is cached for
+APPROXIMATE_COUNT_TIMEOUT seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+
+COUNT_KEY = 'approx_count:{}'
+
+
+def _estimate(model):
+    alias = router.db_for_read(model)
+    connection = connections[alias]
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is not None and row[0] is not None:
+            return row[0]
+    return model._default_manager.using(alias).count()
+
+
+def approximate_count(model):
+    """
+    Approximate number of rows in a model's table
+    """
+    key = COUNT_KEY.format(model._meta.label_lower)
+    count = cache.get(key)
+    if count is None:
+        count = _estimate(model)
+        cache.set(key, count, getattr(settings, 'APPROXIMATE_COUNT_TIMEOUT', 300))
+    return count
@@ -0,0 +1,157 @@
+"""
+Streaming CSV / JSON Lines exports of the inventory and of orders.
+
+Rows are read with ``.values_list()`` (no model instances) and written out
+as they arrive, so memory stays flat and the first bytes go out before the
+query has finished. PostgreSQL and SQLite stream through
+``.iterator(chunk_size=...)`` (server-side cursor / fetchmany). MySQL
+drivers buffer a whole result set client-side, so there the rows are read
+in chunks that seek forward on the export's unique sort key instead.
+"""
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+
+from store.models.book.models import Book
+from store.models.order.models import OrderItem
+from store.services.pagination import seek_filter
+
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+# (column, lookup) pairs
+INVENTORY_COLUMNS = (
+    ('id', 'id'),
+    ('title', 'title'),
+    ('author', 'author__name'),
+    ('publisher', 'publisher__name'),
+    ('category', 'category_id'),
+    ('price', 'price'),
+    ('instock', 'instock'),
+    ('rate', 'rate'),
+    ('created_at', 'created_at'),
+)
+INVENTORY_ORDERING = ('id',)
+
+# One row per order line, with the order, payment and invoice repeated
+ORDER_COLUMNS = (
+    ('order_id', 'order_id'),
+    ('order_date', 'order__order_date'),
+    ('status', 'order__status'),
+    ('customer_id', 'order__customer_id'),
+    ('customer_name', 'order__customer__user__fullname'),
+    ('order_total', 'order__total_price'),
+    ('item_id', 'id'),
+    ('book_id', 'book_id'),
+    ('title', 'book__title'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'price'),
+    ('line_total', 'total'),
+    ('payment_status', 'order__payment_info__status'),
+    ('payment_amount', 'order__payment_info__amount'),
+    ('invoice_id', 'order__invoice__id'),
+    ('invoice_date', 'order__invoice__date'),
+    ('invoice_total', 'order__invoice__total'),
+    ('voucher_code', 'order__invoice__voucher__code'),
+)
+ORDER_ORDERING = ('order__order_date', 'order_id', 'id')
+
+
+def stream_values(queryset, lookups, ordering, chunk_size=2000):
+    """
+    Yield ``queryset.values_list(*lookups)`` rows in ``ordering``, which
+    must be unique and made of lookups in ``lookups``
+    """
+    rows = queryset.values_list(*lookups).order_by(*ordering)
+    if connections[queryset.db].vendor != 'mysql':
+        yield from rows.iterator(chunk_size=chunk_size)
+        return
+
+    positions = [lookups.index(name.lstrip('-')) for name in ordering]
+    chunk = list(rows[:chunk_size])
+    while chunk:
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        key = [chunk[-1][position] for position in positions]
+        chunk = list(rows.filter(seek_filter(ordering, key))[:chunk_size])
+
+
+def inventory_rows(chunk_size=2000):
+    lookups = [lookup for _, lookup in INVENTORY_COLUMNS]
+    return stream_values(Book.objects.all(), lookups, INVENTORY_ORDERING, chunk_size)
+
+
+def day_bounds(since=None, until=None):
+    """
+    Aware datetimes for the start of ``since`` and the end of ``until``,
+    so range filters can use an index on order_date
+    """
+    start = end = None
+    if since is not None:
+        start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+    if until is not None:
+        end = timezone.make_aware(datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def order_rows(since=None, until=None, chunk_size=2000):
+    """
+    Order lines placed between ``since`` and ``until`` (dates, inclusive)
+    """
+    start, end = day_bounds(since, until)
+    items = OrderItem.objects.all()
+    if start is not None:
+        items = items.filter(order__order_date__gte=start)
+    if end is not None:
+        items = items.filter(order__order_date__lt=end)
+    lookups = [lookup for _, lookup in ORDER_COLUMNS]
+    return stream_values(items, lookups, ORDER_ORDERING, chunk_size)
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the line back to the caller
+    """
+
+    def write(self, value):
+        return value
+
+
+def _text(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow([_text(value) for value in row])
+
+
+def jsonl_lines(columns, rows):
+    names = [name for name, _ in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def render(fmt, columns, rows):
+    """
+    Lines of text for ``rows`` in the given export format
+    """
+    if fmt == 'csv':
+        return csv_lines(columns, rows)
+    if fmt == 'jsonl':
+        return jsonl_lines(columns, rows)
+    raise ValueError(f"Unknown export format {fmt!r}; use 'csv' or 'jsonl'")
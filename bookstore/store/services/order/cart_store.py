@@ -0,0 +1,461 @@
+"""
+Shopping cart storage.
+
+``CART_STORAGE = 'database'`` (the default) reads and writes Cart/CartItem
+directly on every click. ``CART_STORAGE = 'cache'`` keeps the live cart in
+the cache backend as ``{book_id: quantity}`` and writes it back to
+Cart/CartItem later (write-behind):
+
+* before anything reads the tables (cart page, checkout, place_order),
+* in batches once ``CART_FLUSH_BATCH_SIZE`` carts are dirty,
+* when ``CART_FLUSH_INTERVAL`` seconds have passed since the last flush,
+* and when the worker process exits.
+
+Cart/CartItem remain the durable source for checkout and place_order.
+Dirty carts are tracked per process, so a cart is flushed by the worker
+that last changed it or by whichever worker next syncs it for a read.
+
+A live cart is read, changed and written back as a whole, so changes to
+one cart hold a short lock taken with ``cache.add`` (atomic in every
+backend). Two clicks served by different workers or threads both count,
+and an add cannot write back a cart that checkout has just cleared.
+Write-backs take the same lock, and a cart stays dirty until its write
+has committed.
+"""
+import atexit
+import contextlib
+import logging
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Window
+
+from store.models.book.models import Book
+from store.models.customer.models import Customer
+from store.models.order.models import Cart, CartItem
+
+
+logger = logging.getLogger(__name__)
+
+CART_KEY = 'cart:items:{}'
+COUNT_KEY = 'cart:count:{}'
+BOOK_KEY = 'cart:book:{}'
+CUSTOMER_KEY = 'cart:customer:{}'
+LOCK_KEY = 'cart:lock:{}'
+
+# Seconds a cart lock is held at most (should its holder die), and
+# waited for before giving up
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 3
+
+
+class CartBusy(Exception):
+    """
+    Another request kept the cart locked for longer than LOCK_WAIT
+    """
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def _cache():
+    return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+
+def get_or_create_cart(customer_id):
+    cart = Cart.objects.filter(customer_id=customer_id).first()
+    if cart is None:
+        cart = Cart.objects.create(id=new_id(), customer_id=customer_id)
+    return cart
+
+
+def cart_lines(customer_id):
+    """
+    The customer's cart lines with their books, each annotated with
+    ``item_total`` and the cart ``subtotal``, in one query.
+    Returns ``(lines, subtotal)``.
+    """
+    line_total = ExpressionWrapper(
+        F('book__price') * F('quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    lines = list(
+        CartItem.objects.filter(cart__customer_id=customer_id)
+        .select_related('book', 'book__author')
+        .only('id', 'quantity', 'book__id', 'book__title', 'book__price', 'book__author__name')
+        .annotate(item_total=line_total, subtotal=Window(Sum(line_total)))
+        .order_by('id')
+    )
+    subtotal = lines[0].subtotal if lines else Decimal('0.00')
+    return lines, subtotal
+
+
+def cart_count(customer_id):
+    """
+    Number of books in the customer's cart, served from the cache and
+    recomputed with one query only after the cached value was dropped
+    """
+    cache = _cache()
+    key = COUNT_KEY.format(customer_id)
+    count = cache.get(key)
+    if count is None:
+        count = CartItem.objects.filter(cart__customer_id=customer_id).aggregate(
+            count=Sum('quantity')
+        )['count'] or 0
+        cache.set(key, count, None)
+    return count
+
+
+def set_cart_count(customer_id, count):
+    _cache().set(COUNT_KEY.format(customer_id), count, None)
+
+
+def forget_cart_count(customer_id):
+    _cache().delete(COUNT_KEY.format(customer_id))
+
+
+def persist_carts(carts):
+    """
+    Make Cart/CartItem match ``{customer_id: {book_id: quantity}}`` for
+    every given customer, with a fixed number of statements per batch.
+    Books deleted since they were put in a cart are left out; returns
+    their ids.
+    """
+    if not carts:
+        return set()
+    book_ids = {book_id for items in carts.values() for book_id in items}
+    with transaction.atomic():
+        gone = book_ids - set(Book.objects.filter(id__in=book_ids).values_list('id', flat=True))
+        cart_ids = dict(
+            Cart.objects.filter(customer_id__in=carts).values_list('customer_id', 'id')
+        )
+        missing = [customer_id for customer_id in carts if customer_id not in cart_ids]
+        if missing:
+            created = [Cart(id=new_id(), customer_id=customer_id) for customer_id in missing]
+            Cart.objects.bulk_create(created)
+            cart_ids.update((cart.customer_id, cart.id) for cart in created)
+
+        customer_by_cart = {cart_id: customer_id for customer_id, cart_id in cart_ids.items()}
+        stored = {}
+        for item in CartItem.objects.filter(cart_id__in=customer_by_cart).only('id', 'cart_id', 'book_id', 'quantity'):
+            stored[(customer_by_cart[item.cart_id], item.book_id)] = item
+
+        to_create, to_update = [], []
+        for customer_id, items in carts.items():
+            for book_id, quantity in items.items():
+                if book_id in gone:
+                    continue
+                item = stored.pop((customer_id, book_id), None)
+                if item is None:
+                    to_create.append(CartItem(
+                        id=new_id(), cart_id=cart_ids[customer_id], book_id=book_id, quantity=quantity,
+                    ))
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    to_update.append(item)
+        to_delete = [item.id for item in stored.values()]
+
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_delete:
+            CartItem.objects.filter(id__in=to_delete).delete()
+    return gone
+
+
+class DatabaseCartStore:
+    """
+    Every cart change is written straight to Cart/CartItem
+    """
+
+    def add(self, user, book_id, quantity=1):
+        """
+        Add a book to the user's cart and return its title.
+        Raises Customer.DoesNotExist or Book.DoesNotExist.
+        """
+        book = Book.objects.only('id', 'title').get(id=book_id)
+        customer = Customer.objects.get(user=user)
+        cart = get_or_create_cart(customer.pk)
+
+        # Check if item already in cart
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart,
+            book=book,
+            defaults={'id': new_id(), 'quantity': quantity}
+        )
+        if not created:
+            cart_item.quantity += quantity
+            cart_item.save(update_fields=['quantity'])
+        try:
+            _cache().incr(COUNT_KEY.format(customer.pk), quantity)
+        except ValueError:
+            # Not cached yet; the next badge render computes it
+            pass
+        return book.title
+
+    def remove(self, customer_id, item_id):
+        """
+        Remove a cart line if it belongs to the customer; return whether it did
+        """
+        deleted, _ = CartItem.objects.filter(id=item_id, cart__customer_id=customer_id).delete()
+        if deleted:
+            forget_cart_count(customer_id)
+        return bool(deleted)
+
+    def locked(self, customer_id):
+        """
+        Keep other requests from changing the customer's cart inside the
+        block; row locks already do that for database carts
+        """
+        return contextlib.nullcontext()
+
+    def sync(self, customer_id):
+        """
+        Make sure Cart/CartItem hold the customer's current cart
+        """
+
+    def clear(self, customer_id):
+        """
+        Forget the customer's live cart after it was ordered
+        """
+        set_cart_count(customer_id, 0)
+
+    def flush(self):
+        """
+        Write back every pending cart change
+        """
+
+
+class CachedCartStore(DatabaseCartStore):
+    """
+    Live carts in the cache backend, written back to the database later
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Customers whose cart lock the current thread holds
+        self._held = threading.local()
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'CART_FLUSH_BATCH_SIZE', 100)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'CART_FLUSH_INTERVAL', 30)
+
+    @property
+    def timeout(self):
+        # Live carts must outlive the flush interval by a wide margin
+        return getattr(settings, 'CART_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+    def _book_title(self, book_id):
+        cache = _cache()
+        key = BOOK_KEY.format(book_id)
+        title = cache.get(key)
+        if title is None:
+            title = Book.objects.values_list('title', flat=True).get(id=book_id)
+            cache.set(key, title, 3600)
+        return title
+
+    def _check_customer(self, user):
+        cache = _cache()
+        key = CUSTOMER_KEY.format(user.pk)
+        customer_id = cache.get(key)
+        if customer_id is None:
+            customer_id = Customer.objects.values_list('pk', flat=True).get(user=user)
+            cache.set(key, customer_id, self.timeout)
+        return customer_id
+
+    def _load(self, customer_id):
+        """
+        Live cart for a customer, seeded from the database on a cache miss
+        """
+        cache = _cache()
+        items = cache.get(CART_KEY.format(customer_id))
+        if items is None:
+            items = dict(
+                CartItem.objects.filter(cart__customer_id=customer_id)
+                .values_list('book_id', 'quantity')
+            )
+        return items
+
+    def _acquire(self, customer_id, wait=None):
+        """
+        Take the customer's cart lock, waiting up to ``wait`` seconds
+        (LOCK_WAIT by default); returns the lock token, or None when it
+        stayed taken
+        """
+        cache = _cache()
+        key = LOCK_KEY.format(customer_id)
+        token = new_id()
+        deadline = time.monotonic() + (LOCK_WAIT if wait is None else wait)
+        delay = 0.005
+        while not cache.add(key, token, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return token
+
+    def _release(self, customer_id, token):
+        cache = _cache()
+        key = LOCK_KEY.format(customer_id)
+        # Past LOCK_TIMEOUT the lock may belong to another request
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    @contextlib.contextmanager
+    def locked(self, customer_id):
+        """
+        Hold the customer's cart lock, e.g. from syncing the cart to
+        clearing it at checkout; re-entrant within a thread
+        """
+        held = self._held.__dict__.setdefault('customers', set())
+        if customer_id in held:
+            yield
+            return
+        token = self._acquire(customer_id)
+        if token is None:
+            raise CartBusy(f'Cart of customer {customer_id} is locked')
+        held.add(customer_id)
+        try:
+            yield
+        finally:
+            held.discard(customer_id)
+            self._release(customer_id, token)
+
+    def _store(self, customer_id, items, dirty=True):
+        _cache().set_many({
+            CART_KEY.format(customer_id): items,
+            COUNT_KEY.format(customer_id): sum(items.values()),
+        }, self.timeout)
+        if dirty:
+            with self._lock:
+                self._dirty.add(customer_id)
+
+    def add(self, user, book_id, quantity=1):
+        title = self._book_title(book_id)
+        customer_id = self._check_customer(user)
+        with self.locked(customer_id):
+            items = self._load(customer_id)
+            items[book_id] = items.get(book_id, 0) + quantity
+            self._store(customer_id, items)
+        self._maybe_flush()
+        return title
+
+    def remove(self, customer_id, item_id):
+        with self.locked(customer_id):
+            self.sync(customer_id)
+            removed = super().remove(customer_id, item_id)
+            if removed:
+                _cache().delete(CART_KEY.format(customer_id))
+        return removed
+
+    def _persist(self, carts):
+        """
+        Write locked live carts back, dropping books that no longer exist
+        from them
+        """
+        gone = persist_carts(carts)
+        if gone:
+            _cache().delete_many([BOOK_KEY.format(book_id) for book_id in gone])
+        for customer_id, items in carts.items():
+            if gone.intersection(items):
+                self._store(customer_id, {
+                    book_id: quantity for book_id, quantity in items.items() if book_id not in gone
+                }, dirty=False)
+
+    def sync(self, customer_id):
+        # Under the lock, so a sync cannot write back a cart that checkout
+        # ordered and cleared after it was read
+        with self.locked(customer_id):
+            items = _cache().get(CART_KEY.format(customer_id))
+            if items is not None:
+                self._persist({customer_id: items})
+            with self._lock:
+                self._dirty.discard(customer_id)
+
+    def clear(self, customer_id):
+        with self.locked(customer_id):
+            _cache().delete(CART_KEY.format(customer_id))
+            with self._lock:
+                self._dirty.discard(customer_id)
+        set_cart_count(customer_id, 0)
+
+    def _maybe_flush(self):
+        with self._lock:
+            due = (len(self._dirty) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Write back every pending cart change. Each cart is written under
+        its lock; carts locked elsewhere (e.g. being ordered) stay pending,
+        and so does the whole batch when the write fails.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._last_flush = time.monotonic()
+        if not dirty:
+            return
+        held = self._held.__dict__.setdefault('customers', set())
+        tokens, pending = {}, set()
+        for customer_id in sorted(dirty):
+            token = None if customer_id in held else self._acquire(customer_id, wait=0)
+            if token is None:
+                pending.add(customer_id)
+            else:
+                tokens[customer_id] = token
+        try:
+            cached = _cache().get_many([CART_KEY.format(customer_id) for customer_id in tokens])
+            self._persist({
+                customer_id: cached[CART_KEY.format(customer_id)]
+                for customer_id in tokens
+                if CART_KEY.format(customer_id) in cached
+            })
+        except DatabaseError:
+            logger.exception('Writing back %d carts failed; they stay pending', len(tokens))
+            pending.update(tokens)
+        finally:
+            for customer_id, token in tokens.items():
+                self._release(customer_id, token)
+            if pending:
+                with self._lock:
+                    self._dirty.update(pending)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_cart_store():
+    """
+    Return the cart store selected by the CART_STORAGE setting
+    """
+    mode = getattr(settings, 'CART_STORAGE', 'database')
+    store = _stores.get(mode)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(mode)
+            if store is None:
+                if mode == 'cache':
+                    store = CachedCartStore()
+                    atexit.register(store.flush)
+                elif mode == 'database':
+                    store = DatabaseCartStore()
+                else:
+                    raise ValueError(f"Unknown CART_STORAGE {mode!r}; use 'database' or 'cache'")
+                _stores[mode] = store
+    return store
@@ -0,0 +1,95 @@
+"""
+Order placement.
+
+Everything that turns a cart into an order happens in one transaction with
+a fixed number of statements regardless of cart size: cart lines and their
+books are read in one query, order lines are bulk-inserted, the order's
+OrderSummary is written alongside them, and the cart is emptied with a
+single DELETE. The sales rollups and the co-purchase model are updated
+once the order has committed.
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+
+from store.models.order.models import (
+    Cart, CartItem, Order, OrderHistory, OrderItem, Payment, Shipping,
+)
+from store.services.order import recommendation_cache, sales
+from store.services.order.copurchase import record_purchase
+from store.services.order.history import build_summary
+
+
+SHIPPING_FEE = Decimal('5.00')
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def place_order(customer):
+    """
+    Turn the customer's cart into an order and return it, or return None
+    if the cart is empty
+    """
+    with transaction.atomic():
+        # Lock the cart so a double-submitted form cannot order it twice
+        cart = Cart.objects.select_for_update().filter(customer=customer).first()
+        if cart is None:
+            return None
+
+        cart_items = list(
+            CartItem.objects.filter(cart=cart)
+            .select_related('book')
+            .only('id', 'quantity', 'book__id', 'book__title', 'book__price',
+                  'book__category_id', 'book__publisher_id')
+        )
+        if not cart_items:
+            return None
+
+        total_price = sum(item.book.price * item.quantity for item in cart_items)
+
+        order = Order.objects.create(
+            id=new_id(),
+            customer=customer,
+            total_price=total_price,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                id=new_id(),
+                order=order,
+                book_id=item.book.id,
+                quantity=item.quantity,
+                price=item.book.price,
+                total=item.book.price * item.quantity,
+                category_type=item.book.category_id or '',
+                publisher_id=item.book.publisher_id or '',
+            )
+            for item in cart_items
+        ])
+        Payment.objects.create(id=new_id(), order=order, amount=total_price, status='pending')
+        Shipping.objects.create(id=new_id(), order=order, fee=SHIPPING_FEE, status='pending')
+        OrderHistory.objects.create(id=new_id(), order=order, status=order.status)
+        build_summary(order, [
+            (item.book.id, item.book.title, item.book.price, item.quantity, item.book.price * item.quantity)
+            for item in cart_items
+        ]).save(force_insert=True)
+
+        sales.record_order(order, [
+            (item.book.id, item.book.category_id, item.book.publisher_id, item.quantity,
+             item.book.price * item.quantity)
+            for item in cart_items
+        ])
+
+        # Clear the cart
+        CartItem.objects.filter(cart=cart).delete()
+
+        # The co-purchase model is updated after the order commits, so its
+        # pair writes do not hold the checkout transaction open
+        customer_id, order_id = customer.pk, order.pk
+        book_ids = [item.book.id for item in cart_items]
+        transaction.on_commit(lambda: record_purchase(customer_id, order_id, book_ids), robust=True)
+        transaction.on_commit(lambda: recommendation_cache.invalidate_customer(customer_id))
+
+    return order
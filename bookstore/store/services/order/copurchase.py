@@ -0,0 +1,207 @@
+"""
+Item-to-item co-purchase model behind the recommendations page.
+
+``BookNeighbor(book, neighbor, score)`` holds, for every book, its top-N
+neighbours by the number of distinct customers who bought both. A full
+rebuild streams each customer's distinct purchases once per worker process;
+worker ``k`` only counts pairs whose left-hand book hashes to partition
+``k``, so memory and CPU are split evenly between processes. Placing an
+order adds a bounded number of new pairs incrementally after it commits,
+and trims the books it touched back to their top-N.
+"""
+import heapq
+import itertools
+import multiprocessing
+import zlib
+from collections import Counter, defaultdict
+
+from django.db import connections, transaction
+from django.db.models import F, Q, Sum
+
+from store.models.order.models import OrderItem
+from store.models.order.recommendation_models import BookNeighbor
+
+
+TOP_N = 50
+
+# Baskets are truncated to this many books: a handful of bulk buyers would
+# otherwise dominate the quadratic pair count
+MAX_BASKET = 200
+
+# Books paired per new order: its first MAX_ORDER_BOOKS new books with the
+# customer's MAX_HISTORY_BOOKS most recently bought ones
+MAX_ORDER_BOOKS = 20
+MAX_HISTORY_BOOKS = 30
+
+
+def customer_baskets(chunk_size=10000):
+    """
+    Yield ``(customer_id, [book_id, ...])`` for every customer, reading
+    distinct purchases in one streamed, customer-ordered query
+    """
+    rows = (
+        OrderItem.objects
+        .filter(book__isnull=False, order__customer__isnull=False)
+        .values_list('order__customer_id', 'book_id')
+        .distinct()
+        .order_by('order__customer_id', 'book_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for customer_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield customer_id, [book_id for _, book_id in itertools.islice(group, MAX_BASKET)]
+
+
+def partition_of(book_id, partitions):
+    # crc32 rather than hash(): string hashing is salted per process
+    return zlib.crc32(book_id.encode()) % partitions
+
+
+def count_partition(partition, partitions, top_n=TOP_N, chunk_size=10000):
+    """
+    Count co-purchases for the books in one partition and return their
+    top-N neighbours as ``(book_id, neighbor_id, score)`` rows
+    """
+    counts = defaultdict(Counter)
+    for _, basket in customer_baskets(chunk_size):
+        owned = [b for b in basket if partition_of(b, partitions) == partition]
+        for book_id in owned:
+            row = counts[book_id]
+            for other in basket:
+                if other != book_id:
+                    row[other] += 1
+
+    result = []
+    for book_id, row in counts.items():
+        for neighbor_id, score in heapq.nlargest(top_n, row.items(), key=lambda item: item[1]):
+            result.append((book_id, neighbor_id, score))
+    return result
+
+
+def _init_worker():
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _count_partition_job(args):
+    try:
+        return count_partition(*args)
+    finally:
+        connections.close_all()
+
+
+def rebuild(workers=1, top_n=TOP_N, chunk_size=10000, batch_size=5000):
+    """
+    Recompute the whole neighbour table and swap it in in one transaction.
+    Returns the number of rows written.
+    """
+    jobs = [(k, workers, top_n, chunk_size) for k in range(workers)]
+    if workers > 1:
+        # Child processes must open their own database connections
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            partitions = pool.map(_count_partition_job, jobs)
+    else:
+        partitions = [count_partition(*jobs[0])]
+
+    written = 0
+    with transaction.atomic():
+        BookNeighbor.objects.all().delete()
+        for rows in partitions:
+            for start in range(0, len(rows), batch_size):
+                BookNeighbor.objects.bulk_create([
+                    BookNeighbor(book_id=book_id, neighbor_id=neighbor_id, score=score)
+                    for book_id, neighbor_id, score in rows[start:start + batch_size]
+                ])
+            written += len(rows)
+    return written
+
+
+def record_purchase(customer_id, order_id, book_ids):
+    """
+    Add the co-purchase pairs created by one new order, in a transaction
+    of its own; checkout runs it after the order has committed.
+
+    Only books the customer had not bought before create new pairs, so each
+    score keeps counting distinct customers. At most MAX_ORDER_BOOKS of
+    them are paired, with at most MAX_HISTORY_BOOKS of the customer's most
+    recent earlier purchases, so the work per order is bounded however
+    long the history. Every book whose list changed is trimmed back to its
+    TOP_N neighbours; a pair trimmed away starts again from 1 and the next
+    full ``rebuild`` restores exact counts.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    earlier = OrderItem.objects.filter(order__customer_id=customer_id, book__isnull=False).exclude(order_id=order_id)
+    bought_before = set(earlier.filter(book_id__in=book_ids).values_list('book_id', flat=True))
+    new = [book_id for book_id in book_ids if book_id not in bought_before][:MAX_ORDER_BOOKS]
+    if not new:
+        return
+
+    previous = []
+    for book_id in earlier.order_by('-order__order_date').values_list('book_id', flat=True).iterator():
+        if book_id not in previous:
+            previous.append(book_id)
+            if len(previous) == MAX_HISTORY_BOOKS:
+                break
+
+    pairs = set()
+    for book_id in new:
+        for other in previous:
+            pairs.add((book_id, other))
+            pairs.add((other, book_id))
+        for other in new:
+            if other != book_id:
+                pairs.add((book_id, other))
+    if not pairs:
+        return
+
+    books = set(new) | set(previous)
+    with transaction.atomic():
+        # Exactly ``pairs``: each pairs a new book with another new or an
+        # earlier one, and ``new`` and ``previous`` do not overlap
+        matching = BookNeighbor.objects.filter(
+            Q(book_id__in=new) | Q(neighbor_id__in=new),
+            book_id__in=books, neighbor_id__in=books,
+        )
+        existing = set(matching.values_list('book_id', 'neighbor_id'))
+        # Missing pairs go in at 0 and are counted by the UPDATE with the
+        # rest, so a pair another order inserted meanwhile is incremented
+        # rather than dropped
+        BookNeighbor.objects.bulk_create(
+            [BookNeighbor(book_id=a, neighbor_id=b, score=0) for a, b in sorted(pairs - existing)],
+            ignore_conflicts=True,
+        )
+        matching.update(score=F('score') + 1)
+        trim({book_id for book_id, _ in pairs})
+
+
+def trim(book_ids, top_n=TOP_N):
+    """
+    Delete every neighbour of ``book_ids`` beyond their top ``top_n``
+    """
+    rows = (
+        BookNeighbor.objects.filter(book_id__in=book_ids)
+        .order_by('book_id', '-score', 'neighbor_id')
+        .values_list('id', 'book_id')
+    )
+    extra = [
+        pk
+        for _, group in itertools.groupby(rows, key=lambda row: row[1])
+        for pk, _ in itertools.islice(group, top_n, None)
+    ]
+    if extra:
+        BookNeighbor.objects.filter(id__in=extra).delete()
+
+
+def neighbor_book_ids(purchased_book_ids, limit=4):
+    """
+    Merge the neighbour lists of the purchased books, best total score first
+    """
+    return list(
+        BookNeighbor.objects.filter(book_id__in=purchased_book_ids)
+        .exclude(neighbor_id__in=purchased_book_ids)
+        .values('neighbor_id')
+        .annotate(total=Sum('score'))
+        .order_by('-total', 'neighbor_id')
+        .values_list('neighbor_id', flat=True)[:limit]
+    )
@@ -0,0 +1,88 @@
+"""
+Order history read model.
+
+Customer-facing order listings read ``OrderSummary`` only: one row per
+order carrying its item count, first titles and a JSON snapshot of its
+lines. Summaries are written in the same transaction as the order and kept
+in step with status changes.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from store.models.order.models import Order, OrderHistory, OrderItem, OrderSummary
+
+
+# Stable sort key for a customer's orders: newest first, id breaks ties
+ORDER_HISTORY_ORDERING = ('-order_date', '-order_id')
+
+# Titles kept in OrderSummary.first_titles
+SUMMARY_TITLES = 3
+
+
+def build_summary(order, lines):
+    """
+    Return an unsaved OrderSummary for an order and its lines, given as
+    ``(book_id, title, price, quantity, total)`` tuples
+    """
+    snapshot = [
+        {
+            'book_id': book_id,
+            'title': title,
+            'price': str(price),
+            'quantity': quantity,
+            'total': str(total),
+        }
+        for book_id, title, price, quantity, total in lines
+    ]
+    return OrderSummary(
+        order=order,
+        customer_id=order.customer_id,
+        order_date=order.order_date,
+        status=order.status,
+        total_price=order.total_price,
+        item_count=len(snapshot),
+        first_titles=[line['title'] for line in snapshot[:SUMMARY_TITLES]],
+        lines=snapshot,
+    )
+
+
+def rebuild_summaries(order_ids):
+    """
+    Recreate the summaries of the given orders from Order/OrderItem/Book
+    """
+    lines = OrderItem.objects.select_related('book').only(
+        'id', 'order_id', 'quantity', 'price', 'total', 'book__id', 'book__title',
+    ).order_by('id')
+    orders = Order.objects.filter(id__in=order_ids).prefetch_related(Prefetch('items', queryset=lines))
+    summaries = [
+        build_summary(order, [
+            (item.book_id, item.book.title if item.book else 'Unavailable book',
+             item.price, item.quantity, item.total)
+            for item in order.items.all()
+        ])
+        for order in orders
+    ]
+    with transaction.atomic():
+        OrderSummary.objects.filter(order_id__in=order_ids).delete()
+        OrderSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+
+def set_order_status(order, status):
+    """
+    Change an order's status, recording it in OrderHistory and the summary
+    """
+    with transaction.atomic():
+        order.status = status
+        order.save(update_fields=['status'])
+        OrderSummary.objects.filter(order_id=order.pk).update(status=status)
+        OrderHistory.objects.create(id=uuid.uuid4().hex, order=order, status=status)
+
+
+def order_history_queryset(customer_id):
+    """
+    A customer's order summaries; listing them needs no joins
+    """
+    return OrderSummary.objects.filter(customer_id=customer_id)
@@ -0,0 +1,168 @@
+"""
+Stock receiving.
+
+A supplier delivery becomes one ImportSlip with an ImportSlipDetail per
+line, and every delivered book's ``instock`` goes up by the quantity
+received, all in one transaction. Details are bulk-inserted, and stock is
+raised with set-based ``instock = instock + CASE id ... END`` updates over
+chunks of books, so a 10k-line slip costs a few dozen statements and no
+per-book read-modify-write. The books are locked in id order before the
+first update, so concurrent deliveries of the same books wait for each
+other instead of deadlocking.
+"""
+import csv
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from store.models.book.models import Book
+from store.models.order.supply_models import ImportSlip, ImportSlipDetail
+from store.services.book import fragments
+
+
+# Books per validation query, and details per INSERT
+CHUNK_SIZE = 1000
+# Books per stock UPDATE: three parameters each, under SQLite's 999
+UPDATE_CHUNK_SIZE = 300
+# IntegerField on every backend
+MAX_QUANTITY = 2 ** 31 - 1
+
+
+class ReceivingError(ValueError):
+    pass
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def _fits(value, field):
+    """
+    Whether a finite Decimal is stored in a DecimalField without rounding
+    or overflow
+    """
+    return (
+        abs(value) < Decimal(10) ** (field.max_digits - field.decimal_places)
+        and value == value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    )
+
+
+def _check_amount(number, value, field, what):
+    if not value.is_finite() or not _fits(value, field):
+        raise ReceivingError(
+            f'Line {number}: {what} must be a number below {Decimal(10) ** (field.max_digits - field.decimal_places)} '
+            f'with at most {field.decimal_places} decimal places'
+        )
+
+
+def parse_lines(stream):
+    """
+    Read ``book_id,quantity,price`` rows (with a header row) from CSV text
+    lines into ``(book_id, quantity, price)`` tuples.
+    Raises ReceivingError on the first malformed row.
+    """
+    reader = csv.DictReader(stream)
+    try:
+        fieldnames = reader.fieldnames
+    except (UnicodeDecodeError, csv.Error):
+        raise ReceivingError('Line 1: the file is not UTF-8 encoded CSV')
+    missing = {'book_id', 'quantity', 'price'} - set(fieldnames or ())
+    if missing:
+        raise ReceivingError(f"Missing column(s): {', '.join(sorted(missing))}")
+
+    lines = []
+    try:
+        for row in reader:
+            # DictReader fills the fields missing from a short row with None
+            # and collects extra ones under a None key
+            if None in row or None in row.values():
+                raise ReceivingError(f'Line {reader.line_num}: expected {len(fieldnames)} fields')
+            try:
+                line = (row['book_id'].strip(), int(row['quantity']), Decimal(row['price']))
+            except (InvalidOperation, ValueError, TypeError):
+                raise ReceivingError(f'Line {reader.line_num}: quantity and price must be numbers')
+            # Decimal() also reads NaN and Infinity, which cannot be stored
+            _check_amount(reader.line_num, line[2], ImportSlipDetail._meta.get_field('price'), 'price')
+            lines.append(line)
+    except (UnicodeDecodeError, csv.Error):
+        raise ReceivingError(f'Line {reader.line_num + 1}: the file is not UTF-8 encoded CSV')
+    return lines
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def receive_slip(lines, supplier=None, staff=None, manager=None, import_date=None):
+    """
+    Record a delivery of ``(book_id, quantity, unit_price)`` lines and add
+    it to stock; returns the saved ImportSlip.
+    Raises ReceivingError if a line is invalid or names an unknown book.
+    """
+    lines = list(lines)
+    if not lines:
+        raise ReceivingError('The delivery has no lines')
+
+    total_field = ImportSlipDetail._meta.get_field('total')
+    received = {}
+    for number, (book_id, quantity, price) in enumerate(lines, start=1):
+        if not book_id or not 0 < quantity <= MAX_QUANTITY or not price.is_finite() or price < 0:
+            raise ReceivingError(f'Line {number}: needs a book id, a positive quantity and a price')
+        _check_amount(number, price, ImportSlipDetail._meta.get_field('price'), 'price')
+        _check_amount(number, quantity * price, total_field, 'quantity times price')
+        received[book_id] = received.get(book_id, 0) + quantity
+    total = sum(quantity * price for _, quantity, price in lines)
+    if not _fits(total, ImportSlip._meta.get_field('total')):
+        raise ReceivingError('The delivery total is too large for one slip')
+    book_ids = sorted(received)
+
+    with transaction.atomic():
+        # Lock the books in id order before any UPDATE, so two concurrent
+        # deliveries of the same books queue instead of deadlocking
+        known = set()
+        for chunk in _chunks(book_ids):
+            known.update(
+                Book.objects.select_for_update().filter(id__in=chunk).order_by('id').values_list('id', flat=True)
+            )
+        unknown = [book_id for book_id in book_ids if book_id not in known]
+        if unknown:
+            raise ReceivingError(
+                f"Unknown book id(s): {', '.join(unknown[:10])}" + (' ...' if len(unknown) > 10 else '')
+            )
+
+        slip = ImportSlip.objects.create(
+            id=new_id(),
+            import_date=import_date or timezone.localdate(),
+            total=total,
+            staff=staff,
+            manager=manager,
+            supplier=supplier,
+        )
+        ImportSlipDetail.objects.bulk_create([
+            ImportSlipDetail(
+                id=new_id(),
+                import_slip=slip,
+                book_id=book_id,
+                quantity=quantity,
+                price=price,
+                total=quantity * price,
+            )
+            for book_id, quantity, price in lines
+        ], batch_size=CHUNK_SIZE)
+
+        # One UPDATE per chunk of books, each adding its own quantity:
+        # instock = instock + CASE id WHEN ... THEN <quantity> ... END
+        now = timezone.now()
+        for chunk in _chunks(book_ids, UPDATE_CHUNK_SIZE):
+            added = Case(
+                *[When(id=book_id, then=Value(received[book_id])) for book_id in chunk],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            Book.objects.filter(id__in=chunk).update(instock=F('instock') + added, updated_at=now)
+        fragments.bump(book_ids)
+    return slip
@@ -0,0 +1,125 @@
+"""
+Cache of recommendation results.
+
+Each customer's recommended book ids are cached under their own key with a
+TTL; the backend evicts least recently used entries when it is full
+(LocMemCache does this at MAX_ENTRIES). Entries are dropped when the
+customer places an order or rates a book, the only events that change
+their inputs. The cold-start "top rated" list is the same for everyone, so
+it is cached once under a global key, computed from the primary so a
+lagging read replica cannot fix an outdated list for everyone.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from store.routers import primary_reads
+
+
+CUSTOMER_KEY = 'recs:customer:{}'
+TOP_RATED_KEY = 'recs:top_rated'
+
+
+class CacheStats:
+    """
+    Process-local hit/miss counters
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+stats = CacheStats()
+top_rated_stats = CacheStats()
+
+
+def _cache():
+    return caches[getattr(settings, 'RECOMMENDATION_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'RECOMMENDATION_CACHE_TIMEOUT', 900)
+
+
+def customer_book_ids(customer_id, compute):
+    """
+    Return the cached recommendation ids for a customer, calling
+    ``compute()`` and caching its result on a miss
+    """
+    key = CUSTOMER_KEY.format(customer_id)
+    cache = _cache()
+    book_ids = cache.get(key)
+    if book_ids is not None:
+        stats.record('hits')
+        return book_ids
+    stats.record('misses')
+    book_ids = list(compute())
+    cache.set(key, book_ids, _timeout())
+    return book_ids
+
+
+async def acustomer_book_ids(customer_id, compute):
+    """
+    ``customer_book_ids()`` for async views; ``compute`` is a coroutine
+    function
+    """
+    key = CUSTOMER_KEY.format(customer_id)
+    cache = _cache()
+    book_ids = await cache.aget(key)
+    if book_ids is not None:
+        stats.record('hits')
+        return book_ids
+    stats.record('misses')
+    book_ids = list(await compute())
+    await cache.aset(key, book_ids, _timeout())
+    return book_ids
+
+
+def top_rated_book_ids(compute):
+    """
+    Return the global cold-start list, computing it at most once per TTL
+    """
+    cache = _cache()
+    book_ids = cache.get(TOP_RATED_KEY)
+    if book_ids is not None:
+        top_rated_stats.record('hits')
+        return book_ids
+    top_rated_stats.record('misses')
+    with primary_reads():
+        book_ids = list(compute())
+    cache.set(TOP_RATED_KEY, book_ids, _timeout())
+    return book_ids
+
+
+def invalidate_customer(customer_id):
+    _cache().delete(CUSTOMER_KEY.format(customer_id))
+    stats.record('invalidations')
+
+
+def stats_snapshot():
+    return {
+        'customer': stats.as_dict(),
+        'top_rated': top_rated_stats.as_dict(),
+    }
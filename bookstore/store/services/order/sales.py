@@ -0,0 +1,196 @@
+"""
+Sales rollups behind the staff dashboard.
+
+DailySales, DailyCategorySales and DailyBookSales hold order counts, units
+and revenue per day (and per category / book). Placing an order adds to
+them once the order has committed, in a transaction of their own, so
+concurrent checkouts do not queue on the day's DailySales row for as long
+as their orders are open; cancelling an order takes its lines back out,
+and un-cancelling adds them again, also after commit. Lines count under
+the category and publisher their book had when sold, which OrderItem
+records. An order whose rollup transaction fails is missing from the
+rollups until the next ``rebuild``. Each change costs two statements per
+table whatever the number of lines: an INSERT that ignores existing rows,
+then one UPDATE with per-key F-expression increments, so concurrent
+orders on the same day never lose updates.
+
+``rebuild`` recomputes the rollups from Order/OrderItem in chunks of days.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Max, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from store.models.order.models import Order, OrderItem
+from store.models.order.sales_models import DailyBookSales, DailyCategorySales, DailySales
+from store.services.exports import day_bounds
+
+
+# Orders in these statuses are not counted in the rollups
+UNCOUNTED_STATUSES = frozenset({'cancelled'})
+
+
+def is_counted(status):
+    return status not in UNCOUNTED_STATUSES
+
+
+def sale_day(order_date):
+    return timezone.localdate(order_date) if timezone.is_aware(order_date) else order_date.date()
+
+
+def _increment(model, day, key_field, deltas, defaults=None):
+    """
+    Add ``{key: (orders, units, revenue)}`` to the rows of ``model`` for a day
+    """
+    if not deltas:
+        return
+    defaults = defaults or {}
+    model.objects.bulk_create(
+        [model(**{'day': day, key_field: key, **defaults.get(key, {})}) for key in deltas],
+        ignore_conflicts=True,
+    )
+
+    def per_key(position, output_field):
+        return Case(
+            *[When(**{key_field: key}, then=Value(delta[position])) for key, delta in deltas.items()],
+            default=Value(0),
+            output_field=output_field,
+        )
+
+    model.objects.filter(**{'day': day, f'{key_field}__in': list(deltas)}).update(
+        orders=F('orders') + per_key(0, IntegerField()),
+        units=F('units') + per_key(1, IntegerField()),
+        revenue=F('revenue') + per_key(2, DecimalField(max_digits=14, decimal_places=2)),
+    )
+
+
+def record_order(order, lines, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) an order in the rollups once the
+    current transaction commits. ``lines`` are ``(book_id, category_type,
+    publisher_id, quantity, total)`` tuples.
+    """
+    lines = list(lines)
+    if not lines:
+        return
+    day = sale_day(order.order_date)
+
+    categories = defaultdict(lambda: [0, 0, Decimal('0')])
+    books = defaultdict(lambda: [0, 0, Decimal('0')])
+    publishers = {}
+    for book_id, category_type, publisher_id, quantity, total in lines:
+        for row in (categories[category_type or ''], books[book_id or '']):
+            row[1] += quantity
+            row[2] += total
+        publishers[book_id or ''] = {'publisher_id': publisher_id or ''}
+    # An order counts once per category and book it contains
+    for row in list(categories.values()) + list(books.values()):
+        row[0] = 1
+
+    units = sum(row[1] for row in books.values())
+    revenue = sum((row[2] for row in books.values()), Decimal('0'))
+
+    def signed(rows):
+        return {key: tuple(sign * value for value in row) for key, row in rows.items()}
+
+    def apply():
+        with transaction.atomic():
+            _increment(DailySales, day, 'day', {day: (sign, sign * units, sign * revenue)})
+            _increment(DailyCategorySales, day, 'category_type', signed(categories))
+            _increment(DailyBookSales, day, 'book_id', signed(books), defaults=publishers)
+
+    transaction.on_commit(apply, robust=True)
+
+
+def with_sale_keys(order_items):
+    """
+    Annotate order lines with the category and publisher they were sold
+    under, taken from the book for lines that did not record them
+    """
+    return order_items.annotate(
+        sale_category=Coalesce('category_type', 'book__category_id'),
+        sale_publisher=Coalesce('publisher_id', 'book__publisher_id'),
+    )
+
+
+def order_lines(order_id):
+    return with_sale_keys(OrderItem.objects.filter(order_id=order_id)).values_list(
+        'book_id', 'sale_category', 'sale_publisher', 'quantity', 'total',
+    )
+
+
+def status_changed(order, old_status):
+    """
+    Take a cancelled order out of the rollups, or put it back
+    """
+    if is_counted(old_status) == is_counted(order.status):
+        return
+    record_order(order, order_lines(order.pk), sign=1 if is_counted(order.status) else -1)
+
+
+def rebuild(since=None, until=None, days_per_chunk=7):
+    """
+    Recompute the rollups for ``since``..``until`` (inclusive; default: the
+    whole order history), one transaction per chunk of days.
+    Returns the number of days rebuilt.
+    """
+    if since is None or until is None:
+        bounds = Order.objects.aggregate(first=Min('order_date'), last=Max('order_date'))
+        if bounds['first'] is None:
+            return 0
+        since = since or sale_day(bounds['first'])
+        until = until or sale_day(bounds['last'])
+
+    rebuilt = 0
+    start = since
+    while start <= until:
+        end = min(start + datetime.timedelta(days=days_per_chunk - 1), until)
+        _rebuild_days(start, end)
+        rebuilt += (end - start).days + 1
+        start = end + datetime.timedelta(days=1)
+    return rebuilt
+
+
+def _rebuild_days(start, end):
+    tz = timezone.get_current_timezone()
+    # A range on order_date itself, so the order_date index can be used
+    first, last = day_bounds(start, end)
+    items = with_sale_keys(OrderItem.objects.filter(
+        order__order_date__gte=first,
+        order__order_date__lt=last,
+    ).exclude(order__status__in=UNCOUNTED_STATUSES)).annotate(
+        sale_day=TruncDate('order__order_date', tzinfo=tz),
+    )
+    totals = items.values('sale_day').annotate(
+        n_orders=Count('order_id', distinct=True), n_units=Sum('quantity'), n_revenue=Sum('total'),
+    ).order_by()
+    by_category = items.values('sale_day', 'sale_category').annotate(
+        n_orders=Count('order_id', distinct=True), n_units=Sum('quantity'), n_revenue=Sum('total'),
+    ).order_by()
+    by_book = items.values('sale_day', 'book_id', 'sale_publisher').annotate(
+        n_orders=Count('order_id', distinct=True), n_units=Sum('quantity'), n_revenue=Sum('total'),
+    ).order_by()
+
+    with transaction.atomic():
+        for model in (DailySales, DailyCategorySales, DailyBookSales):
+            model.objects.filter(day__gte=start, day__lte=end).delete()
+        DailySales.objects.bulk_create([
+            DailySales(day=row['sale_day'], orders=row['n_orders'], units=row['n_units'],
+                       revenue=row['n_revenue'])
+            for row in totals
+        ])
+        DailyCategorySales.objects.bulk_create([
+            DailyCategorySales(day=row['sale_day'], category_type=row['sale_category'] or '',
+                               orders=row['n_orders'], units=row['n_units'], revenue=row['n_revenue'])
+            for row in by_category
+        ])
+        DailyBookSales.objects.bulk_create([
+            DailyBookSales(day=row['sale_day'], book_id=row['book_id'] or '',
+                           publisher_id=row['sale_publisher'] or '',
+                           orders=row['n_orders'], units=row['n_units'], revenue=row['n_revenue'])
+            for row in by_book
+        ], batch_size=2000)
@@ -0,0 +1,185 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Unlike OFFSET pagination, a keyset page is located with a range filter on
+an indexed, unique sort key, so page N costs the same as page 1.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+def clamp_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Parse a page size from user input and clamp it to [1, maximum]
+    """
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder that keeps full microsecond precision on datetimes;
+    DjangoJSONEncoder truncates to milliseconds, which would make the
+    seek skip or repeat rows.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def seek_filter(ordering, values, forward=True):
+    """
+    Rows strictly after (or before) ``values`` in ``ordering``.
+
+    Builds ``(a, b) > (x, y)`` style row comparisons as an OR of ANDs,
+    which the ORM can express and the database can serve from an index.
+    """
+    fields = [name.lstrip('-') for name in ordering]
+    condition = Q()
+    for i, name in enumerate(ordering):
+        descending = name.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        term = Q(**{f'{fields[i]}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            term &= Q(**{prev_field: prev_value})
+        condition |= term
+    return condition
+
+
+class KeysetPage:
+    """
+    One page of results plus the cursors needed to move around it
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by a stable, unique ordering such as
+    ``('-created_at', '-id')``.
+
+    The last ordering field must be unique so that the key is a total order.
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps(values, cls=CursorEncoder).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        Return the key values stored in a cursor, or None if it is invalid
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, binascii.Error, UnicodeError):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            return None
+        opts = self.queryset.model._meta
+        try:
+            return [
+                opts.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            return None
+
+    def _query(self, after, before):
+        """
+        ``(queryset, key, forward)`` for the page following ``after`` or
+        preceding ``before``
+        """
+        qs = self.queryset
+        key = None
+        forward = True
+        if after:
+            key = self.decode_cursor(after)
+        elif before:
+            key = self.decode_cursor(before)
+            forward = key is None
+
+        if forward:
+            ordering = self.ordering
+        else:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering
+            )
+        if key is not None:
+            qs = qs.filter(seek_filter(self.ordering, key, forward))
+
+        # Fetch one extra row to know whether there is a further page
+        return qs.order_by(*ordering)[:self.per_page + 1], key, forward
+
+    def _page(self, rows, key, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([])
+
+        if forward:
+            next_cursor = self.encode_cursor(rows[-1]) if has_more else None
+            previous_cursor = self.encode_cursor(rows[0]) if key is not None else None
+        else:
+            next_cursor = self.encode_cursor(rows[-1])
+            previous_cursor = self.encode_cursor(rows[0]) if has_more else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def page(self, after=None, before=None):
+        """
+        Return the page following ``after`` or preceding ``before``.
+        With neither cursor the first page is returned.
+        """
+        qs, key, forward = self._query(after, before)
+        return self._page(list(qs), key, forward)
+
+    async def apage(self, after=None, before=None):
+        """
+        ``page()`` for async views
+        """
+        qs, key, forward = self._query(after, before)
+        return self._page([row async for row in qs], key, forward)
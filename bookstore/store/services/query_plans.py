@@ -0,0 +1,246 @@
+"""
+Query-plan regression checks.
+
+Each hot view is requested through the test client while every SELECT it
+sends is captured; each captured statement is then run through EXPLAIN
+and flagged when the plan reads a whole table or sorts rows outside an
+index (MySQL "Using filesort", SQLite "USE TEMP B-TREE FOR ORDER BY",
+PostgreSQL Sort nodes).
+
+Views are requested twice and only the second request is checked, so
+one-off warm-up work (loading the in-process search index) is not
+mistaken for the steady state, with caching disabled so that queries
+normally answered from the cache are checked as well. Tables smaller than ``min_rows`` are not
+flagged: scanning a handful of categories is cheaper than any index.
+Sorts only matter for top-N queries (with LIMIT): sorting a result that
+is returned whole costs no more than returning it, and results ordered by
+an aggregate (GROUP BY) cannot come from an index at all.
+"""
+import json
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+
+
+FULL_SCAN = 'full table scan'
+FILESORT = 'filesort'
+
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class PlanProblem:
+    """
+    One suspicious step of a query plan
+    """
+
+    def __init__(self, kind, table, detail):
+        self.kind = kind
+        self.table = table
+        self.detail = detail
+
+
+class StatementPlan:
+    """
+    A captured SELECT and the problems found in its plan
+    """
+
+    def __init__(self, sql, problems):
+        self.sql = sql
+        self.problems = problems
+
+
+class ViewPlan:
+    """
+    Every SELECT one view request sent, with their plans checked
+    """
+
+    def __init__(self, name, path, status):
+        self.name = name
+        self.path = path
+        self.status = status
+        self.statements = []
+
+    @property
+    def ok(self):
+        """
+        Whether the view rendered; a redirect or an error page runs other
+        queries than the page meant to be checked
+        """
+        return self.status == 200
+
+    @property
+    def problems(self):
+        return [(statement, problem) for statement in self.statements for problem in statement.problems]
+
+
+class SelectRecorder:
+    """
+    Execute wrapper that keeps the SQL and parameters of every SELECT
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def _explain_sqlite(cursor, sql, params):
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    problems = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        words = detail.split()
+        if words[:1] == ['SCAN'] and 'USING' not in words:
+            problems.append(PlanProblem(FULL_SCAN, words[1], detail))
+        elif detail.startswith('USE TEMP B-TREE FOR') and 'ORDER BY' in detail:
+            problems.append(PlanProblem(FILESORT, '', detail))
+    return problems
+
+
+def _explain_mysql(cursor, sql, params):
+    cursor.execute(f'EXPLAIN {sql}', params)
+    columns = [column[0].lower() for column in cursor.description]
+    problems = []
+    for values in cursor.fetchall():
+        row = dict(zip(columns, values))
+        extra = row.get('extra') or ''
+        table = row.get('table') or ''
+        if row.get('type') == 'ALL':
+            problems.append(PlanProblem(FULL_SCAN, table, f"type=ALL rows={row.get('rows')} {extra}".strip()))
+        if 'Using filesort' in extra:
+            problems.append(PlanProblem(FILESORT, table, extra))
+    return problems
+
+
+def _explain_postgresql(cursor, sql, params):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', ()))
+        if node['Node Type'] == 'Seq Scan':
+            problems.append(PlanProblem(FULL_SCAN, node.get('Relation Name', ''), 'Seq Scan'))
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            problems.append(PlanProblem(FILESORT, '', ', '.join(node.get('Sort Key', ()))))
+    return problems
+
+
+EXPLAINERS = {
+    'sqlite': _explain_sqlite,
+    'mysql': _explain_mysql,
+    'postgresql': _explain_postgresql,
+}
+
+
+class PlanChecker:
+    """
+    Request views, EXPLAIN their SELECTs and collect plan problems
+    """
+
+    def __init__(self, using='default', min_rows=1000, allowed_tables=()):
+        self.connection = connections[using]
+        if self.connection.vendor not in EXPLAINERS:
+            raise ValueError(f'EXPLAIN checks are not supported on {self.connection.vendor}')
+        self.explain = EXPLAINERS[self.connection.vendor]
+        self.min_rows = min_rows
+        self.allowed_tables = set(allowed_tables)
+        self._row_counts = {}
+        try:
+            # Lets the test client through ALLOWED_HOSTS
+            setup_test_environment()
+        except RuntimeError:
+            # Already set up (e.g. when run from a test runner)
+            pass
+
+    def row_count(self, table):
+        """
+        Rows in a table, or None when ``table`` is an alias rather than a table
+        """
+        if table not in self._row_counts:
+            count = None
+            if table in self.connection.introspection.table_names():
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) FROM {self.connection.ops.quote_name(table)}')
+                    count = cursor.fetchone()[0]
+            self._row_counts[table] = count
+        return self._row_counts[table]
+
+    def relevant(self, problem, sql):
+        if problem.table in self.allowed_tables:
+            return False
+        if problem.kind == FULL_SCAN:
+            if problem.table.startswith('('):
+                # A materialised subquery; its own table reads are listed separately
+                return False
+            count = self.row_count(problem.table)
+            return count is None or count >= self.min_rows
+        upper = sql.upper()
+        return ' LIMIT ' in upper and ' GROUP BY ' not in upper
+
+    def check(self, name, path, user=None):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        # Bypass the cache so queries normally served from it are checked too
+        with override_settings(CACHES=DUMMY_CACHES):
+            client.get(path)
+            recorder = SelectRecorder()
+            with self.connection.execute_wrapper(recorder):
+                response = client.get(path)
+        view = ViewPlan(name, path, response.status_code)
+        with self.connection.cursor() as cursor:
+            for sql, params in recorder.statements:
+                problems = [p for p in self.explain(cursor, sql, params) if self.relevant(p, sql)]
+                view.statements.append(StatementPlan(sql, problems))
+        return view
+
+
+def hot_views():
+    """
+    ``(name, path, user)`` for the views worth guarding, using data that
+    exists in the current database; views whose data is missing are skipped.
+    Checkout needs a customer with a non-empty cart, or it redirects and
+    fails the check.
+    """
+    from store.models import Book, CartItem, Customer, Order, Staff
+
+    views = [('catalog', '/', None), ('search', '/search/?q=the', None), ('suggest', '/suggest/?q=a', None)]
+    book_id = Book.objects.order_by('-created_at', '-id').values_list('id', flat=True).first()
+    if book_id is not None:
+        views.append(('book detail', f'/{book_id}/', None))
+
+    customer_id = Customer.objects.values_list('pk', flat=True).first()
+    # Checkout redirects an empty cart to the cart page; prefer a customer
+    # with something in their cart, and one with orders for the history
+    cart_customer_id = CartItem.objects.values_list('cart__customer_id', flat=True).first() or customer_id
+    order_customer_id = (
+        Order.objects.filter(customer__isnull=False).order_by('-order_date')
+        .values_list('customer_id', flat=True).first()
+        or customer_id
+    )
+    if customer_id is not None:
+        users = {
+            customer.pk: customer.user
+            for customer in Customer.objects.select_related('user').filter(pk__in=[cart_customer_id, order_customer_id])
+        }
+        views += [
+            ('cart', '/order/cart/', users[cart_customer_id]),
+            ('checkout', '/order/checkout/', users[cart_customer_id]),
+            ('order history', '/order/history/', users[order_customer_id]),
+            ('recommendations', '/order/recommendations/', users[order_customer_id]),
+        ]
+
+    staff = Staff.objects.select_related('user').first()
+    if staff is not None:
+        views += [
+            ('staff dashboard', '/staff/', staff.user),
+        ]
+    return views
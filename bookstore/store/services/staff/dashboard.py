@@ -0,0 +1,87 @@
+"""
+Staff dashboard figures.
+
+Everything here reads the sales rollups and cached approximate counts,
+never Order/OrderItem, so the dashboard costs the same however much order
+history there is. The assembled figures are cached for
+SALES_DASHBOARD_CACHE_TIMEOUT seconds.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from store.models.book.models import Book, Publisher
+from store.models.customer.models import Customer
+from store.models.order.sales_models import DailyBookSales, DailyCategorySales, DailySales
+from store.services.book import dimensions
+from store.services.counts import approximate_count
+
+
+DASHBOARD_KEY = 'staff:dashboard'
+
+TOP_ROWS = 5
+
+
+def _top(queryset, key, limit=TOP_ROWS):
+    return list(
+        queryset.values(key)
+        .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', key)[:limit]
+    )
+
+
+def dashboard_data(today=None):
+    """
+    Totals, the last SALES_DASHBOARD_DAYS days and the best-selling
+    categories, publishers and books of that window
+    """
+    days = getattr(settings, 'SALES_DASHBOARD_DAYS', 30)
+    today = today or timezone.localdate()
+    key = f'{DASHBOARD_KEY}:{today.isoformat()}:{days}'
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    since = today - datetime.timedelta(days=days - 1)
+    totals = DailySales.objects.aggregate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+    daily = list(DailySales.objects.filter(day__gte=since, day__lte=today).order_by('-day'))
+    window = {
+        'orders': sum(row.orders for row in daily),
+        'units': sum(row.units for row in daily),
+        'revenue': sum((row.revenue for row in daily), Decimal('0')),
+    }
+
+    categories = _top(DailyCategorySales.objects.filter(day__gte=since, day__lte=today), 'category_type')
+    window_books = DailyBookSales.objects.filter(day__gte=since, day__lte=today)
+    publishers = _top(window_books, 'publisher_id')
+    books = _top(window_books, 'book_id')
+
+    publisher_names = dimensions.in_bulk(Publisher, [row['publisher_id'] for row in publishers])
+    for row in publishers:
+        publisher = publisher_names.get(row['publisher_id'])
+        row['name'] = publisher.name if publisher else 'Unknown publisher'
+    book_titles = dict(
+        Book.objects.filter(id__in=[row['book_id'] for row in books]).values_list('id', 'title')
+    )
+    for row in books:
+        row['title'] = book_titles.get(row['book_id'], 'Unavailable book')
+
+    data = {
+        'book_count': approximate_count(Book),
+        'customer_count': approximate_count(Customer),
+        'order_count': totals['orders'] or 0,
+        'units_sold': totals['units'] or 0,
+        'revenue': totals['revenue'] or Decimal('0'),
+        'days': days,
+        'window': window,
+        'daily': daily,
+        'top_categories': categories,
+        'top_publishers': publishers,
+        'top_books': books,
+    }
+    cache.set(key, data, getattr(settings, 'SALES_DASHBOARD_CACHE_TIMEOUT', 60))
+    return data
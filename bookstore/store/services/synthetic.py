@@ -0,0 +1,433 @@
+"""
+Synthetic store data at a configurable scale.
+
+Every table is generated in fixed-size jobs of ROWS_PER_JOB rows. Each job
+derives its own random generator from the seed, the table and its first
+row, and every id is a function of a row number (``book-17``,
+``order-42``). The output is therefore the same for a given seed and scale
+however the jobs are spread over worker processes, and a job can point at
+rows that another process is writing (an order line names ``book-17``
+without looking it up).
+
+Tables are written in phases so that foreign keys always point at rows that
+were committed in an earlier phase. Jobs within a phase are independent
+and run in parallel. Book prices are a pure function of the book number,
+so order lines can be priced without reading the Book table. Popularity is
+Zipf-like: book ``k`` is picked roughly in proportion to ``1 / (k + 1)``.
+Derived tables (order summaries, rating aggregates, co-purchase
+neighbours, sales rollups) are rebuilt from the generated rows at the end.
+"""
+import contextlib
+import datetime
+import multiprocessing
+import random
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from store.models import (
+    Address, Author, Book, Cart, CartItem, Category, Customer, Invoice, MemberShip, Order, OrderHistory,
+    OrderItem, Payment, Publisher, Rating, Shipping, Staff, User, Voucher,
+)
+from store.models.order.supply_models import ImportSlip, ImportSlipDetail, Supplier
+from store.services.book import dimensions, ratings
+from store.services.order import copurchase, history, sales
+
+
+# Rows of each table at scale 1; scale 1000 is a production-sized store
+# (1M books, 100k authors, 500k customers, about 5M order lines)
+ROWS_PER_SCALE = {
+    'publishers': 20,
+    'authors': 100,
+    'books': 1000,
+    'customers': 500,
+    'staff': 2,
+    'suppliers': 5,
+    'vouchers': 10,
+    'orders': 2000,
+    'carts': 100,
+    'import_slips': 10,
+}
+
+ROWS_PER_JOB = 10000
+
+CATEGORIES = (
+    'Fiction', 'Mystery', 'Fantasy', 'Science Fiction', 'Romance', 'Thriller', 'Horror', 'Poetry',
+    'Biography', 'History', 'Science', 'Travel', 'Cooking', 'Art', 'Children', 'Business',
+)
+WORDS = (
+    'shadow', 'river', 'empire', 'garden', 'night', 'storm', 'city', 'secret', 'journey', 'stone',
+    'light', 'winter', 'ocean', 'machine', 'silver', 'forest', 'kingdom', 'letter', 'memory', 'fire',
+    'island', 'glass', 'crown', 'road', 'house', 'song', 'war', 'dream', 'mountain', 'star',
+)
+FIRST_NAMES = (
+    'Anna', 'Ben', 'Chloe', 'David', 'Emma', 'Finn', 'Grace', 'Hugo', 'Ivy', 'Jack', 'Kate', 'Liam',
+    'Mai', 'Nam', 'Olivia', 'Phuong', 'Quang', 'Rosa', 'Sam', 'Thao', 'Uma', 'Viet', 'Will', 'Yen',
+)
+LAST_NAMES = (
+    'Nguyen', 'Tran', 'Le', 'Pham', 'Hoang', 'Smith', 'Jones', 'Brown', 'Garcia', 'Muller', 'Rossi',
+    'Dubois', 'Sato', 'Kim', 'Silva', 'Novak',
+)
+CITIES = ('Hanoi', 'Ho Chi Minh City', 'Da Nang', 'Hue', 'Can Tho', 'Hai Phong')
+
+# (order status, share of orders)
+ORDER_STATUSES = (
+    ('delivered', 0.70), ('shipped', 0.10), ('processing', 0.06), ('pending', 0.06), ('cancelled', 0.08),
+)
+
+
+class Plan:
+    """
+    Row counts and shared inputs of one generation run
+    """
+
+    def __init__(self, scale, seed, end_date, password_hash, address_base=0, batch_size=2000):
+        self.scale = scale
+        self.seed = seed
+        self.end_date = end_date
+        self.password_hash = password_hash
+        self.address_base = address_base
+        self.batch_size = batch_size
+        self.rows = {table: max(1, round(count * scale)) for table, count in ROWS_PER_SCALE.items()}
+        # Row counts are also attributes: plan.books, plan.orders, ...
+        self.__dict__.update(self.rows)
+        self.end = timezone.make_aware(datetime.datetime.combine(end_date, datetime.time.max))
+
+    def rng(self, table, start):
+        return random.Random(f'{self.seed}:{table}:{start}')
+
+    def moment(self, rng, days):
+        """
+        A random aware datetime within ``days`` days before the end date
+        """
+        return self.end - datetime.timedelta(seconds=rng.randrange(days * 86400))
+
+
+def book_price(plan, number):
+    # Multiplicative hashing: cheap, deterministic and evenly spread
+    return Decimal(499 + ((number + plan.seed) * 2654435761) % 4500) / 100
+
+
+def popular(rng, count):
+    """
+    A row number in [0, count) with P(k) roughly proportional to 1 / (k + 1)
+    """
+    return min(count - 1, int((count + 1) ** rng.random()) - 1)
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+@contextlib.contextmanager
+def explicit_timestamps():
+    """
+    Let bulk_create keep generated created_at / order_date values instead
+    of overwriting them with the current time
+    """
+    fields = [
+        field for model in (Author, Book, Publisher, User, Address, MemberShip, Supplier, Voucher, Cart,
+                            Order, OrderHistory, Payment, Rating, Shipping)
+        for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _write(plan, model, rows):
+    model.objects.bulk_create(rows, batch_size=plan.batch_size)
+    return len(rows)
+
+
+def publishers(plan, rng, start, stop):
+    return {'publishers': _write(plan, Publisher, [
+        Publisher(id=f'publisher-{i}', name=f'{rng.choice(WORDS).title()} Press {i}',
+                  address=rng.choice(CITIES), created_at=plan.moment(rng, 3650))
+        for i in range(start, stop)
+    ])}
+
+
+def authors(plan, rng, start, stop):
+    return {'authors': _write(plan, Author, [
+        Author(id=f'author-{i}', name=_name(rng), email=f'author{i}@example.com',
+               created_at=plan.moment(rng, 3650))
+        for i in range(start, stop)
+    ])}
+
+
+def users(plan, rng, start, stop):
+    # Customers first, then staff; every account shares one password hash
+    rows = []
+    for i in range(start, stop):
+        if i < plan.customers:
+            rows.append(User(id=f'user-{i}', username=f'customer{i}', fullname=_name(rng),
+                             password=plan.password_hash, created_at=plan.moment(rng, 1095)))
+        else:
+            n = i - plan.customers
+            rows.append(User(id=f'staff-{n}', username=f'staff{n}', fullname=_name(rng),
+                             password=plan.password_hash, created_at=plan.moment(rng, 1095)))
+    return {'users': _write(plan, User, rows)}
+
+
+def vouchers(plan, rng, start, stop):
+    rows = []
+    for i in range(start, stop):
+        begins = plan.end_date - datetime.timedelta(days=rng.randrange(365))
+        rows.append(Voucher(id=f'voucher-{i}', code=f'SAVE{i:05d}', discount=Decimal(rng.choice((5, 10, 15, 20))),
+                            start_date=begins, end_date=begins + datetime.timedelta(days=rng.randrange(7, 60)),
+                            created_at=plan.moment(rng, 365)))
+    return {'vouchers': _write(plan, Voucher, rows)}
+
+
+def suppliers(plan, rng, start, stop):
+    return {'suppliers': _write(plan, Supplier, [
+        Supplier(id=f'supplier-{i}', name=f'{rng.choice(WORDS).title()} Distribution {i}',
+                 address=rng.choice(CITIES), created_at=plan.moment(rng, 3650))
+        for i in range(start, stop)
+    ])}
+
+
+def books(plan, rng, start, stop):
+    return {'books': _write(plan, Book, [
+        Book(id=f'book-{i}', title=f"The {' '.join(rng.sample(WORDS, rng.randint(1, 3))).title()}",
+             author_id=f'author-{rng.randrange(plan.authors)}',
+             publisher_id=f'publisher-{rng.randrange(plan.publishers)}',
+             category_id=rng.choice(CATEGORIES), price=book_price(plan, i),
+             instock=rng.randrange(0, 200), created_at=plan.moment(rng, 1825))
+        for i in range(start, stop)
+    ])}
+
+
+def addresses(plan, rng, start, stop):
+    return {'addresses': _write(plan, Address, [
+        Address(id=plan.address_base + i + 1, num=str(rng.randint(1, 500)),
+                street=f'{rng.choice(WORDS).title()} Street', city=rng.choice(CITIES),
+                user_id=f'user-{i}', created_at=plan.moment(rng, 1095))
+        for i in range(start, stop)
+    ])}
+
+
+def staff(plan, rng, start, stop):
+    return {'staff': _write(plan, Staff, [
+        Staff(user_id=f'staff-{i}', role='manager' if i == 0 else 'clerk')
+        for i in range(start, stop)
+    ])}
+
+
+def customers(plan, rng, start, stop):
+    written = _write(plan, Customer, [
+        Customer(user_id=f'user-{i}', email=f'customer{i}@example.com', tel=f'09{i:08d}'[-10:],
+                 address_id=plan.address_base + i + 1)
+        for i in range(start, stop)
+    ])
+    members = _write(plan, MemberShip, [
+        MemberShip(id=f'membership-{i}', customer_id=f'user-{i}', point=rng.randrange(5000),
+                   level=rng.choice(('silver', 'gold', 'platinum')), status='active',
+                   created_at=plan.moment(rng, 1095))
+        for i in range(start, stop) if i % 5 == 0
+    ])
+    return {'customers': written, 'memberships': members}
+
+
+def _pick_status(rng):
+    roll = rng.random()
+    for status, share in ORDER_STATUSES:
+        roll -= share
+        if roll < 0:
+            return status
+    return ORDER_STATUSES[0][0]
+
+
+def orders(plan, rng, start, stop):
+    """
+    Orders with their lines, payment, shipping, invoice, status history and
+    ratings of some of the books bought
+    """
+    tables = (
+        ('orders', Order), ('order_items', OrderItem), ('payments', Payment), ('shippings', Shipping),
+        ('invoices', Invoice), ('order_history', OrderHistory), ('ratings', Rating),
+    )
+    rows = {model: [] for _, model in tables}
+    for i in range(start, stop):
+        order_id = f'order-{i}'
+        customer_id = f'user-{rng.randrange(plan.customers)}'
+        status = _pick_status(rng)
+        placed = plan.moment(rng, 365)
+        picked = sorted({popular(rng, plan.books) for _ in range(rng.randint(1, 4))})
+        total = Decimal('0.00')
+        for line, book in enumerate(picked):
+            quantity = rng.choice((1, 1, 1, 2, 3))
+            price = book_price(plan, book)
+            total += price * quantity
+            rows[OrderItem].append(OrderItem(id=f'{order_id}-{line}', order_id=order_id, book_id=f'book-{book}',
+                                             quantity=quantity, price=price, total=price * quantity))
+            if status == 'delivered' and rng.random() < 0.4:
+                rows[Rating].append(Rating(id=f'rating-{i}-{line}', customer_id=customer_id, book_id=f'book-{book}',
+                                           score=rng.choices((1, 2, 3, 4, 5), (1, 1, 3, 6, 6))[0],
+                                           created_at=min(placed + datetime.timedelta(days=rng.randint(3, 30)), plan.end)))
+        rows[Order].append(Order(id=order_id, customer_id=customer_id, order_date=placed,
+                                 total_price=total, status=status))
+        paid = status not in ('pending', 'cancelled')
+        rows[Payment].append(Payment(id=f'payment-{i}', order_id=order_id, amount=total, created_at=placed,
+                                     status='completed' if paid else ('refunded' if status == 'cancelled' else 'pending')))
+        rows[Shipping].append(Shipping(id=f'shipping-{i}', order_id=order_id, fee=Decimal('5.00'), created_at=placed,
+                                       status=status, tracking_number=f'TRK{i:010d}' if paid else None))
+        rows[OrderHistory].append(OrderHistory(id=f'history-{i}', order_id=order_id, status=status, update_at=placed))
+        if paid:
+            voucher = f'voucher-{rng.randrange(plan.vouchers)}' if rng.random() < 0.1 else None
+            rows[Invoice].append(Invoice(id=f'invoice-{i}', order_id=order_id, total=total,
+                                         date=timezone.localdate(placed), voucher_id=voucher))
+    # Parents first: the lines, payments and ratings point at these orders
+    return {table: _write(plan, model, rows[model]) for table, model in tables}
+
+
+def carts(plan, rng, start, stop):
+    cart_rows, item_rows = [], []
+    for i in range(start, stop):
+        # Spread the carts evenly over the customers, one cart each
+        customer = i * plan.customers // plan.carts
+        cart_rows.append(Cart(id=f'cart-{i}', customer_id=f'user-{customer}', created_at=plan.moment(rng, 14)))
+        for line, book in enumerate(sorted({popular(rng, plan.books) for _ in range(rng.randint(1, 3))})):
+            item_rows.append(CartItem(id=f'cart-{i}-{line}', cart_id=f'cart-{i}', book_id=f'book-{book}',
+                                      quantity=rng.randint(1, 2)))
+    return {'carts': _write(plan, Cart, cart_rows), 'cart_items': _write(plan, CartItem, item_rows)}
+
+
+def import_slips(plan, rng, start, stop):
+    slip_rows, detail_rows = [], []
+    for i in range(start, stop):
+        slip_id = f'slip-{i}'
+        lines = []
+        for line, book in enumerate(rng.sample(range(plan.books), min(20, plan.books))):
+            quantity = rng.choice((10, 20, 50, 100))
+            price = (book_price(plan, book) * Decimal('0.6')).quantize(Decimal('0.01'))
+            lines.append(ImportSlipDetail(id=f'{slip_id}-{line}', import_slip_id=slip_id, book_id=f'book-{book}',
+                                          quantity=quantity, price=price, total=price * quantity))
+        slip_rows.append(ImportSlip(
+            id=slip_id, import_date=plan.end_date - datetime.timedelta(days=rng.randrange(365)),
+            total=sum(detail.total for detail in lines), supplier_id=f'supplier-{rng.randrange(plan.suppliers)}',
+            staff_id=f'staff-{rng.randrange(plan.staff)}', manager_id='staff-0',
+        ))
+        detail_rows += lines
+    return {'import_slips': _write(plan, ImportSlip, slip_rows), 'import_slip_details': _write(plan, ImportSlipDetail, detail_rows)}
+
+
+def order_summaries(plan, rng, start, stop):
+    written = 0
+    for chunk in range(start, stop, 1000):
+        written += history.rebuild_summaries([f'order-{i}' for i in range(chunk, min(chunk + 1000, stop))])
+    return {'order_summaries': written}
+
+
+def categories(plan, rng, start, stop):
+    return {'categories': _write(plan, Category, [
+        Category(type=name, description=f'{name} books') for name in CATEGORIES[start:stop]
+    ])}
+
+
+# (generator, number of rows) per phase; every foreign key points at a
+# table filled in an earlier phase
+PHASES = (
+    (
+        (categories, lambda plan: len(CATEGORIES)),
+        (publishers, lambda plan: plan.publishers),
+        (authors, lambda plan: plan.authors),
+        (users, lambda plan: plan.customers + plan.staff),
+        (vouchers, lambda plan: plan.vouchers),
+        (suppliers, lambda plan: plan.suppliers),
+    ),
+    (
+        (books, lambda plan: plan.books),
+        (addresses, lambda plan: plan.customers),
+        (staff, lambda plan: plan.staff),
+    ),
+    (
+        (customers, lambda plan: plan.customers),
+        (import_slips, lambda plan: plan.import_slips),
+    ),
+    (
+        (orders, lambda plan: plan.orders),
+        (carts, lambda plan: plan.carts),
+    ),
+    (
+        (order_summaries, lambda plan: plan.orders),
+    ),
+)
+
+
+def jobs_for(phase, plan):
+    return [
+        (generator.__name__, start, min(start + ROWS_PER_JOB, count(plan)))
+        for generator, count in phase
+        for start in range(0, count(plan), ROWS_PER_JOB)
+    ]
+
+
+GENERATORS = {generator.__name__: generator for phase in PHASES for generator, _ in phase}
+
+_plan = None
+
+
+def _init_worker(plan):
+    global _plan
+    import django
+    django.setup()
+    connections.close_all()
+    _plan = plan
+
+
+def run_job(job, plan=None):
+    """
+    Generate and write one job's rows in one transaction; returns
+    ``{table: rows written}``
+    """
+    plan = plan or _plan
+    name, start, stop = job
+    try:
+        with explicit_timestamps(), transaction.atomic():
+            return GENERATORS[name](plan, plan.rng(name, start), start, stop)
+    finally:
+        if plan is _plan:
+            connections.close_all()
+
+
+def generate(plan, workers=1, progress=None):
+    """
+    Write every table of ``plan``, then rebuild the derived tables.
+    Returns ``{table: rows written}``. ``progress(phase, totals)`` is called
+    after each phase.
+    """
+    totals = {}
+
+    def add(counts):
+        for table, written in counts.items():
+            totals[table] = totals.get(table, 0) + written
+
+    if workers > 1:
+        # Child processes must open their own database connections
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(plan,)) as pool:
+            for number, phase in enumerate(PHASES, start=1):
+                for counts in pool.imap_unordered(run_job, jobs_for(phase, plan)):
+                    add(counts)
+                if progress:
+                    progress(number, totals)
+    else:
+        for number, phase in enumerate(PHASES, start=1):
+            for job in jobs_for(phase, plan):
+                add(run_job(job, plan))
+            if progress:
+                progress(number, totals)
+
+    # Before repair_aggregates replaces every fragment version
+    dimensions.invalidate_all()
+    totals['rated_books'] = ratings.repair_aggregates()
+    totals['book_neighbors'] = copurchase.rebuild(workers=workers)
+    totals['sales_days'] = sales.rebuild()
+    return totals
@@ -0,0 +1,158 @@
+"""
+Signal handlers that keep derived data in step with the store models
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from store.models.book.models import Author, Book, Category, Publisher
+from store.models.order.models import Order, OrderSummary, Rating
+from store.services.book import dimensions, fragments, ratings, search_index
+from store.services.book.suggest import AUTHOR, BOOK, loaded_suggester
+from store.services.order import recommendation_cache, sales
+
+
+# Search index
+
+_DIMENSION_LOOKUPS = {Author: 'author_id', Publisher: 'publisher_id', Category: 'category_id'}
+
+
+@receiver(post_save, sender=Book, dispatch_uid='search_index_book_saved')
+@receiver(post_delete, sender=Book, dispatch_uid='search_index_book_deleted')
+def index_changed_book(sender, instance, **kwargs):
+    search_index.books_changed([instance.pk])
+
+
+@receiver(post_save, sender=Author, dispatch_uid='search_index_author_saved')
+@receiver(post_save, sender=Publisher, dispatch_uid='search_index_publisher_saved')
+@receiver(post_save, sender=Category, dispatch_uid='search_index_category_saved')
+@receiver(pre_delete, sender=Author, dispatch_uid='search_index_author_deleted')
+@receiver(pre_delete, sender=Publisher, dispatch_uid='search_index_publisher_deleted')
+@receiver(pre_delete, sender=Category, dispatch_uid='search_index_category_deleted')
+def reindex_dimension_books(sender, instance, **kwargs):
+    """
+    Re-index the books that show a renamed or deleted author, publisher
+    or category; on delete this runs while the books still point at it
+    """
+    search_index.books_changed(
+        Book.objects.filter(**{_DIMENSION_LOOKUPS[sender]: instance.pk}).values_list('id', flat=True)
+    )
+
+
+# Dimension lookup cache; connected before the fragment handlers, so the
+# tables are invalidated before fragment versions are replaced
+
+@receiver(post_save, sender=Author, dispatch_uid='dimensions_author_saved')
+@receiver(post_save, sender=Publisher, dispatch_uid='dimensions_publisher_saved')
+@receiver(post_save, sender=Category, dispatch_uid='dimensions_category_saved')
+@receiver(post_delete, sender=Author, dispatch_uid='dimensions_author_deleted')
+@receiver(post_delete, sender=Publisher, dispatch_uid='dimensions_publisher_deleted')
+@receiver(post_delete, sender=Category, dispatch_uid='dimensions_category_deleted')
+def invalidate_dimension_table(sender, instance, **kwargs):
+    dimensions.invalidate(sender)
+
+
+# Book card and detail fragments
+
+@receiver(post_save, sender=Book, dispatch_uid='fragments_book_saved')
+@receiver(post_delete, sender=Book, dispatch_uid='fragments_book_deleted')
+def retire_book_fragments(sender, instance, **kwargs):
+    fragments.bump([instance.pk])
+
+
+@receiver(post_save, sender=Author, dispatch_uid='fragments_author_saved')
+@receiver(post_save, sender=Publisher, dispatch_uid='fragments_publisher_saved')
+@receiver(post_save, sender=Category, dispatch_uid='fragments_category_saved')
+@receiver(pre_delete, sender=Author, dispatch_uid='fragments_author_deleted')
+@receiver(pre_delete, sender=Publisher, dispatch_uid='fragments_publisher_deleted')
+@receiver(pre_delete, sender=Category, dispatch_uid='fragments_category_deleted')
+def retire_dimension_fragments(sender, instance, **kwargs):
+    """
+    Retire the fragments of the books that show a changed author,
+    publisher or category; on delete this runs before the books' foreign
+    keys are cleared, while they can still be found
+    """
+    fragments.bump_related(**{_DIMENSION_LOOKUPS[sender]: instance.pk})
+
+
+# Modification times
+
+@receiver(pre_delete, sender=Author, dispatch_uid='updated_at_author_deleted')
+@receiver(pre_delete, sender=Publisher, dispatch_uid='updated_at_publisher_deleted')
+@receiver(pre_delete, sender=Category, dispatch_uid='updated_at_category_deleted')
+def touch_orphaned_books(sender, instance, **kwargs):
+    # SET_NULL clears the books' foreign keys with an UPDATE that leaves
+    # updated_at alone, so their pages would still validate as unchanged
+    Book.objects.filter(**{_DIMENSION_LOOKUPS[sender]: instance.pk}).update(updated_at=timezone.now())
+
+
+# Typeahead suggestions
+
+@receiver(post_save, sender=Book, dispatch_uid='suggest_book_saved')
+def suggest_saved_book(sender, instance, **kwargs):
+    suggester = loaded_suggester()
+    if suggester is not None:
+        weight = suggester.weight_of(BOOK, instance.pk, default=(0, float(instance.rate or 0)))
+        suggester.upsert(BOOK, instance.pk, instance.title, weight)
+
+
+@receiver(post_save, sender=Author, dispatch_uid='suggest_author_saved')
+def suggest_saved_author(sender, instance, **kwargs):
+    suggester = loaded_suggester()
+    if suggester is not None:
+        suggester.upsert(AUTHOR, instance.pk, instance.name, suggester.weight_of(AUTHOR, instance.pk))
+
+
+@receiver(post_delete, sender=Book, dispatch_uid='suggest_book_deleted')
+@receiver(post_delete, sender=Author, dispatch_uid='suggest_author_deleted')
+def unsuggest_deleted(sender, instance, **kwargs):
+    suggester = loaded_suggester()
+    if suggester is not None:
+        suggester.remove(BOOK if sender is Book else AUTHOR, instance.pk)
+
+
+# Rating aggregates
+
+@receiver(post_save, sender=Rating, dispatch_uid='rating_aggregates_saved')
+def count_saved_rating(sender, instance, created, **kwargs):
+    ratings.rating_changed(instance, created)
+
+
+@receiver(post_delete, sender=Rating, dispatch_uid='rating_aggregates_deleted')
+def uncount_deleted_rating(sender, instance, **kwargs):
+    ratings.rating_deleted(instance)
+
+
+# Recommendation cache
+
+@receiver(post_save, sender=Rating, dispatch_uid='recs_rating_saved')
+@receiver(post_delete, sender=Rating, dispatch_uid='recs_rating_deleted')
+def invalidate_rater_recommendations(sender, instance, **kwargs):
+    recommendation_cache.invalidate_customer(instance.customer_id)
+
+
+# Order summaries
+
+@receiver(post_save, sender=Order, dispatch_uid='order_summary_status')
+def sync_summary_status(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep OrderSummary.status in step with Order saves made outside
+    set_order_status (e.g. the admin)
+    """
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    OrderSummary.objects.filter(order_id=instance.pk).exclude(status=instance.status).update(status=instance.status)
+
+
+# Sales rollups
+
+@receiver(post_save, sender=Order, dispatch_uid='sales_rollup_status')
+def sync_sales_rollups(sender, instance, created, **kwargs):
+    """
+    Move an order in or out of the sales rollups when it is cancelled or
+    un-cancelled; place_order records new orders itself
+    """
+    old_status = getattr(instance, '_loaded_status', None)
+    if not created and old_status is not None:
+        sales.status_changed(instance, old_status)
+    instance._loaded_status = instance.status
@@ -0,0 +1,66 @@
+"""
+Small store fixtures shared by the tests
+"""
+from decimal import Decimal
+
+from store.models import Author, Book, Cart, CartItem, Category, Customer, Publisher, Staff, User
+from store.services.order import checkout
+
+
+TITLES = ['Pride and Prejudice', 'Foundation', 'The Story of Rome', 'Emma', 'I, Robot', 'Women and Power']
+
+
+def create_catalog(books=60):
+    """
+    Three categories, publishers and authors, and ``books`` books spread
+    over them; returns the books
+    """
+    categories = [Category.objects.create(type=name) for name in ('Fiction', 'Science', 'History')]
+    publishers = [Publisher.objects.create(id=f'publisher-{i}', name=f'Publisher {i}') for i in range(3)]
+    authors = [
+        Author.objects.create(id=f'author-{i}', name=name)
+        for i, name in enumerate(['Jane Austen', 'Isaac Asimov', 'Mary Beard'])
+    ]
+    return [
+        Book.objects.create(
+            id=f'book-{i}',
+            title=f'{TITLES[i % len(TITLES)]} {i}',
+            author=authors[i % 3],
+            publisher=publishers[i % 3],
+            category=categories[i % 3],
+            price=Decimal('10.00') + i,
+            instock=50,
+        )
+        for i in range(books)
+    ]
+
+
+def create_user(username, password='password', **fields):
+    return User.objects.create_user(username, password, id=f'user-{username}', fullname=username.title(), **fields)
+
+
+def create_customer(username):
+    return Customer.objects.create(user=create_user(username))
+
+
+def create_staff(username, role='manager'):
+    return Staff.objects.create(user=create_user(username, is_staff=True), role=role)
+
+
+def fill_cart(customer, books, quantity=1):
+    """
+    Put ``books`` in the customer's cart, in the database
+    """
+    cart, _ = Cart.objects.get_or_create(customer=customer, defaults={'id': f'cart-{customer.pk}'})
+    CartItem.objects.bulk_create([
+        CartItem(id=f'{cart.id}-{book.pk}', cart=cart, book=book, quantity=quantity) for book in books
+    ])
+    return cart
+
+
+def create_order(customer, books):
+    """
+    Order ``books`` through checkout; returns the order
+    """
+    fill_cart(customer, books)
+    return checkout.place_order(customer)
@@ -0,0 +1,116 @@
+import threading
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from store.models import Book, CartItem, OrderItem
+from store.services.order import checkout
+from store.services.order.cart_store import CART_KEY, CachedCartStore, CartBusy, _cache
+from store.tests import data
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cart-tests'}},
+    CART_STORAGE='cache',
+    CART_FLUSH_INTERVAL=3600,
+    CART_FLUSH_BATCH_SIZE=1000,
+    SEARCH_INDEX_PATH=None,
+    SEARCH_INDEX_SYNC_INTERVAL=None,
+    SUGGEST_SYNC_INTERVAL=None,
+)
+class CachedCartStoreTests(TestCase):
+
+    def setUp(self):
+        _cache().clear()
+        self.books = data.create_catalog(books=6)
+        self.customer = data.create_customer('reader')
+        self.store = CachedCartStore()
+
+    def saved_cart(self):
+        return dict(
+            CartItem.objects.filter(cart__customer=self.customer).values_list('book_id', 'quantity')
+        )
+
+    def test_concurrent_adds_all_count(self):
+        threads, adds = 8, 25
+        # The first add caches the title, the customer and the cart, so
+        # the threads below only go through the cache and its lock
+        self.store.add(self.customer.user, 'book-0')
+
+        def add():
+            for _ in range(adds):
+                self.store.add(self.customer.user, 'book-0')
+
+        workers = [threading.Thread(target=add) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(_cache().get(CART_KEY.format(self.customer.pk)), {'book-0': 1 + threads * adds})
+        self.store.flush()
+        self.assertEqual(self.saved_cart(), {'book-0': 1 + threads * adds})
+
+    def test_flush_skips_a_cart_being_ordered(self):
+        self.store.add(self.customer.user, 'book-0', 2)
+        self.store.add(self.customer.user, 'book-1')
+
+        with self.store.locked(self.customer.pk):
+            self.store.sync(self.customer.pk)
+            # A flush from another thread, between reading the cart and
+            # clearing it, must not write it back
+            flusher = threading.Thread(target=self.store.flush)
+            self.store._dirty.add(self.customer.pk)
+            flusher.start()
+            flusher.join()
+            self.assertIn(self.customer.pk, self.store._dirty)
+            order = checkout.place_order(self.customer)
+            self.store.clear(self.customer.pk)
+
+        self.store.flush()
+        self.assertEqual(self.saved_cart(), {})
+        self.assertEqual(
+            dict(OrderItem.objects.filter(order=order).values_list('book_id', 'quantity')),
+            {'book-0': 2, 'book-1': 1},
+        )
+
+    def test_sync_waits_for_the_lock(self):
+        self.store.add(self.customer.user, 'book-0')
+        with self.store.locked(self.customer.pk):
+            result = []
+            other = threading.Thread(target=lambda: result.append(self._sync_elsewhere()))
+            with mock.patch('store.services.order.cart_store.LOCK_WAIT', 0):
+                other.start()
+                other.join()
+        self.assertEqual(result, ['busy'])
+        self.assertEqual(self.saved_cart(), {})
+
+    def _sync_elsewhere(self):
+        try:
+            self.store.sync(self.customer.pk)
+        except CartBusy:
+            return 'busy'
+        return 'synced'
+
+    def test_deleted_books_are_dropped(self):
+        self.store.add(self.customer.user, 'book-0')
+        self.store.add(self.customer.user, 'book-1', 3)
+        Book.objects.filter(id='book-1').delete()
+
+        self.store.flush()
+
+        self.assertEqual(self.saved_cart(), {'book-0': 1})
+        self.assertEqual(_cache().get(CART_KEY.format(self.customer.pk)), {'book-0': 1})
+        self.assertEqual(self.store._dirty, set())
+
+    def test_failed_write_keeps_carts_pending(self):
+        self.store.add(self.customer.user, 'book-0')
+        with mock.patch('store.services.order.cart_store.persist_carts', side_effect=DatabaseError), \
+                self.assertLogs('store.services.order.cart_store', 'ERROR'):
+            self.store.flush()
+        self.assertEqual(self.store._dirty, {self.customer.pk})
+
+        self.store.flush()
+        self.assertEqual(self.saved_cart(), {'book-0': 1})
+        self.assertEqual(self.store._dirty, set())
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from store.models import Author, Book, Category, Publisher
+from store.services.book.catalog_import import CatalogImporter
+
+
+@override_settings(SEARCH_INDEX_PATH=None, SEARCH_INDEX_SYNC_INTERVAL=None, SUGGEST_SYNC_INTERVAL=None)
+class CatalogImportTests(TestCase):
+
+    def run_import(self, *rows):
+        importer = CatalogImporter().load_lookups()
+        importer.run(enumerate(rows, start=2))
+        return importer
+
+    def test_imports_rows(self):
+        importer = self.run_import(
+            {'id': 'imp-1', 'title': 'Emma', 'price': '7.50', 'instock': '3', 'author': 'Jane Austen',
+             'publisher': 'Penguin', 'category': 'Fiction'},
+        )
+        self.assertEqual((importer.imported, importer.skipped), (1, []))
+        book = Book.objects.get(id='imp-1')
+        self.assertEqual((book.price, book.instock, book.author.name), (Decimal('7.50'), 3, 'Jane Austen'))
+
+    def test_skips_oversized_columns(self):
+        good = {'id': 'imp-1', 'title': 'Emma', 'price': '7.50'}
+        bad = [
+            ({'id': 'x' * 51, 'title': 'Emma'}, 'id is longer than 50'),
+            ({'id': 'imp-2', 'title': 't' * 501}, 'title is longer than 500'),
+            ({'id': 'imp-3', 'title': 'Emma', 'author': 'a' * 201}, 'author is longer than 200'),
+            ({'id': 'imp-4', 'title': 'Emma', 'publisher': 'p' * 201}, 'publisher is longer than 200'),
+            ({'id': 'imp-5', 'title': 'Emma', 'publisher_id': 'p' * 51, 'publisher': 'P'},
+             'publisher_id is longer than 50'),
+            ({'id': 'imp-6', 'title': 'Emma', 'category': 'c' * 101}, 'category is longer than 100'),
+        ]
+        importer = self.run_import(good, *(row for row, _ in bad))
+
+        self.assertEqual(importer.imported, 1)
+        self.assertEqual([line for line, _ in importer.skipped], list(range(3, 3 + len(bad))))
+        for (_, reason), (_, expected) in zip(importer.skipped, bad):
+            self.assertIn(expected, reason)
+        self.assertEqual(list(Book.objects.values_list('id', flat=True)), ['imp-1'])
+        # Nothing was queued for the skipped rows
+        self.assertFalse(Author.objects.exists() or Publisher.objects.exists() or Category.objects.exists())
+
+    def test_skips_prices_and_stock_the_columns_cannot_hold(self):
+        prices = ['NaN', 'sNaN', 'Infinity', '-inf', '1e12', '10000000000', '1.005']
+        importer = self.run_import(
+            {'id': 'imp-1', 'title': 'Emma', 'price': '9999999999.99'},
+            *({'id': f'imp-price-{i}', 'title': 'Emma', 'price': price} for i, price in enumerate(prices)),
+            {'id': 'imp-stock', 'title': 'Emma', 'instock': str(2 ** 31)},
+        )
+
+        self.assertEqual(importer.imported, 1)
+        reasons = [reason for _, reason in importer.skipped]
+        self.assertEqual(len(reasons), len(prices) + 1)
+        self.assertTrue(all(reason.startswith('price must be') for reason in reasons[:-1]))
+        self.assertTrue(reasons[-1].startswith('instock must be'))
+        self.assertEqual(Book.objects.get().price, Decimal('9999999999.99'))
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from store.models import BookNeighbor
+from store.services.order.copurchase import record_purchase
+from store.tests import data
+
+
+@override_settings(SEARCH_INDEX_PATH=None, SEARCH_INDEX_SYNC_INTERVAL=None, SUGGEST_SYNC_INTERVAL=None)
+class RecordPurchaseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = data.create_catalog(books=6)
+
+    def order(self, username, books):
+        customer = data.create_customer(username)
+        order = data.create_order(customer, books)
+        return customer.pk, order.pk, [book.pk for book in books]
+
+    def scores(self):
+        return dict(
+            ((book_id, neighbor_id), score)
+            for book_id, neighbor_id, score in BookNeighbor.objects.values_list('book_id', 'neighbor_id', 'score')
+        )
+
+    def test_counts_customers(self):
+        record_purchase(*self.order('ann', self.books[:2]))
+        record_purchase(*self.order('bob', self.books[:3]))
+        scores = self.scores()
+        self.assertEqual(scores[('book-0', 'book-1')], 2)
+        self.assertEqual(scores[('book-1', 'book-0')], 2)
+        self.assertEqual(scores[('book-2', 'book-0')], 1)
+
+    def test_pair_inserted_concurrently_still_counts(self):
+        purchase = self.order('ann', self.books[:2])
+        bulk_create = BookNeighbor.objects.bulk_create
+
+        def other_order_first(objs, **kwargs):
+            # Another order commits the same new pairs between the read
+            # and the insert
+            bulk_create([BookNeighbor(book_id=a, neighbor_id=b, score=1)
+                         for a, b in (('book-0', 'book-1'), ('book-1', 'book-0'))])
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(BookNeighbor.objects, 'bulk_create', side_effect=other_order_first):
+            record_purchase(*purchase)
+        self.assertEqual(self.scores(), {('book-0', 'book-1'): 2, ('book-1', 'book-0'): 2})
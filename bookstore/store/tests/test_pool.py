@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from store.backends.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+    @staticmethod
+    def close(connection):
+        connection.closed = True
+
+    def acquire(self, pool, alive=True):
+        connection, _ = pool.acquire(self.connect, lambda connection: alive, self.close)
+        return connection
+
+    def test_returned_connections_are_reused(self):
+        pool = ConnectionPool('default', max_size=2)
+        first = self.acquire(pool)
+        pool.release(first, True, self.close)
+        self.assertIs(self.acquire(pool), first)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['in_use'], stats['open']), (1, 2, 1, 1))
+
+    def test_unusable_connections_are_closed(self):
+        pool = ConnectionPool('default', max_size=2)
+        first = self.acquire(pool)
+        pool.release(first, False, self.close)
+        self.assertTrue(first.closed)
+        self.assertIsNot(self.acquire(pool), first)
+        self.assertEqual(pool.stats()['recycled'], 1)
+
+    def test_max_size(self):
+        pool = ConnectionPool('default', max_size=2, timeout=0.05)
+        held = [self.acquire(pool), self.acquire(pool)]
+        with self.assertRaises(PoolTimeout):
+            self.acquire(pool)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        # A checkout waiting for a full pool gets the next returned connection
+        pool.timeout = 5.0
+        releaser = threading.Timer(0.05, pool.release, (held[0], True, self.close))
+        releaser.start()
+        self.assertIs(self.acquire(pool), held[0])
+        releaser.join()
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['in_use'], stats['waits']), (2, 2, 2))
+
+    def test_connection_failing_its_ping_is_replaced(self):
+        # Every idle connection is pinged before it is handed out
+        pool = ConnectionPool('default', max_size=1, check_interval=-1)
+        first = self.acquire(pool)
+        pool.release(first, True, self.close)
+
+        second = self.acquire(pool, alive=False)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['failed_checks'], stats['open'], stats['created']), (1, 1, 2))
+
+    def test_expired_connections_are_not_reused(self):
+        pool = ConnectionPool('default', max_size=1, max_lifetime=-1)
+        first = self.acquire(pool)
+        pool.release(first, True, self.close)
+        self.assertTrue(first.closed)
+        self.assertIsNot(self.acquire(pool), first)
+
+
+class PooledBackendTests(SimpleTestCase):
+    """
+    The pooled backend with CONN_MAX_AGE = 0: closing the connection at the
+    end of a request hands it back to the pool
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections = ConnectionHandler({'default': {
+            'ENGINE': 'store.backends.pooled_sqlite3',
+            'NAME': os.path.join(directory.name, 'pooled.sqlite3'),
+            'CONN_MAX_AGE': 0,
+            'POOL': {'MAX_SIZE': 1},
+        }})
+        self.addCleanup(connections.close_all)
+        self.db = connections['default']
+
+    def request(self):
+        with self.db.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = self.db.connection
+        # What the request_finished signal does
+        self.db.close_if_unusable_or_obsolete()
+        return raw
+
+    def test_requests_share_one_connection(self):
+        first = self.request()
+        self.assertIsNone(self.db.connection)
+        self.assertIs(self.request(), first)
+        stats = self.db.pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['in_use'], stats['idle']), (1, 2, 0, 1))
@@ -0,0 +1,55 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from store.instrumentation import query_budget
+from store.services.book import dimensions
+from store.tests import data
+
+
+@override_settings(SEARCH_INDEX_PATH=None, SEARCH_INDEX_SYNC_INTERVAL=None, DIMENSION_CACHE_SYNC_INTERVAL=0)
+class QueryBudgetTests(TestCase):
+    """
+    The main pages stay within QUERY_BUDGETS for a signed-in customer with
+    an empty cache, as the settings describe them
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        books = data.create_catalog()
+        cls.customer = data.create_customer('shopper')
+        data.create_order(cls.customer, books[:4])
+        data.fill_cart(cls.customer, books[10:13])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        # Loaded by an earlier request of the worker
+        for model in dimensions.BOOK_DIMENSIONS.values():
+            dimensions.rows(model)
+        self.client.force_login(self.customer.user)
+
+    def test_catalog(self):
+        with query_budget('book:index'):
+            self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_book_detail(self):
+        with query_budget('book:detail'):
+            self.assertEqual(self.client.get('/book-1/').status_code, 200)
+
+    def test_cart(self):
+        with query_budget('order:cart'):
+            self.assertEqual(self.client.get('/order/cart/').status_code, 200)
+
+    def test_checkout(self):
+        with query_budget('order:checkout'):
+            self.assertEqual(self.client.get('/order/checkout/').status_code, 200)
+
+    def test_over_budget_fails(self):
+        with self.assertRaisesMessage(AssertionError, 'book:index'):
+            with query_budget('book:index', 0):
+                self.client.get('/')
+
+    def test_unrequested_view_fails(self):
+        with self.assertRaisesMessage(AssertionError, 'order:cart: never requested'):
+            with query_budget('order:cart'):
+                self.client.get('/')
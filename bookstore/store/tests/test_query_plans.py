@@ -0,0 +1,74 @@
+from django.test import TestCase, override_settings
+
+from store.services.query_plans import PlanChecker, hot_views
+from store.tests import data
+
+
+@override_settings(SEARCH_INDEX_PATH=None, SEARCH_INDEX_SYNC_INTERVAL=None, SUGGEST_SYNC_INTERVAL=None)
+class QueryPlanTests(TestCase):
+    """
+    The hot views render, and none of their SELECTs scans a whole table or
+    sorts a top-N result outside an index. Tables are tiny here, so every
+    scan counts (``min_rows=0``); DailySales holds one row per day and its
+    all-time totals read all of it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        books = data.create_catalog()
+        cls.shopper = data.create_customer('shopper')
+        cls.buyer = data.create_customer('buyer')
+        cls.staff = data.create_staff('manager')
+        data.create_order(cls.buyer, books[:4])
+        data.create_order(cls.shopper, books[2:6])
+        data.fill_cart(cls.shopper, books[10:13])
+
+    def setUp(self):
+        self.checker = PlanChecker(min_rows=0, allowed_tables={'store_dailysales'})
+
+    def assertGoodPlans(self, name, path, user=None):
+        view = self.checker.check(name, path, user)
+        self.assertEqual(view.status, 200, f'{name} ({path}) answered HTTP {view.status}')
+        self.assertTrue(view.ok)
+        self.assertTrue(view.statements or name == 'suggest', f'{name} sent no SELECT to check')
+        problems = [f'{problem.kind} {problem.table}: {problem.detail}\n  {statement.sql}'
+                    for statement, problem in view.problems]
+        self.assertEqual(problems, [], f'{name} ({path}) query plans')
+
+    def test_catalog(self):
+        self.assertGoodPlans('catalog', '/')
+
+    def test_search(self):
+        self.assertGoodPlans('search', '/search/?q=foundation')
+
+    def test_suggest(self):
+        self.assertGoodPlans('suggest', '/suggest/?q=fo')
+
+    def test_book_detail(self):
+        self.assertGoodPlans('book detail', '/book-1/')
+
+    def test_cart(self):
+        self.assertGoodPlans('cart', '/order/cart/', self.shopper.user)
+
+    def test_checkout(self):
+        self.assertGoodPlans('checkout', '/order/checkout/', self.shopper.user)
+
+    def test_order_history(self):
+        self.assertGoodPlans('order history', '/order/history/', self.buyer.user)
+
+    def test_recommendations(self):
+        self.assertGoodPlans('recommendations', '/order/recommendations/', self.buyer.user)
+
+    def test_staff_dashboard(self):
+        self.assertGoodPlans('staff dashboard', '/staff/', self.staff.user)
+
+    def test_hot_views_check_checkout_with_a_cart(self):
+        users = {name: user for name, path, user in hot_views()}
+        self.assertEqual(users['checkout'], self.shopper.user)
+        self.assertEqual(users['order history'].pk, self.shopper.user.pk)
+
+    def test_redirect_fails_the_check(self):
+        # The buyer's cart was emptied by their order
+        view = self.checker.check('checkout', '/order/checkout/', self.buyer.user)
+        self.assertEqual(view.status, 302)
+        self.assertFalse(view.ok)
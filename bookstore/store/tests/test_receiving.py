@@ -0,0 +1,77 @@
+import codecs
+import io
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Book, ImportSlip
+from store.services.order.receiving import ReceivingError, parse_lines, receive_slip
+from store.tests import data
+
+
+def parse(text):
+    return parse_lines(codecs.iterdecode(io.BytesIO(text.encode()), 'utf-8-sig'))
+
+
+class ParseLinesTests(TestCase):
+
+    def assertRejected(self, row, message):
+        with self.assertRaisesMessage(ReceivingError, message):
+            parse(f'book_id,quantity,price\nbook-0,1,2.50\n{row}\n')
+
+    def test_reads_rows(self):
+        lines = parse('book_id,quantity,price\nbook-0,5,2.50\n')
+        self.assertEqual([(book_id, quantity, str(price)) for book_id, quantity, price in lines],
+                         [('book-0', 5, '2.50')])
+
+    def test_rejects_non_finite_prices(self):
+        for price in ('NaN', 'sNaN', '-nan', 'Infinity', '-Inf'):
+            with self.subTest(price=price):
+                self.assertRejected(f'book-1,1,{price}', 'Line 3: price')
+
+    def test_rejects_prices_the_column_cannot_hold(self):
+        for price in ('12.345', '10000000000', '1e12'):
+            with self.subTest(price=price):
+                self.assertRejected(f'book-1,1,{price}', 'Line 3: price')
+
+    def test_rejects_short_rows_and_bad_numbers(self):
+        self.assertRejected('book-1,5', 'Line 3: expected 3 fields')
+        self.assertRejected('book-1,five,2', 'Line 3: quantity and price must be numbers')
+
+    def test_rejects_non_utf8(self):
+        with self.assertRaisesMessage(ReceivingError, 'Line 3: the file is not UTF-8'):
+            parse_lines(codecs.iterdecode(io.BytesIO(b'book_id,quantity,price\nbook-0,1,2\nb\xff,1,1\n'), 'utf-8-sig'))
+
+
+class ReceiveSlipTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = data.create_catalog(books=10)
+        cls.staff = data.create_staff('manager')
+
+    def test_adds_each_book_its_quantity_in_one_update(self):
+        lines = [(book.pk, quantity, Decimal('1.00')) for quantity, book in enumerate(self.books, start=1)]
+        with CaptureQueriesContext(connection) as queries:
+            receive_slip(lines)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "store_book"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            dict(Book.objects.values_list('id', 'instock')),
+            {book.pk: 50 + quantity for quantity, book in enumerate(self.books, start=1)},
+        )
+
+    def test_rejects_line_totals_the_column_cannot_hold(self):
+        with self.assertRaisesMessage(ReceivingError, 'Line 1: quantity times price'):
+            receive_slip([('book-0', 1000, Decimal('9999999999.99'))])
+
+    def test_upload_with_nan_price_is_reported(self):
+        self.client.force_login(self.staff.user)
+        upload = SimpleUploadedFile('slip.csv', b'book_id,quantity,price\nbook-0,1,NaN\nbook-1,1,Infinity\n')
+        response = self.client.post('/staff/receive-stock/', {'lines': upload}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Line 2: price')
+        self.assertFalse(ImportSlip.objects.exists())
@@ -0,0 +1,47 @@
+from django.test import TestCase, override_settings
+
+from store.models import Book, Category, DailyBookSales, DailyCategorySales, Order, Publisher
+from store.services.order import sales
+from store.services.order.history import set_order_status
+from store.tests import data
+
+
+@override_settings(SEARCH_INDEX_PATH=None, SEARCH_INDEX_SYNC_INTERVAL=None, SUGGEST_SYNC_INTERVAL=None)
+class SalesRollupTests(TestCase):
+    """
+    Order lines stay counted under the category and publisher their book
+    had when it was sold
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = data.create_catalog(books=3)
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = data.create_order(data.create_customer('reader'), self.books[:1])
+        # book-0 moves from Fiction / publisher-0 after the sale
+        Book.objects.filter(id='book-0').update(
+            category=Category.objects.get(type='Science'), publisher=Publisher.objects.get(id='publisher-1'),
+        )
+
+    def category_units(self):
+        return dict(DailyCategorySales.objects.values_list('category_type', 'units'))
+
+    def book_rows(self):
+        return list(DailyBookSales.objects.values_list('book_id', 'publisher_id', 'units'))
+
+    def test_cancelling_reverses_the_original_category(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            set_order_status(Order.objects.get(pk=self.order.pk), 'cancelled')
+        self.assertEqual(self.category_units(), {'Fiction': 0})
+        self.assertEqual(self.book_rows(), [('book-0', 'publisher-0', 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_order_status(Order.objects.get(pk=self.order.pk), 'pending')
+        self.assertEqual(self.category_units(), {'Fiction': 1})
+
+    def test_rebuild_keeps_the_original_category(self):
+        sales.rebuild()
+        self.assertEqual(self.category_units(), {'Fiction': 1})
+        self.assertEqual(self.book_rows(), [('book-0', 'publisher-0', 1)])
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from store.models import Book
+from store.services.book import search_index
+from store.services.book.search_index import CHANGE_KEY, SearchIndex, current_change, get_search_index
+from store.services.book.suggest import Suggester, _is_stale
+from store.tests import data
+
+
+class SnapshotLoadTests(TestCase):
+    """
+    A worker loading a snapshot written by another process starts serving
+    it without a rebuild
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        data.create_catalog(books=12)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'search_index.bin')
+        start = mock.patch.object(search_index._rebuild, 'start')
+        self.rebuild = start.start()
+        self.addCleanup(start.stop)
+
+    def write_snapshot(self, change):
+        snapshot = SearchIndex().build()
+        snapshot.change = change
+        snapshot.dump(self.path)
+
+    def load(self, **settings):
+        with override_settings(SEARCH_INDEX_PATH=self.path, SEARCH_INDEX_RELOAD_INTERVAL=0,
+                               SEARCH_INDEX_SYNC_INTERVAL=0, **settings):
+            search_index._last_sync = 0.0
+            return get_search_index()
+
+    def test_process_local_cache(self):
+        caches['default'].clear()
+        # Numbered by the writer's own LocMemCache counter
+        self.write_snapshot(change=894994576078536704)
+        index = self.load()
+        self.assertEqual(index.change, current_change())
+        self.assertEqual(index.search('foundation').total, 2)
+        self.rebuild.assert_not_called()
+
+    def test_shared_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': directory.name}}
+        with override_settings(CACHES=shared):
+            number = current_change()
+            self.write_snapshot(change=number)
+            # A change published after the snapshot was written
+            caches['default'].incr(search_index.CHANGES_KEY)
+            caches['default'].set(CHANGE_KEY.format(number + 1), ['book-1'])
+            index = self.load(CACHES=shared)
+            self.assertEqual(index.change, number + 1)
+        self.rebuild.assert_not_called()
+
+
+@override_settings(SEARCH_INDEX_PATH=None, SEARCH_INDEX_SYNC_INTERVAL=None, SUGGEST_SYNC_INTERVAL=None)
+class SuggesterChangeTests(TestCase):
+    """
+    Only catalog changes published by other processes make the typeahead
+    suggester stale
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        data.create_catalog(books=12)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.suggester = Suggester().build()
+
+    def test_own_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(id='book-1').first().save()
+        self.assertNotEqual(self.suggester.change, current_change())
+        self.assertFalse(_is_stale(self.suggester, check_catalog=True))
+        self.assertEqual(self.suggester.change, current_change())
+
+    def test_changes_of_other_processes(self):
+        caches['default'].incr(search_index.CHANGES_KEY)
+        self.assertTrue(_is_stale(self.suggester, check_catalog=True))
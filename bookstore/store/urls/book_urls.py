@@ -1,12 +1,17 @@
 """
 URLs for book module
 """
+from django.conf import settings
 from django.urls import path
-from store.controllers.bookController import views
+from store.controllers.bookController import async_views, views
+
+# Read-heavy pages; the ASGI deployment serves their async versions
+pages = async_views if getattr(settings, 'ASYNC_VIEWS', False) else views
 
 app_name = 'book'
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('search/', views.search, name='search'),
-    path('<str:book_id>/', views.detail, name='detail'),
+    path('', pages.index, name='index'),
+    path('search/', pages.search, name='search'),
+    path('suggest/', views.suggest, name='suggest'),
+    path('<str:book_id>/', pages.detail, name='detail'),
 ]
\ No newline at end of file
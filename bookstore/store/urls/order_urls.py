@@ -1,8 +1,12 @@
 """
 URLs for order module
 """
+from django.conf import settings
 from django.urls import path
-from store.controllers.orderController import views
+from store.controllers.orderController import async_views, views
+
+# Read-heavy pages; the ASGI deployment serves their async versions
+pages = async_views if getattr(settings, 'ASYNC_VIEWS', False) else views
 
 app_name = 'order'
 urlpatterns = [
@@ -11,6 +15,6 @@ urlpatterns = [
     path('remove-from-cart/<str:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('place-order/', views.place_order, name='place_order'),
-    path('history/', views.order_history, name='order_history'),
-    path('recommendations/', views.recommendations, name='recommendations'),
+    path('history/', pages.order_history, name='order_history'),
+    path('recommendations/', pages.recommendations, name='recommendations'),
 ]
\ No newline at end of file
@@ -9,4 +9,9 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('add-book/', views.add_book, name='add_book'),
     path('inventory/', views.inventory, name='inventory'),
+    path('receive-stock/', views.receive_stock, name='receive_stock'),
+    path('export/inventory/', views.export_inventory, name='export_inventory'),
+    path('export/orders/', views.export_orders, name='export_orders'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('query-stats/', views.query_stats, name='query_stats'),
 ]
\ No newline at end of file